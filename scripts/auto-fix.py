@@ -9,6 +9,13 @@ import sys
 import os
 from pathlib import Path
 
+from pipeline import shell
+from pipeline.engine import Engine, load_pipeline
+from pipeline.eslint import EslintRunner
+from pipeline.processes import processes
+from pipeline.pyflake8 import Flake8Runner
+from pipeline.pyformat import PythonFormatter
+
 class Colors:
     GREEN = '\033[92m'
     RED = '\033[91m'
@@ -19,18 +26,8 @@ class Colors:
 def run_command(command, cwd=None):
     """Run a shell command and return the result."""
     print(f"{Colors.BLUE}Running: {command}{Colors.END}")
-    try:
-        result = subprocess.run(
-            command,
-            shell=True,
-            cwd=cwd,
-            capture_output=True,
-            text=True
-        )
-        return result
-    except Exception as e:
-        print(f"{Colors.RED}Error running command: {e}{Colors.END}")
-        return None
+    code, stdout, stderr = shell.run_command(command, cwd=cwd, timeout=None)
+    return subprocess.CompletedProcess(command, code, stdout, stderr)
 
 def check_python_code():
     """Check and fix Python code quality."""
@@ -38,39 +35,41 @@ def check_python_code():
     print(f"{Colors.BLUE}Checking Python Code{Colors.END}")
     print(f"{Colors.BLUE}{'='*60}{Colors.END}\n")
     
-    # Find Python files
-    python_files = list(Path('.').rglob('*.py'))
-    if not python_files:
+    # One file list for every Python tool
+    formatter = PythonFormatter()
+    if not formatter.files:
         print(f"{Colors.YELLOW}No Python files found{Colors.END}")
         return True
     
-    # Format with black
-    print(f"{Colors.BLUE}Formatting with black...{Colors.END}")
-    result = run_command('black .')
-    if result and result.returncode == 0:
-        print(f"{Colors.GREEN}✓ Black formatting complete{Colors.END}")
-    else:
-        print(f"{Colors.RED}✗ Black formatting failed{Colors.END}")
-    
-    # Sort imports
-    print(f"{Colors.BLUE}Sorting imports with isort...{Colors.END}")
-    result = run_command('isort .')
-    if result and result.returncode == 0:
-        print(f"{Colors.GREEN}✓ Import sorting complete{Colors.END}")
+    # Sort imports and format with isort + black, in-process across worker processes
+    print(f"{Colors.BLUE}Formatting {len(formatter.files)} files with isort and black...{Colors.END}")
+    formatter.run()
+    if formatter.missing:
+        print(f"{Colors.YELLOW}⚠ Not installed: {', '.join(formatter.missing)}{Colors.END}")
+    for path in formatter.changed():
+        print(f"  reformatted {formatter.relative(path)}")
+    for path, error in formatter.errors().items():
+        print(f"{Colors.RED}✗ {formatter.relative(path)}: {error}{Colors.END}")
+    if formatter.errors():
+        print(f"{Colors.RED}✗ Formatting failed for {len(formatter.errors())} files{Colors.END}")
     else:
-        print(f"{Colors.RED}✗ Import sorting failed{Colors.END}")
+        print(f"{Colors.GREEN}✓ Formatting complete ({len(formatter.changed())} changed){Colors.END}")
     
-    # Run flake8
+    # Lint with flake8; files whose content and config are unchanged come from the cache
     print(f"{Colors.BLUE}Checking with flake8...{Colors.END}")
-    result = run_command('flake8 . --max-line-length=100 --extend-ignore=E203,W503')
-    if result and result.returncode == 0:
-        print(f"{Colors.GREEN}✓ Flake8 checks passed{Colors.END}")
-        return True
-    else:
-        print(f"{Colors.YELLOW}⚠ Flake8 found issues:{Colors.END}")
-        if result:
-            print(result.stdout)
+    linter = Flake8Runner(files=formatter.files)
+    linter.run()
+    if linter.error:
+        print(f"{Colors.RED}✗ flake8 could not run: {linter.error}{Colors.END}")
         return False
+    issues = linter.issues()
+    if not issues:
+        print(f"{Colors.GREEN}✓ Flake8 checks passed ({linter.cached}/{len(linter.files)} cached){Colors.END}")
+        return True
+    print(f"{Colors.YELLOW}⚠ Flake8 found {len(issues)} issues in {len(linter.counts())} files:{Colors.END}")
+    for issue in issues:
+        print(f"  {issue['file']}:{issue['line']}:{issue['column']}: {issue['code']} {issue['message']}")
+    return False
 
 def check_typescript_code():
     """Check and fix TypeScript code quality."""
@@ -89,20 +88,23 @@ def check_typescript_code():
     # Run ESLint with auto-fix
     print(f"{Colors.BLUE}Checking with ESLint...{Colors.END}")
     
-    projects = ['core', 'vscode-extension', 'desktop', 'web']
+    runner = EslintRunner(packages=['core', 'vscode-extension', 'desktop', 'web'])
+    runner.run(fix=True)
+    sarif_path = runner.write_sarif()
     all_passed = True
     
-    for project in projects:
-        project_path = Path(project)
-        if project_path.exists():
-            print(f"{Colors.BLUE}Linting {project}...{Colors.END}")
-            result = run_command(f'npm run lint --fix', cwd=project)
-            if result and result.returncode == 0:
-                print(f"{Colors.GREEN}✓ {project} lint passed{Colors.END}")
-            else:
-                print(f"{Colors.YELLOW}⚠ {project} has lint issues{Colors.END}")
-                all_passed = False
+    for project, summary in runner.summary().items():
+        if summary['failed']:
+            print(f"{Colors.YELLOW}⚠ {project}: ESLint could not run{Colors.END}")
+            all_passed = False
+        elif summary['errors']:
+            print(f"{Colors.YELLOW}⚠ {project} has lint issues "
+                  f"({summary['errors']} errors, {summary['warnings']} warnings){Colors.END}")
+            all_passed = False
+        else:
+            print(f"{Colors.GREEN}✓ {project} lint passed{Colors.END}")
     
+    print(f"{Colors.BLUE}SARIF report: {sarif_path}{Colors.END}")
     return all_passed
 
 def run_tests():
@@ -180,27 +182,29 @@ def build_projects():
 
 def main():
     """Main auto-fix pipeline."""
+    processes.install()
     print(f"\n{Colors.BLUE}{'='*60}{Colors.END}")
     print(f"{Colors.BLUE}OpenPilot Auto-Fix & Quality Check{Colors.END}")
     print(f"{Colors.BLUE}{'='*60}{Colors.END}\n")
     
-    steps = [
-        ("Checking Dependencies", check_dependencies),
-        ("Checking Python Code", check_python_code),
-        ("Checking TypeScript Code", check_typescript_code),
-        ("Building Projects", build_projects),
-        ("Running Tests", run_tests),
+    handlers = {
+        'check_dependencies': lambda step: check_dependencies(),
+        'check_python_code': lambda step: check_python_code(),
+        'check_typescript_code': lambda step: check_typescript_code(),
+        'build_projects': lambda step: build_projects(),
+        'run_tests': lambda step: run_tests(),
+    }
+    
+    def on_result(step, result):
+        if result.stderr:
+            print(f"{Colors.RED}✗ {step.description} failed with error: {result.stderr}{Colors.END}")
+    
+    engine = Engine(load_pipeline(), handlers=handlers, on_result=on_result)
+    results = [
+        (engine.pipeline.steps[step_id].description, result.ok)
+        for step_id, result in engine.run('auto-fix').items()
     ]
     
-    results = []
-    for step_name, step_func in steps:
-        try:
-            result = step_func()
-            results.append((step_name, result))
-        except Exception as e:
-            print(f"{Colors.RED}✗ {step_name} failed with error: {e}{Colors.END}")
-            results.append((step_name, False))
-    
     # Summary
     print(f"\n{Colors.BLUE}{'='*60}{Colors.END}")
     print(f"{Colors.BLUE}Summary{Colors.END}")
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Reference build cache server
+Serves the content-addressed protocol used by scripts/pipeline/buildcache.py:
+
+  GET/HEAD/PUT /cas/<sha256>     blobs, verified against their digest on upload
+  GET/HEAD/PUT /ac/<action key>  step results (JSON) referencing blobs by digest
+
+Entries are plain files under --dir. With --max-size the least recently read
+entries are evicted once the store grows past the limit.
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+TOKEN_ENV = 'OPENPILOT_REMOTE_CACHE_TOKEN'
+KINDS = ('ac', 'cas')
+MAX_ENTRY_BYTES = 512 * 1024 * 1024
+
+
+class CacheStore:
+    """Files under a directory, sharded by the first two characters of the key"""
+
+    def __init__(self, root: Path, max_size: int = 0):
+        self.root = root
+        self.max_size = max_size
+        self.size = sum(p.stat().st_size for p in root.rglob('*') if p.is_file()) if root.exists() else 0
+        self._lock = threading.Lock()
+
+    def path(self, kind: str, key: str) -> Path:
+        return self.root / kind / key[:2] / key
+
+    def put(self, kind: str, key: str, data: bytes) -> None:
+        path = self.path(kind, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{key}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        with self._lock:
+            previous = path.stat().st_size if path.exists() else 0
+            os.replace(tmp, path)
+            self.size += len(data) - previous
+        if self.max_size and self.size > self.max_size:
+            self.evict()
+
+    def evict(self) -> None:
+        """Drop least recently used entries until the store is 10% below the limit"""
+        with self._lock:
+            entries = sorted((p for p in self.root.rglob('*') if p.is_file() and not p.name.startswith('.')),
+                             key=lambda p: p.stat().st_mtime)
+            target = self.max_size * 0.9
+            for path in entries:
+                if self.size <= target:
+                    break
+                try:
+                    size = path.stat().st_size
+                    path.unlink()
+                    self.size -= size
+                except OSError:
+                    pass
+
+
+class CacheHandler(BaseHTTPRequestHandler):
+    server_version = 'OpenPilotCache/1'
+
+    def _target(self):
+        """(kind, key) for a valid request path and token, else None after sending the error"""
+        token = self.server.token
+        if token and self.headers.get('Authorization') != f"Bearer {token}":
+            self.send_error(401)
+            return None
+        parts = self.path.strip('/').split('/')
+        if len(parts) != 2 or parts[0] not in KINDS or len(parts[1]) != 64 \
+                or any(c not in '0123456789abcdef' for c in parts[1]):
+            self.send_error(400, 'Expected /ac/<sha256> or /cas/<sha256>')
+            return None
+        return parts[0], parts[1]
+
+    def _get(self, body: bool):
+        target = self._target()
+        if target is None:
+            return
+        path = self.server.store.path(*target)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except OSError:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if body:
+            self.wfile.write(data)
+
+    def do_GET(self):
+        self._get(body=True)
+
+    def do_HEAD(self):
+        self._get(body=False)
+
+    def do_PUT(self):
+        target = self._target()
+        if target is None:
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        if length > MAX_ENTRY_BYTES:
+            self.send_error(413)
+            return
+        data = self.rfile.read(length)
+        kind, key = target
+        if kind == 'cas' and hashlib.sha256(data).hexdigest() != key:
+            self.send_error(400, 'Content does not match digest')
+            return
+        self.server.store.put(kind, key, data)
+        self.send_response(201)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the OpenPilot build/test cache over HTTP")
+    parser.add_argument('--host', default='127.0.0.1', help="Address to bind (0.0.0.0 inside the cluster)")
+    parser.add_argument('--port', type=int, default=7401)
+    parser.add_argument('--dir', default=str(Path.home() / '.openpilot-cache-server'),
+                        help="Directory holding the cache entries")
+    parser.add_argument('--max-size', type=int, default=0, metavar='MB',
+                        help="Evict least recently used entries beyond this size (0 = unbounded)")
+    parser.add_argument('--verbose', action='store_true', help="Log every request")
+    args = parser.parse_args()
+
+    root = Path(args.dir)
+    root.mkdir(parents=True, exist_ok=True)
+    server = ThreadingHTTPServer((args.host, args.port), CacheHandler)
+    server.daemon_threads = True
+    server.store = CacheStore(root, args.max_size * 1024 * 1024)
+    server.token = os.environ.get(TOKEN_ENV, '')
+    server.verbose = args.verbose
+
+    print(f"🗄️  Build cache on http://{args.host}:{server.server_address[1]} ({root})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Stopping cache server")
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+#!/usr/bin/env node
+/**
+ * Resident jest runner used by scripts/pipeline/jestdaemon.py
+ *
+ * Started once per package, it keeps jest, ts-jest and the project config
+ * loaded between runs. Each stdin line is a request {"argv": [...]} with the
+ * jest command-line arguments; each reply is one stdout line {"code", "output"}
+ * where output is everything jest printed during that run.
+ */
+
+'use strict';
+
+const path = require('path');
+const readline = require('readline');
+
+const projectDir = path.resolve(process.argv[2] || process.cwd());
+process.chdir(projectDir);
+
+const jestPath = require.resolve('jest', { paths: [projectDir] });
+const { runCLI } = require(jestPath);
+const jestCli = require(require.resolve('jest-cli', { paths: [path.dirname(jestPath)] }));
+
+const reply = process.stdout.write.bind(process.stdout);
+
+// Fallback for jest-cli versions without buildArgv: --name=value, --flag and positionals
+function parseArgs(args) {
+  const argv = { _: [], $0: 'jest' };
+  for (const arg of args) {
+    if (!arg.startsWith('--')) {
+      argv._.push(arg);
+      continue;
+    }
+    const [name, ...rest] = arg.slice(2).split('=');
+    const key = name.replace(/-([a-z])/g, (_, c) => c.toUpperCase());
+    const value = rest.length ? rest.join('=') : true;
+    argv[key] = /^\d+$/.test(value) ? Number(value) : value;
+  }
+  return argv;
+}
+
+async function run(args) {
+  const argv = jestCli.buildArgv ? await jestCli.buildArgv(args) : parseArgs(args);
+  const output = [];
+  const streams = [process.stdout, process.stderr];
+  const writes = streams.map((stream) => stream.write);
+  streams.forEach((stream) => {
+    stream.write = (chunk, encoding, callback) => {
+      output.push(String(chunk));
+      if (typeof encoding === 'function') encoding();
+      else if (typeof callback === 'function') callback();
+      return true;
+    };
+  });
+  try {
+    const { results } = await runCLI(argv, [projectDir]);
+    return { code: results.success ? 0 : 1, output: output.join('') };
+  } catch (error) {
+    return { code: 1, output: output.join('') + String((error && error.stack) || error) };
+  } finally {
+    streams.forEach((stream, i) => {
+      stream.write = writes[i];
+    });
+  }
+}
+
+// One request at a time, in order
+let queue = Promise.resolve();
+readline.createInterface({ input: process.stdin }).on('line', (line) => {
+  queue = queue.then(async () => {
+    let response;
+    try {
+      response = await run(JSON.parse(line).argv || []);
+    } catch (error) {
+      response = { code: 1, output: String((error && error.stack) || error) };
+    }
+    reply(JSON.stringify(response) + '\n');
+  });
+});
@@ -0,0 +1,4 @@
+"""
+OpenPilot pipeline helpers
+Shared building blocks for the test and auto-fix runners in scripts/ and tests/.
+"""
@@ -0,0 +1,247 @@
+"""
+Lockfile-keyed dependency audit
+Caches `npm audit` results per lockfile hash so the feedback loop only re-audits
+when dependencies actually change, and can match installed versions against a
+local advisory database instead of the registry for offline, deterministic runs.
+
+The advisory database uses the npm bulk advisory format:
+    {"package-name": [{"id": 1, "title": "...", "severity": "high",
+                       "vulnerable_versions": "<1.2.3", "url": "..."}]}
+"""
+
+import json
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .cache import CACHE_DIR, ROOT_DIR, JsonCache, file_digest, text_digest
+from .shell import TIMED_OUT, run_command
+
+LOCKFILES = ['package-lock.json', 'npm-shrinkwrap.json']
+SEVERITIES = ['info', 'low', 'moderate', 'high', 'critical']
+
+
+# Precedence key of a version: (major, minor, patch, is_release, prerelease identifiers)
+Version = Tuple
+RELEASE = (1, ())
+
+
+def _prerelease(tag: Optional[str]) -> Tuple:
+    """Key for a prerelease tag; a release sorts above every prerelease of it
+
+    Numeric identifiers compare numerically and below alphanumeric ones.
+    """
+    if not tag:
+        return RELEASE
+    return (0, tuple((0, int(part)) if part.isdigit() else (1, part) for part in tag.split('.')))
+
+
+def _release(major: int, minor: int, patch: int) -> Version:
+    return (major, minor, patch) + RELEASE
+
+
+def _parse_version(version: str) -> Optional[Version]:
+    match = re.match(r'^\s*v?(\d+)(?:\.(\d+))?(?:\.(\d+))?(?:-([0-9A-Za-z.-]+))?', version)
+    if not match:
+        return None
+    return tuple(int(part or 0) for part in match.groups()[:3]) + _prerelease(match.group(4))
+
+
+def _expand_partial(op: str, version: str) -> List[Tuple[str, Version]]:
+    """Turn x-ranges and partial versions such as `1.x` or `>=2` into plain comparators"""
+    parts = re.split(r'\.', version.lstrip('v'))
+    numbers = []
+    for part in parts[:3]:
+        if part in ('x', 'X', '*', ''):
+            break
+        numbers.append(int(re.match(r'\d+', part).group()))
+    if len(numbers) == 3:
+        return [(op or '=', _parse_version(version))]
+    if not numbers:
+        return [] if op in ('', '=', '>=', '<=') else [('<', _release(0, 0, 0))]
+    low = numbers + [0] * (3 - len(numbers))
+    high = list(low)
+    high[len(numbers) - 1] += 1
+    for i in range(len(numbers), 3):
+        high[i] = 0
+    low, high = _release(*low), _release(*high)
+    if op in ('', '='):
+        return [('>=', low), ('<', high)]
+    if op == '>':
+        return [('>=', high)]
+    if op == '<=':
+        return [('<', high)]
+    return [(op, low)]
+
+
+def _comparators(part: str) -> List[Tuple[str, Version]]:
+    """Translate one space-separated semver comparator set into (op, version) pairs"""
+    part = part.strip()
+    hyphen = re.match(r'^(\S+)\s+-\s+(\S+)$', part)
+    if hyphen:
+        return _expand_partial('>=', hyphen.group(1)) + _expand_partial('<=', hyphen.group(2))
+    result = []
+    for token in re.sub(r'(<=|>=|<|>|=|\^|~)\s+', r'\1', part).split():
+        op = re.match(r'^(<=|>=|<|>|=|\^|~)?', token).group(1) or ''
+        version = token[len(op):].split('+')[0]
+        base = _parse_version(version)
+        if op == '^' and base:
+            major, minor, patch = base[:3]
+            upper = (major + 1, 0, 0) if major else (0, minor + 1, 0) if minor else (0, 0, patch + 1)
+            result += [('>=', base), ('<', _release(*upper))]
+        elif op == '~' and base:
+            result += [('>=', base), ('<', _release(base[0], base[1] + 1, 0))]
+        else:
+            result += _expand_partial(op, version)
+    return result
+
+
+def satisfies(version: str, spec: str) -> bool:
+    """Minimal semver range check covering the ranges npm advisories use
+
+    Versions compare by semver precedence, so a prerelease sorts below its release.
+    """
+    parsed = _parse_version(version)
+    if parsed is None:
+        return False
+    checks = {
+        '<': lambda a, b: a < b, '<=': lambda a, b: a <= b,
+        '>': lambda a, b: a > b, '>=': lambda a, b: a >= b, '=': lambda a, b: a == b,
+    }
+    for alternative in spec.split('||'):
+        comparators = _comparators(alternative)
+        if alternative.strip() in ('', '*') or all(checks[op](parsed, bound) for op, bound in comparators):
+            return True
+    return False
+
+
+def installed_packages(lockfile: Path) -> Dict[str, set]:
+    """Map package name to the set of versions a package-lock.json installs"""
+    data = json.loads(lockfile.read_text(encoding='utf-8'))
+    versions: Dict[str, set] = {}
+    if 'packages' in data:
+        for location, meta in data['packages'].items():
+            if 'node_modules/' not in location or meta.get('link') or 'version' not in meta:
+                continue
+            name = meta.get('name') or location.rsplit('node_modules/', 1)[1]
+            versions.setdefault(name, set()).add(meta['version'])
+    else:
+        stack = [data.get('dependencies', {})]
+        while stack:
+            for name, meta in stack.pop().items():
+                if 'version' in meta:
+                    versions.setdefault(name, set()).add(meta['version'])
+                stack.append(meta.get('dependencies', {}))
+    return versions
+
+
+def empty_summary() -> Dict:
+    return {'total': 0, 'by_severity': {s: 0 for s in SEVERITIES}, 'advisories': [], 'error': ''}
+
+
+class DependencyAuditor:
+    """Audit each lockfile once per content hash, online via npm or offline via an advisory db"""
+
+    def __init__(self, root: Path = None, advisory_db: Path = None):
+        self.root = Path(root or ROOT_DIR)
+        db = advisory_db or os.environ.get('OPENPILOT_ADVISORY_DB')
+        self.advisory_db = Path(db) if db else None
+        self.cache = JsonCache('audit', CACHE_DIR)
+        self._advisories = None
+
+    def lockfiles(self) -> List[Path]:
+        found = []
+        for directory in [self.root] + sorted(p for p in self.root.iterdir() if p.is_dir()):
+            if directory.name.startswith('.') or directory.name == 'node_modules':
+                continue
+            found.extend(directory / name for name in LOCKFILES if (directory / name).exists())
+        return found
+
+    def _cache_key(self, lockfile: Path) -> str:
+        source = f"db:{file_digest(self.advisory_db)}" if self.advisory_db else 'npm'
+        return text_digest(str(lockfile.relative_to(self.root)), file_digest(lockfile) or '', source)
+
+    def _load_advisories(self) -> Dict[str, List[Dict]]:
+        if self._advisories is None:
+            self._advisories = json.loads(self.advisory_db.read_text(encoding='utf-8'))
+        return self._advisories
+
+    def audit_offline(self, lockfile: Path) -> Dict:
+        """Match installed versions against the local advisory database"""
+        summary = empty_summary()
+        try:
+            advisories = self._load_advisories()
+            installed = installed_packages(lockfile)
+        except (OSError, ValueError) as e:
+            summary['error'] = f"Could not read advisory data: {e}"
+            return summary
+        for name, entries in advisories.items():
+            for version in sorted(installed.get(name, ())):
+                for advisory in entries:
+                    if satisfies(version, advisory.get('vulnerable_versions', '*')):
+                        severity = advisory.get('severity', 'moderate')
+                        summary['by_severity'][severity] = summary['by_severity'].get(severity, 0) + 1
+                        summary['advisories'].append({
+                            'package': name,
+                            'version': version,
+                            'id': advisory.get('id'),
+                            'title': advisory.get('title', ''),
+                            'severity': severity,
+                            'url': advisory.get('url', ''),
+                        })
+        summary['total'] = len(summary['advisories'])
+        return summary
+
+    def audit_online(self, lockfile: Path) -> Dict:
+        """Run `npm audit --json` next to the lockfile and normalise its report"""
+        summary = empty_summary()
+        _, stdout, stderr = run_command([shutil.which('npm') or 'npm', 'audit', '--json', '--package-lock-only'],
+                                        cwd=lockfile.parent, timeout=300)
+        if stderr.startswith(TIMED_OUT):
+            summary['error'] = f"npm audit: {stderr}"
+            return summary
+        try:
+            data = json.loads(stdout)
+        except ValueError as e:
+            summary['error'] = f"npm audit produced no report: {stderr.strip() or e}"
+            return summary
+
+        if 'error' in data:
+            error = data['error']
+            summary['error'] = error.get('summary', str(error)) if isinstance(error, dict) else str(error)
+            return summary
+        counts = data.get('metadata', {}).get('vulnerabilities', {})
+        for severity in SEVERITIES:
+            summary['by_severity'][severity] = counts.get(severity, 0)
+        summary['total'] = counts.get('total', sum(summary['by_severity'].values()))
+        for name, vuln in data.get('vulnerabilities', {}).items():
+            summary['advisories'].append({
+                'package': name,
+                'version': vuln.get('range', ''),
+                'id': None,
+                'title': ', '.join(v['title'] for v in vuln.get('via', []) if isinstance(v, dict)),
+                'severity': vuln.get('severity', 'moderate'),
+                'url': '',
+            })
+        return summary
+
+    def audit(self, lockfile: Path) -> Dict:
+        key = self._cache_key(lockfile)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return dict(cached, cached=True)
+        summary = self.audit_offline(lockfile) if self.advisory_db else self.audit_online(lockfile)
+        # Failed audits are not cached so the next iteration retries them
+        if not summary['error']:
+            self.cache.put(key, summary)
+            self.cache.save()
+        return dict(summary, cached=False)
+
+    def run(self) -> Dict[str, Dict]:
+        """Audit every lockfile in the repo, keyed by its path relative to the root"""
+        return {
+            str(lockfile.relative_to(self.root)): self.audit(lockfile)
+            for lockfile in self.lockfiles()
+        }
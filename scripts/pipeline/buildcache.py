@@ -0,0 +1,219 @@
+"""
+Content-addressed build/test cache with an optional shared HTTP backend
+A step's action key is the digest of its definition, the node version, the
+lockfiles of its package and the root, plus the content of every file matching
+its `inputs`. Passing results (exit code, output, step data) are
+stored under /ac/<key> and the files matching its `outputs` as blobs under
+/cas/<sha256>, first on local disk and then on the remote server, if one is
+configured (see scripts/cache-server.py). When the server cannot be reached the
+cache quietly degrades to local-only for the rest of the run.
+"""
+
+import hashlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .cache import CACHE_DIR, ROOT_DIR, JsonCache, file_digest, text_digest
+from .distributed import output_files
+from .engine import Step, matches
+from .packagestore import LOCKFILES, node_version
+
+REMOTE_CACHE_ENV = 'OPENPILOT_REMOTE_CACHE'
+TOKEN_ENV = 'OPENPILOT_REMOTE_CACHE_TOKEN'
+# Bump to invalidate every entry after a change to what the key covers
+KEY_VERSION = '2'
+
+
+class RemoteCache:
+    """Client for the /ac and /cas HTTP protocol"""
+
+    def __init__(self, url: str, token: str = None, timeout: float = 10):
+        self.url = url.rstrip('/')
+        self.token = token if token is not None else os.environ.get(TOKEN_ENV, '')
+        self.timeout = timeout
+        self.available = True
+        self.error = ''
+
+    def _request(self, method: str, path: str, data: bytes = None) -> Optional[bytes]:
+        """Body of a 2xx response or None; connection, auth and server errors disable the remote"""
+        if not self.available:
+            return None
+        request = urllib.request.Request(f"{self.url}/{path}", data=data, method=method)
+        if self.token:
+            request.add_header('Authorization', f"Bearer {self.token}")
+        if data is not None:
+            request.add_header('Content-Type', 'application/octet-stream')
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.read()
+        except urllib.error.HTTPError as e:
+            # A rejected entry is not a reason to stop using the server; auth and server errors are
+            if e.code not in (401, 403) and e.code < 500:
+                return None
+            self.error = f"{method} /{path}: HTTP {e.code}"
+        except (urllib.error.URLError, OSError) as e:
+            self.error = f"{self.url} unreachable: {getattr(e, 'reason', e)}"
+        self.available = False
+        return None
+
+    def get(self, kind: str, key: str) -> Optional[bytes]:
+        return self._request('GET', f"{kind}/{key}")
+
+    def put(self, kind: str, key: str, data: bytes) -> bool:
+        return self._request('PUT', f"{kind}/{key}", data) is not None
+
+
+class BuildCache:
+    """Two-level (local disk, then remote) action and blob store for pipeline steps"""
+
+    def __init__(self, root: Path = None, remote_url: str = None, local_dir: Path = None):
+        self.root = Path(root or ROOT_DIR)
+        self.local_dir = Path(local_dir or CACHE_DIR / 'build-cache')
+        remote_url = remote_url or os.environ.get(REMOTE_CACHE_ENV)
+        self.remote = RemoteCache(remote_url) if remote_url else None
+        self.hits = {'local': 0, 'remote': 0}
+        self.misses = 0
+        self.uploads = 0
+        self._lock = threading.Lock()
+
+    def _local_path(self, kind: str, key: str) -> Path:
+        return self.local_dir / kind / key[:2] / key
+
+    def _read(self, kind: str, key: str) -> Tuple[Optional[bytes], str]:
+        """(data, 'local' | 'remote'); remote hits are kept locally for next time"""
+        try:
+            return self._local_path(kind, key).read_bytes(), 'local'
+        except OSError:
+            pass
+        if self.remote is None:
+            return None, ''
+        data = self.remote.get(kind, key)
+        if data is not None:
+            self._write_local(kind, key, data)
+        return data, 'remote'
+
+    def _write_local(self, kind: str, key: str, data: bytes) -> None:
+        path = self._local_path(kind, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    def _write(self, kind: str, key: str, data: bytes) -> None:
+        self._write_local(kind, key, data)
+        if self.remote is not None:
+            self.remote.put(kind, key, data)
+
+    def _repo_files(self) -> List[str]:
+        try:
+            result = subprocess.run(['git', 'ls-files', '--cached', '--others', '--exclude-standard'],
+                                    cwd=self.root, capture_output=True, text=True, timeout=60)
+        except (OSError, subprocess.TimeoutExpired):
+            return []
+        return result.stdout.splitlines() if result.returncode == 0 else []
+
+    def action_key(self, step: Step) -> Optional[str]:
+        """Digest of the step definition, platform, node version, lockfiles and input contents
+
+        None if it cannot be keyed. Lockfiles count even when `inputs` does not list them,
+        so an `npm update` or another Node never replays a result from other dependencies.
+        """
+        if not step.inputs:
+            return None
+        files = sorted(path for path in self._repo_files() if matches(path, step.inputs))
+        if not files:
+            return None
+        parts = [
+            KEY_VERSION, step.id, step.run or '', step.call or '', step.cwd,
+            sys.platform, platform.machine(), ' '.join(step.outputs), node_version(),
+        ]
+        for directory in sorted({step.cwd, '.'}):
+            for name in LOCKFILES:
+                lockfile = self.root / directory / name
+                if lockfile.exists():
+                    parts += [f"lock:{directory}/{name}", file_digest(lockfile) or 'missing']
+        for path in files:
+            parts += [path, file_digest(self.root / path) or 'missing']
+        return text_digest(*parts)
+
+    def lookup(self, key: str, step: Step) -> Optional[Dict]:
+        """Restore the cached passing result and outputs recorded under an action key, if any
+
+        An entry listing a file outside the step's declared outputs (or outside the
+        repo) is treated as a miss and nothing of it is written.
+        """
+        data, source = self._read('ac', key)
+        entry, blobs = None, {}
+        root = self.root.resolve()
+        if data is not None:
+            try:
+                entry = json.loads(data)
+                for path, digest in entry.get('outputs', {}).items():
+                    target = (root / path).resolve()
+                    if root not in target.parents or not matches(target.relative_to(root).as_posix(), step.outputs):
+                        entry = None
+                        break
+                    blob, _ = self._read('cas', digest)
+                    if blob is None or hashlib.sha256(blob).hexdigest() != digest:
+                        entry = None
+                        break
+                    blobs[path] = blob
+            except (ValueError, AttributeError):
+                entry = None
+        totals = JsonCache.stats.setdefault('build-cache', {'hits': 0, 'misses': 0})
+        if entry is None:
+            with self._lock:
+                self.misses += 1
+                totals['misses'] += 1
+            return None
+        for path, blob in blobs.items():
+            target = (root / path).resolve()
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_bytes(blob)
+        with self._lock:
+            self.hits[source] += 1
+            totals['hits'] += 1
+        entry['source'] = source
+        return entry
+
+    def store(self, key: str, step: Step, code: int, stdout: str, stderr: str, data=None) -> bool:
+        """Record a passing result and upload the files matching the step's outputs
+
+        The key must be computed before the step runs, since its outputs may touch its inputs.
+        """
+        try:
+            json.dumps(data)
+        except (TypeError, ValueError):
+            return False
+        entry = {'code': code, 'stdout': stdout, 'stderr': stderr, 'data': data, 'outputs': {}}
+        for path in output_files(self.root, step.outputs):
+            blob = (self.root / path).read_bytes()
+            digest = hashlib.sha256(blob).hexdigest()
+            self._write('cas', digest, blob)
+            entry['outputs'][path] = digest
+        self._write('ac', key, json.dumps(entry).encode('utf-8'))
+        with self._lock:
+            self.uploads += 1
+        return True
+
+    def status(self) -> str:
+        """One line for the reports"""
+        remote = 'local only'
+        if self.remote is not None:
+            remote = self.remote.url if self.remote.available else f"local only ({self.remote.error})"
+        return (f"build cache [{remote}]: {self.hits['local']} local hits, {self.hits['remote']} remote hits, "
+                f"{self.misses} misses, {self.uploads} stored")
+
+
+def configured_cache(root: Path = None, url: str = None) -> Optional[BuildCache]:
+    """A BuildCache when a server URL is given or set in OPENPILOT_REMOTE_CACHE, else None"""
+    url = url or os.environ.get(REMOTE_CACHE_ENV)
+    return BuildCache(root, url) if url else None
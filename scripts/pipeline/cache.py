@@ -0,0 +1,94 @@
+"""
+Content-hash helpers and the on-disk JSON cache used by the runners
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+ROOT_DIR = Path(__file__).resolve().parent.parent.parent
+CACHE_DIR = Path(os.environ.get('OPENPILOT_CACHE_DIR', ROOT_DIR / '.openpilot-cache'))
+
+
+def file_digest(path: Path) -> Optional[str]:
+    """Return the sha256 of a file's contents, or None if it cannot be read"""
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 16), b''):
+                digest.update(block)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def text_digest(*parts: str) -> str:
+    """Return the sha256 of the given strings joined together"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def files_digest(paths: Iterable[Path]) -> str:
+    """Return one digest covering the names and contents of several files"""
+    parts = []
+    for path in sorted(Path(p) for p in paths):
+        parts.append(str(path))
+        parts.append(file_digest(path) or 'missing')
+    return text_digest(*parts)
+
+
+class JsonCache:
+    """A small key/value store persisted as one JSON file under CACHE_DIR"""
+
+    # Process-wide hit/miss counts per cache name, for the metrics export
+    stats: Dict[str, Dict[str, int]] = {}
+
+    def __init__(self, name: str, cache_dir: Path = None):
+        self.name = name
+        self.path = Path(cache_dir or CACHE_DIR) / f"{name}.json"
+        self.entries: Dict[str, object] = {}
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        if self.path.exists():
+            try:
+                self.entries = json.loads(self.path.read_text(encoding='utf-8'))
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def get(self, key: str):
+        totals = JsonCache.stats.setdefault(self.name, {'hits': 0, 'misses': 0})
+        if key in self.entries:
+            self.hits += 1
+            totals['hits'] += 1
+            return self.entries[key]
+        self.misses += 1
+        totals['misses'] += 1
+        return None
+
+    def put(self, key: str, value) -> None:
+        self.entries[key] = value
+        self._dirty = True
+
+    def prune(self, keep: Iterable[str]) -> None:
+        """Drop every entry whose key is not in keep"""
+        keep = set(keep)
+        stale = [key for key in self.entries if key not in keep]
+        for key in stale:
+            del self.entries[key]
+        if stale:
+            self._dirty = True
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix('.tmp')
+        tmp.write_text(json.dumps(self.entries), encoding='utf-8')
+        os.replace(tmp, self.path)
+        self._dirty = False
@@ -0,0 +1,78 @@
+"""
+Step checkpoints for resuming interrupted runs
+After every executed step the engine records its result and the working-tree
+snapshot it ran against under CACHE_DIR/checkpoints/<runner>.json. A run
+started with --resume loads the passing ones back into the engine's history,
+so steps whose definition, runner options and inputs are unchanged are carried
+over and the run continues from the first step that did not complete.
+"""
+
+import json
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from .cache import CACHE_DIR, JsonCache, text_digest
+from .engine import PASSED, Pipeline, Step, StepResult
+
+CHECKPOINT_DIR = CACHE_DIR / 'checkpoints'
+
+
+def step_definition(step: Step, options: str = '') -> str:
+    """Digest of what the step does; editing it in pipeline.yml invalidates its checkpoint"""
+    return text_digest(step.run or '', step.call or '', step.cwd, '|'.join(step.inputs), '|'.join(step.needs),
+                       options)
+
+
+def run_options(**options) -> str:
+    """Canonical form of the runner options that change what its steps check"""
+    return json.dumps(options, sort_keys=True, default=sorted)
+
+
+class Checkpoint:
+    """Last executed result of every step of one runner, persisted after each step
+
+    `options` (see run_options) is part of every step's definition, so a result
+    recorded under, say, a different --since scope is never carried over.
+    """
+
+    def __init__(self, name: str, cache_dir: Path = None, options: str = ''):
+        self.name = name
+        self.options = options
+        self.store = JsonCache(name, cache_dir or CHECKPOINT_DIR)
+
+    def record(self, step: Step, result: StepResult, snapshot: Optional[Dict[str, str]]) -> None:
+        entry = {
+            'definition': step_definition(step, self.options),
+            'snapshot': snapshot,
+            'time': time.time(),
+            'result': {'status': result.status, 'code': result.code, 'stdout': result.stdout,
+                       'stderr': result.stderr, 'duration': result.duration, 'data': result.data,
+                       'log': result.log, 'usage': result.usage},
+        }
+        try:
+            json.dumps(entry)
+        except (TypeError, ValueError):
+            # A handler returned data that cannot be persisted; this step will simply run again
+            return
+        self.store.put(step.id, entry)
+        self.store.save()
+
+    def restore(self, pipeline: Pipeline) -> Dict[str, Tuple[StepResult, Optional[Dict[str, str]]]]:
+        """step id -> (result, snapshot) for the passing steps whose definition is unchanged
+
+        Failed steps are left out so they run again: an interrupt, timeout or
+        preemption is the usual reason a resumed run is needed.
+        """
+        history = {}
+        for step_id, entry in self.store.entries.items():
+            step = pipeline.steps.get(step_id)
+            if step is None or entry.get('definition') != step_definition(step, self.options):
+                continue
+            saved = entry['result']
+            if saved['status'] != PASSED:
+                continue
+            result = StepResult(step_id, saved['status'], saved['code'], saved['stdout'], saved['stderr'],
+                                saved['duration'], data=saved['data'], log=saved['log'], usage=saved['usage'])
+            history[step_id] = (result, entry['snapshot'])
+        return history
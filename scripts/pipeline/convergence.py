@@ -0,0 +1,129 @@
+"""
+Convergence detection for the feedback loops
+Fingerprints each iteration from the hashes of the files changed in the working
+tree plus normalized failure signatures, so a loop can stop as soon as another
+iteration cannot produce a different outcome.
+"""
+
+import re
+import subprocess
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from .cache import ROOT_DIR, file_digest, text_digest
+
+# Generated artifacts that change on every run without affecting the outcome
+EXCLUDED_PARTS = {'node_modules', 'coverage', 'dist', 'build', 'out', '__pycache__', '.openpilot-cache'}
+EXCLUDED_NAMES = {'test-results.json'}
+
+ANSI_ESCAPE = re.compile(r'\x1b\[[0-9;]*[A-Za-z]')
+VOLATILE = [
+    (re.compile(r'\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:\.\d+)?Z?'), '<timestamp>'),
+    (re.compile(r'\b\d+(?:\.\d+)?\s?(?:ms|s|sec|seconds)\b'), '<duration>'),
+    (re.compile(r'0x[0-9a-fA-F]+'), '<addr>'),
+    (re.compile(r'/tmp/[^\s:\'"]+'), '<tmp>'),
+    (re.compile(r'\s+'), ' '),
+]
+
+
+def normalize_failure(text: str, root: Path = None) -> str:
+    """Strip colors, timings, addresses and machine-specific paths from failure output"""
+    text = ANSI_ESCAPE.sub('', text)
+    text = text.replace(str(root or ROOT_DIR), '')
+    for pattern, replacement in VOLATILE:
+        text = pattern.sub(replacement, text)
+    return text.strip()
+
+
+def failure_signature(failures: Iterable, root: Path = None) -> str:
+    """Order-independent digest of a list of failures (dicts or strings)"""
+    parts = []
+    for failure in failures:
+        if isinstance(failure, dict):
+            text = ' '.join(
+                str(failure.get(key, '')) for key in ('type', 'suite', 'location', 'message', 'output')
+            )
+        else:
+            text = str(failure)
+        parts.append(text_digest(normalize_failure(text, root)))
+    return text_digest(*sorted(parts))
+
+
+def _excluded(path: str) -> bool:
+    parts = Path(path).parts
+    return bool(EXCLUDED_PARTS.intersection(parts)) or Path(path).name in EXCLUDED_NAMES
+
+
+def tree_snapshot(root: Path = None) -> Optional[Dict[str, str]]:
+    """Map every modified or untracked file to its content hash, or None outside git"""
+    root = Path(root or ROOT_DIR)
+    try:
+        head = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=root, capture_output=True, text=True, timeout=60)
+        status = subprocess.run(
+            ['git', 'status', '--porcelain=v1', '-z', '--untracked-files=all'],
+            cwd=root, capture_output=True, text=True, timeout=60
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if head.returncode != 0 or status.returncode != 0:
+        return None
+
+    snapshot = {'HEAD': head.stdout.strip()}
+    entries = status.stdout.split('\0')
+    i = 0
+    while i < len(entries):
+        entry = entries[i]
+        i += 1
+        if len(entry) < 4:
+            continue
+        code, path = entry[:2], entry[3:]
+        if 'R' in code or 'C' in code:
+            i += 1  # skip the rename source
+        if _excluded(path):
+            continue
+        snapshot[path] = file_digest(root / path) or 'deleted'
+    return snapshot
+
+
+class ConvergenceTracker:
+    """Decide when a feedback loop has stopped making progress
+
+    Call `check(iteration, previous_failures)` at the top of each iteration,
+    passing the failures the previous iteration ended with. It returns a reason
+    string when the loop should stop, otherwise None.
+    """
+
+    def __init__(self, root: Path = None):
+        self.root = Path(root or ROOT_DIR)
+        self.trees: List[Optional[str]] = []
+        self.fingerprints: List[str] = []
+        self.failure_counts: List[int] = []
+        self.stop_reason: Optional[str] = None
+
+    def check(self, iteration: int, previous_failures: List = None) -> Optional[str]:
+        snapshot = tree_snapshot(self.root)
+        tree = text_digest(*(f"{k}={v}" for k, v in sorted(snapshot.items()))) if snapshot is not None else None
+
+        if self.trees:
+            previous = iteration - 1
+            failures = list(previous_failures or [])
+            fingerprint = text_digest(tree or '', failure_signature(failures, self.root))
+            if tree is None:
+                # Without git we cannot tell whether anything changed; never stop early
+                fingerprint = text_digest(fingerprint, str(iteration))
+            elif tree == self.trees[-1]:
+                self.stop_reason = (
+                    f"iteration {previous} changed no files, so iteration {iteration} would repeat "
+                    f"its {len(failures)} failure(s)"
+                )
+            elif fingerprint in self.fingerprints:
+                earlier = self.fingerprints.index(fingerprint) + 1
+                self.stop_reason = (
+                    f"iteration {previous} ended with the same files and failures as iteration {earlier} "
+                    f"(fixes are cycling)"
+                )
+            self.fingerprints.append(fingerprint)
+            self.failure_counts.append(len(failures))
+
+        self.trees.append(tree)
+        return self.stop_reason
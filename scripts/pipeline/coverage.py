@@ -0,0 +1,230 @@
+"""
+Coverage collection and gates
+Merges every package's istanbul output and pytest's coverage JSON into one
+line-level map (overlapping files unioned) and reports it per package. Diff
+coverage maps `git diff <merge-base>` onto the same line data, so a gate can look
+only at changed executable lines and a partial jest run over the related tests is enough.
+"""
+
+import json
+import os
+import re
+import subprocess
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+from .cache import CACHE_DIR, ROOT_DIR
+from .eslint import WORKSPACES
+
+PYTEST_REPORT = CACHE_DIR / 'reports' / 'pytest-coverage.json'
+ISTANBUL_REPORT = Path('coverage') / 'coverage-final.json'
+
+SOURCE_EXTENSIONS = ('.ts', '.tsx', '.js', '.jsx')
+TEST_FILE = re.compile(r'(^|/)(__tests__|__mocks__)/|\.(test|spec)\.[jt]sx?$|\.d\.ts$')
+HUNK = re.compile(r'^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@')
+
+
+def _git(root: Path, *args: str) -> Optional[str]:
+    try:
+        result = subprocess.run(['git', *args], cwd=root, capture_output=True, text=True, timeout=60)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return result.stdout if result.returncode == 0 else None
+
+
+def changed_lines(root: Path = None, base_ref: str = 'origin/main') -> Optional[Dict[str, Set[int]]]:
+    """Repo-relative path -> line numbers added or modified since the merge base with base_ref
+
+    Compares against the working tree, so uncommitted edits count; untracked
+    files count in full. Returns None when the base ref cannot be resolved.
+    """
+    root = Path(root or ROOT_DIR)
+    base = (_git(root, 'merge-base', base_ref, 'HEAD') or '').strip()
+    if not base:
+        return None
+    diff = _git(root, 'diff', '--unified=0', '--no-color', '--no-ext-diff', '--diff-filter=AMR', base, '--')
+    if diff is None:
+        return None
+
+    changes: Dict[str, Set[int]] = {}
+    current = None
+    for line in diff.splitlines():
+        if line.startswith('+++ '):
+            path = line[4:]
+            current = path[2:] if path.startswith('b/') else None
+            if current:
+                changes.setdefault(current, set())
+            continue
+        match = HUNK.match(line)
+        if match and current:
+            start, count = int(match.group(1)), int(match.group(2) or 1)
+            changes[current].update(range(start, start + count))
+
+    for path in (_git(root, 'ls-files', '--others', '--exclude-standard') or '').splitlines():
+        try:
+            with open(root / path, encoding='utf-8', errors='replace') as f:
+                changes[path] = set(range(1, sum(1 for _ in f) + 1))
+        except OSError:
+            continue
+    return {path: lines for path, lines in changes.items() if lines}
+
+
+def source_changes(changes: Dict[str, Set[int]]) -> Dict[str, Set[int]]:
+    """Only the changed files istanbul instruments: JS/TS sources, not tests or typings"""
+    return {
+        path: lines for path, lines in changes.items()
+        if path.endswith(SOURCE_EXTENSIONS) and not TEST_FILE.search(path)
+    }
+
+
+def line_hits(file_coverage: Dict) -> Dict[int, int]:
+    """Executable line -> hit count for one istanbul file entry (same rule as istanbul's getLineCoverage)"""
+    file_coverage = file_coverage.get('data', file_coverage)
+    hits: Dict[int, int] = {}
+    statements = file_coverage.get('s', {})
+    for key, location in file_coverage.get('statementMap', {}).items():
+        line = location['start']['line']
+        count = statements.get(key, 0)
+        if hits.get(line, -1) < count:
+            hits[line] = count
+    return hits
+
+
+def load_istanbul(path: Path) -> Dict[str, Dict]:
+    """Istanbul file map from coverage-final.json or from a jest --json report's coverageMap"""
+    try:
+        data = json.loads(Path(path).read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return {}
+    if 'coverageMap' in data:
+        data = data['coverageMap'] or {}
+    return data
+
+
+def _relative(path: str, root: Path) -> str:
+    try:
+        return Path(os.path.normpath(path)).relative_to(root).as_posix()
+    except ValueError:
+        return Path(path).as_posix()
+
+
+def pytest_lines(report: Dict) -> Dict[str, Dict[int, int]]:
+    """Path -> {line: hits} from coverage.py's JSON report (hits are 0 or 1)"""
+    lines = {}
+    for path, data in report.get('files', {}).items():
+        hits = {line: 1 for line in data.get('executed_lines', [])}
+        hits.update({line: 0 for line in data.get('missing_lines', [])})
+        lines[path] = hits
+    return lines
+
+
+def merge_lines(target: Dict[str, Dict[int, int]], source: Dict[str, Dict[int, int]], root: Path) -> None:
+    """Union source into target: executable lines are combined and hit counts summed"""
+    for path, hits in source.items():
+        merged = target.setdefault(_relative(path, root), {})
+        for line, count in hits.items():
+            merged[line] = merged.get(line, 0) + count
+
+
+def istanbul_reports(root: Path = None, since: float = None) -> List[Path]:
+    """Every package's coverage-final.json, optionally only those written after `since`"""
+    root = Path(root or ROOT_DIR)
+    reports = []
+    for package in WORKSPACES + ['tests']:
+        path = root / package / ISTANBUL_REPORT
+        if path.exists() and (since is None or path.stat().st_mtime >= since):
+            reports.append(path)
+    return reports
+
+
+def collect_coverage(root: Path = None, since: float = None,
+                     pytest_report: Path = None) -> Dict[str, Dict[int, int]]:
+    """Repo-relative path -> {line: hits} merged from the istanbul reports written
+    after `since` and, when given, a coverage.py JSON report"""
+    root = Path(root or ROOT_DIR).resolve()
+    merged: Dict[str, Dict[int, int]] = {}
+    for report in istanbul_reports(root, since):
+        merge_lines(merged, {path: line_hits(entry) for path, entry in load_istanbul(report).items()}, root)
+    if pytest_report is not None and Path(pytest_report).exists():
+        try:
+            merge_lines(merged, pytest_lines(json.loads(Path(pytest_report).read_text(encoding='utf-8'))), root)
+        except (OSError, ValueError):
+            pass
+    return merged
+
+
+def package_of(path: str) -> str:
+    """Workspace a source file belongs to; all Python tooling is reported as `python`"""
+    if path.endswith('.py'):
+        return 'python'
+    return path.split('/', 1)[0] if '/' in path else 'root'
+
+
+def package_coverage(merged: Dict[str, Dict[int, int]]) -> Dict[str, float]:
+    """Line coverage percentage per package"""
+    totals: Dict[str, List[int]] = {}
+    for path, hits in merged.items():
+        if not hits:
+            continue
+        counts = totals.setdefault(package_of(path), [0, 0])
+        counts[0] += sum(1 for count in hits.values() if count > 0)
+        counts[1] += len(hits)
+    return {package: round(covered / total * 100, 2) for package, (covered, total) in sorted(totals.items())}
+
+
+def diff_coverage(changes: Dict[str, Set[int]], coverage_map: Dict[str, Dict], root: Path = None) -> Dict:
+    """Covered/uncovered changed executable lines per file plus the overall percentage
+
+    Changed sources absent from the coverage map are listed as `unmeasured`.
+    """
+    root = Path(root or ROOT_DIR).resolve()
+    by_path = {_relative(path, root): entry for path, entry in coverage_map.items()}
+    report = {'files': {}, 'unmeasured': [], 'covered': 0, 'total': 0, 'percent': 100.0}
+
+    for path, lines in sorted(source_changes(changes).items()):
+        entry = by_path.get(path)
+        if entry is None:
+            # Coverage produced elsewhere (e.g. a container) has different absolute roots
+            entry = next((e for p, e in by_path.items() if p.endswith('/' + path)), None)
+        if entry is None:
+            report['unmeasured'].append(path)
+            continue
+        hits = line_hits(entry)
+        executable = sorted(line for line in lines if line in hits)
+        if not executable:
+            continue
+        covered = [line for line in executable if hits[line] > 0]
+        report['files'][path] = {
+            'covered': covered,
+            'uncovered': [line for line in executable if hits[line] == 0],
+        }
+        report['covered'] += len(covered)
+        report['total'] += len(executable)
+
+    if report['total']:
+        report['percent'] = round(report['covered'] / report['total'] * 100, 2)
+    return report
+
+
+def jest_partial_args(changes: Dict[str, Set[int]], root: Path, jest_dir: Path) -> List[str]:
+    """Jest arguments that run only the tests related to the changed files and
+    instrument every changed source, even ones no test imports"""
+    root = Path(root)
+    args = ['--coverage', '--passWithNoTests', '--coverageThreshold={}']
+    related = [str(root / path) for path in sorted(changes) if path.endswith(SOURCE_EXTENSIONS)]
+    if related:
+        args += ['--findRelatedTests', *related]
+    for path in sorted(source_changes(changes)):
+        args.append(f"--collectCoverageFrom={os.path.relpath(root / path, jest_dir)}")
+    return args
+
+
+def format_ranges(lines: Iterable[int]) -> str:
+    """[3, 4, 5, 9] -> '3-5, 9'"""
+    ranges = []
+    for line in sorted(lines):
+        if ranges and line == ranges[-1][1] + 1:
+            ranges[-1][1] = line
+        else:
+            ranges.append([line, line])
+    return ', '.join(str(a) if a == b else f"{a}-{b}" for a, b in ranges)
@@ -0,0 +1,409 @@
+"""
+Coordinator/worker execution of pipeline steps over TCP
+The coordinator queues `run:` steps per connected worker and idle workers steal
+from the back of the busiest queue. Workers execute a step in their own
+checkout and ship back the exit code, output and the step's declared `outputs`
+(coverage reports, build artifacts), which the coordinator writes into its tree.
+
+Wire format: one JSON object per line.
+  worker -> coordinator   {"type": "hello", "worker": name, "token": ..., "revision": ...}
+                          {"type": "ready"}
+                          {"type": "result", "id": ..., "revision": ..., "definition": ..., "code": ...,
+                           "stdout": ..., "stderr": ..., "duration": ..., "usage": {...}, "jest": {...},
+                           "artifacts": {path: base64 gzip}}
+  coordinator -> worker   {"type": "job", "id": ..., "step": ...}
+                          {"type": "rejected", "reason": ...}
+                          {"type": "done"}
+
+Only step ids cross the wire: a worker runs the command its own pipeline.yml
+declares for that id and refuses ids it does not know, and the coordinator only
+writes shipped files that match the step's declared `outputs`. Workers whose
+checkout is on another commit are turned away, and a result for a step whose
+definition differs from the coordinator's is failed and its outputs dropped.
+"""
+
+import base64
+import gzip
+import ipaddress
+import json
+import os
+import socket
+import socketserver
+import subprocess
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, Tuple
+
+from .cache import ROOT_DIR
+from .checkpoint import step_definition
+from .engine import Pipeline, Step, load_pipeline, matches, run_step
+from .processes import processes
+
+DEFAULT_PORT = 7400
+TOKEN_ENV = 'OPENPILOT_DIST_TOKEN'
+MAX_ARTIFACT_BYTES = 64 * 1024 * 1024
+SKIP_DIRS = {'node_modules', '.git', '.openpilot-cache'}
+
+
+class WorkerRejected(Exception):
+    """Raised on a worker the coordinator turned away"""
+
+
+def revision(root: Path) -> Optional[str]:
+    """The commit a checkout is on, or None outside git"""
+    try:
+        head = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=root, capture_output=True, text=True, timeout=60)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return head.stdout.strip() if head.returncode == 0 else None
+
+
+def parse_address(address: str, default_host: str = '127.0.0.1') -> Tuple[str, int]:
+    """'host:port', ':port' or 'port' -> (host, port)"""
+    host, _, port = address.rpartition(':')
+    return host or default_host, int(port or DEFAULT_PORT)
+
+
+def is_loopback(host: str) -> bool:
+    try:
+        return ipaddress.ip_address(socket.gethostbyname(host)).is_loopback
+    except (OSError, ValueError):
+        return False
+
+
+def _send(stream, message: Dict) -> None:
+    stream.write(json.dumps(message).encode('utf-8') + b'\n')
+    stream.flush()
+
+
+def _receive(stream) -> Optional[Dict]:
+    line = stream.readline()
+    if not line:
+        return None
+    return json.loads(line)
+
+
+def output_files(root: Path, patterns: List[str]) -> List[str]:
+    """Relative posix paths of the files under root matching the output globs"""
+    files = set()
+    for pattern in patterns:
+        # Walk only below the literal prefix of the glob
+        prefix = []
+        for part in pattern.split('/'):
+            if any(c in part for c in '*?['):
+                break
+            prefix.append(part)
+        base = root.joinpath(*prefix) if prefix else root
+        if base.is_file():
+            candidates = [base]
+        else:
+            candidates = []
+            for dirpath, dirnames, filenames in os.walk(base):
+                dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS]
+                candidates.extend(Path(dirpath) / name for name in filenames)
+        for path in candidates:
+            rel = path.relative_to(root).as_posix()
+            if matches(rel, [pattern]):
+                files.add(rel)
+    return sorted(files)
+
+
+def collect_outputs(root: Path, patterns: List[str]) -> Dict[str, str]:
+    """Files under root matching the output globs, as {relative path: base64 gzip}"""
+    artifacts: Dict[str, str] = {}
+    total = 0
+    for rel in output_files(root, patterns):
+        data = gzip.compress((root / rel).read_bytes())
+        total += len(data)
+        if total > MAX_ARTIFACT_BYTES:
+            raise ValueError(f"Outputs of more than {MAX_ARTIFACT_BYTES >> 20} MB cannot be shipped")
+        artifacts[rel] = base64.b64encode(data).decode('ascii')
+    return artifacts
+
+
+def write_artifacts(root: Path, artifacts: Dict[str, str], patterns: List[str]) -> List[str]:
+    """Write shipped outputs into root, refusing paths outside it or outside the output globs"""
+    root = root.resolve()
+    written = []
+    for rel, blob in artifacts.items():
+        target = (root / rel).resolve()
+        if root not in target.parents or not matches(target.relative_to(root).as_posix(), patterns):
+            continue
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(gzip.decompress(base64.b64decode(blob)))
+        written.append(rel)
+    return written
+
+
+class _Job:
+    def __init__(self, job_id: int, step: Step):
+        self.id = job_id
+        self.step = step
+        self.future: Future = Future()
+
+    def message(self) -> Dict:
+        return {'type': 'job', 'id': self.id, 'step': self.step.id}
+
+
+class _WorkerHandler(socketserver.StreamRequestHandler):
+    """One connection per worker slot; serves jobs until the coordinator closes"""
+
+    def handle(self):
+        coordinator: 'Coordinator' = self.server.coordinator
+        hello = _receive(self.rfile)
+        if not hello or hello.get('type') != 'hello' or hello.get('token', '') != coordinator.token:
+            return
+        name = f"{hello.get('worker', 'worker')}@{self.client_address[0]}:{self.client_address[1]}"
+        if hello.get('revision') != coordinator.revision:
+            reason = f"worker is on {hello.get('revision')}, coordinator on {coordinator.revision}"
+            _send(self.wfile, {'type': 'rejected', 'reason': reason})
+            return
+        coordinator.register(name)
+        job = None
+        try:
+            while True:
+                message = _receive(self.rfile)
+                if message is None:
+                    break
+                if message.get('type') == 'result':
+                    if job is not None and message.get('id') == job.id:
+                        coordinator.complete(name, job, message)
+                        job = None
+                    continue
+                if message.get('type') != 'ready':
+                    continue
+                job = coordinator.next_job(name)
+                if job is None:
+                    _send(self.wfile, {'type': 'done'})
+                    break
+                _send(self.wfile, job.message())
+        except (OSError, ValueError):
+            pass
+        finally:
+            coordinator.unregister(name, job)
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class Coordinator:
+    """Hand `run:` steps to remote workers; plug into Engine(remote=...)"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = DEFAULT_PORT, root: Path = None,
+                 token: str = None, worker_timeout: float = 300):
+        self.root = Path(root or ROOT_DIR)
+        self.revision = revision(self.root)
+        self.worker_timeout = worker_timeout
+        self.token = token if token is not None else os.environ.get(TOKEN_ENV, '')
+        if not self.token and not is_loopback(host):
+            raise ValueError(f"Refusing to listen on {host} without a token; set {TOKEN_ENV}")
+        self.queues: Dict[str, Deque[_Job]] = {}
+        self.pending: Deque[_Job] = deque()
+        self.affinity: Dict[str, str] = {}
+        self.stolen = 0
+        self.closed = False
+        self._next_id = 0
+        self._lock = threading.Condition()
+        self._server = _Server((host, port), _WorkerHandler)
+        self._server.coordinator = self
+        self.address = self._server.server_address
+
+    def start(self) -> 'Coordinator':
+        threading.Thread(target=self._server.serve_forever, name='coordinator', daemon=True).start()
+        return self
+
+    def close(self) -> None:
+        with self._lock:
+            self.closed = True
+            self._lock.notify_all()
+        self._server.shutdown()
+        self._server.server_close()
+
+    @property
+    def workers(self) -> List[str]:
+        with self._lock:
+            return list(self.queues)
+
+    def wait_for_workers(self, count: int, timeout: float = None) -> bool:
+        deadline = None if timeout is None else time.time() + timeout
+        with self._lock:
+            while len(self.queues) < count:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._lock.wait(remaining)
+        return True
+
+    def register(self, worker: str) -> None:
+        with self._lock:
+            self.queues[worker] = deque()
+            self._lock.notify_all()
+
+    def unregister(self, worker: str, in_flight: Optional[_Job]) -> None:
+        """A lost worker's queued and running jobs go back to the shared queue"""
+        with self._lock:
+            orphans = list(self.queues.pop(worker, []))
+            if in_flight is not None and not in_flight.future.done():
+                orphans.insert(0, in_flight)
+            self.pending.extendleft(reversed(orphans))
+            self._lock.notify_all()
+
+    def submit(self, step: Step) -> Future:
+        """Queue a step on the worker that last ran it, else on the shortest queue"""
+        with self._lock:
+            self._next_id += 1
+            job = _Job(self._next_id, step)
+            worker = self.affinity.get(step.id)
+            if worker not in self.queues:
+                worker = min(self.queues, key=lambda w: len(self.queues[w]), default=None)
+            if worker is None:
+                self.pending.append(job)
+            else:
+                self.queues[worker].append(job)
+            self._lock.notify_all()
+        return job.future
+
+    def next_job(self, worker: str) -> Optional[_Job]:
+        """Own queue first, then the shared queue, then steal from the busiest worker"""
+        with self._lock:
+            while not self.closed:
+                own = self.queues.get(worker)
+                if own:
+                    return own.popleft()
+                if self.pending:
+                    return self.pending.popleft()
+                victim = max((w for w in self.queues if w != worker), key=lambda w: len(self.queues[w]),
+                             default=None)
+                if victim is not None and self.queues[victim]:
+                    self.stolen += 1
+                    return self.queues[victim].pop()
+                self._lock.wait(1.0)
+        return None
+
+    def complete(self, worker: str, job: _Job, message: Dict) -> None:
+        artifacts = message.get('artifacts') or {}
+        code = int(message.get('code', 1))
+        stderr = message.get('stderr', '')
+        if message.get('revision') != self.revision or message.get('definition') != step_definition(job.step):
+            # The worker ran something else than this checkout would have; keep none of it
+            code, artifacts = code or 1, {}
+            stderr += (f"\nDiscarded: {worker} ran '{job.step.id}' from a different revision "
+                       f"or step definition than the coordinator")
+        written = write_artifacts(self.root, artifacts, job.step.outputs)
+        refused = sorted(set(artifacts) - set(written))
+        if refused:
+            stderr += f"\nRefused files outside the step's outputs: {', '.join(refused)}"
+        data = {'worker': worker, 'artifacts': written, 'duration': message.get('duration', 0.0),
+                'usage': message.get('usage')}
+        if message.get('jest'):
+            data['jest'] = message['jest']
+        with self._lock:
+            self.affinity[job.step.id] = worker
+        job.future.set_result((code, message.get('stdout', ''), stderr, data))
+
+    def execute(self, step: Step) -> Tuple[int, str, str, Dict]:
+        """Run a step remotely and block until a worker reports back
+
+        Fails the step if no worker has been connected for `worker_timeout` seconds.
+        """
+        future = self.submit(step)
+        idle_since = None
+        while True:
+            try:
+                return future.result(timeout=1.0)
+            except FutureTimeout:
+                pass
+            with self._lock:
+                if self.queues:
+                    idle_since = None
+                    continue
+                idle_since = idle_since or time.time()
+                if time.time() - idle_since < self.worker_timeout:
+                    continue
+                self.pending = deque(job for job in self.pending if job.future is not future)
+            return 1, '', f"No worker connected for {self.worker_timeout:.0f}s", {}
+
+
+class Worker:
+    """Connect to a coordinator and execute the jobs it hands out in this checkout
+
+    Jobs name a step; what runs is this checkout's definition of it.
+    """
+
+    def __init__(self, address: str, root: Path = None, name: str = None, token: str = None,
+                 pipeline: Pipeline = None):
+        self.host, self.port = parse_address(address)
+        self.root = Path(root or ROOT_DIR)
+        self.pipeline = pipeline or load_pipeline()
+        self.name = name or socket.gethostname()
+        self.token = token if token is not None else os.environ.get(TOKEN_ENV, '')
+        self.completed = 0
+
+    def _connect(self, timeout: float) -> socket.socket:
+        deadline = time.time() + timeout
+        delay = 0.2
+        while True:
+            try:
+                return socket.create_connection((self.host, self.port), timeout=10)
+            except OSError:
+                if time.time() >= deadline:
+                    raise
+                time.sleep(delay)
+                delay = min(delay * 2, 5.0)
+
+    def execute(self, job: Dict) -> Dict:
+        step = self.pipeline.steps.get(job.get('step'))
+        if step is None or not step.run:
+            return {'type': 'result', 'id': job['id'], 'code': 1, 'stdout': '',
+                    'stderr': f"Worker {self.name} has no `run:` step {job.get('step')!r}"}
+        start = time.time()
+        with processes.accounting() as usage:
+            # The same command a local run would use, including jest's planned workers and cache
+            code, stdout, stderr, data = run_step(step, self.root)
+        result = {
+            'type': 'result',
+            'id': job['id'],
+            'revision': revision(self.root),
+            'definition': step_definition(step),
+            'code': code,
+            'stdout': stdout,
+            'stderr': stderr,
+            'duration': time.time() - start,
+            'usage': usage.summary(),
+        }
+        if data:
+            result.update(data)
+        try:
+            result['artifacts'] = collect_outputs(self.root, step.outputs)
+        except (OSError, ValueError) as e:
+            result['stderr'] += f"\nCould not ship outputs: {e}"
+        return result
+
+    def run(self, connect_timeout: float = 60) -> int:
+        """Serve jobs until the coordinator says done; returns the number of jobs run
+
+        Raises WorkerRejected when the coordinator refuses this checkout's revision.
+        """
+        with self._connect(connect_timeout) as sock:
+            sock.settimeout(None)
+            stream = sock.makefile('rwb')
+            _send(stream, {'type': 'hello', 'worker': self.name, 'token': self.token,
+                           'revision': revision(self.root)})
+            _send(stream, {'type': 'ready'})
+            while True:
+                message = _receive(stream)
+                if message is not None and message.get('type') == 'rejected':
+                    raise WorkerRejected(message.get('reason', 'rejected by the coordinator'))
+                if message is None or message.get('type') == 'done':
+                    break
+                if message.get('type') == 'job':
+                    _send(stream, self.execute(message))
+                    self.completed += 1
+                    _send(stream, {'type': 'ready'})
+        return self.completed
@@ -0,0 +1,413 @@
+"""
+Pipeline engine
+Loads pipeline.yml, compiles a target into a dependency graph of steps and
+executes it, running independent steps concurrently when jobs > 1.
+"""
+
+import os
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import yaml
+
+from .cache import ROOT_DIR
+from .convergence import tree_snapshot
+from .jestcache import with_cache
+from .jestworkers import planner
+from .logstore import LogStore, tail
+from .planning import simulate
+from .processes import processes
+from .shell import DEFAULT_TIMEOUT, run_command
+
+PIPELINE_FILE = ROOT_DIR / 'pipeline.yml'
+
+PASSED = 'passed'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+
+class PipelineError(Exception):
+    """Raised for invalid pipeline definitions or unknown targets"""
+
+
+class Step:
+    """One node of the pipeline graph as declared in pipeline.yml"""
+
+    def __init__(self, step_id: str, spec: Dict):
+        if bool(spec.get('run')) == bool(spec.get('call')):
+            raise PipelineError(f"Step '{step_id}' needs exactly one of 'run' or 'call'")
+        self.id = step_id
+        self.description = spec.get('description', step_id)
+        self.run = spec.get('run')
+        self.call = spec.get('call')
+        self.cwd = spec.get('cwd', '.')
+        self.needs: List[str] = list(spec.get('needs', []))
+        self.after: List[str] = list(spec.get('after', []))
+        self.inputs: List[str] = list(spec.get('inputs', []))
+        self.outputs: List[str] = list(spec.get('outputs', []))
+        self.timeout = int(spec.get('timeout', DEFAULT_TIMEOUT))
+        self.allow_failure = bool(spec.get('allow_failure', False))
+        # Handlers often have side effects beyond their outputs, so only `run:` steps are cached by default
+        self.cache = bool(spec.get('cache', bool(self.run) and bool(self.inputs)))
+        self.jest = bool(spec.get('jest', False))
+
+    def __repr__(self):
+        return f"Step({self.id!r})"
+
+
+class StepResult:
+    """Outcome of executing (or skipping) a step"""
+
+    def __init__(self, step_id: str, status: str, code: int = 0, stdout: str = '', stderr: str = '',
+                 duration: float = 0.0, data: Any = None, reused: bool = False, log: str = '',
+                 usage: Dict = None):
+        self.step_id = step_id
+        self.status = status
+        self.code = code
+        self.stdout = stdout
+        self.stderr = stderr
+        self.duration = duration
+        self.data = data
+        self.reused = reused
+        self.log = log
+        # cpu_seconds, peak_rss_bytes, cpu_utilization, processes of the jobs the step started
+        self.usage = usage
+
+    @property
+    def ok(self) -> bool:
+        return self.status == PASSED
+
+    def __repr__(self):
+        reused = ', reused' if self.reused else ''
+        return f"StepResult({self.step_id!r}, {self.status!r}, {self.duration:.1f}s{reused})"
+
+
+class Pipeline:
+    """The parsed pipeline definition: steps plus named targets"""
+
+    def __init__(self, steps: Dict[str, Step], targets: Dict[str, Dict]):
+        self.steps = steps
+        self.targets = targets
+        for step in steps.values():
+            for dep in step.needs + step.after:
+                if dep not in steps:
+                    raise PipelineError(f"Step '{step.id}' depends on unknown step '{dep}'")
+        for name, target in targets.items():
+            for step_id in target['steps']:
+                if step_id not in steps:
+                    raise PipelineError(f"Target '{name}' references unknown step '{step_id}'")
+
+    @classmethod
+    def load(cls, path: Path = None) -> 'Pipeline':
+        path = Path(path or PIPELINE_FILE)
+        with open(path, 'r', encoding='utf-8') as f:
+            spec = yaml.safe_load(f) or {}
+        steps = {step_id: Step(step_id, step_spec or {}) for step_id, step_spec in spec.get('steps', {}).items()}
+        targets = {}
+        for name, target in (spec.get('targets') or {}).items():
+            if isinstance(target, list):
+                target = {'steps': target}
+            targets[name] = {'description': target.get('description', name), 'steps': list(target.get('steps', []))}
+        return cls(steps, targets)
+
+    def compile(self, target: str) -> List[Step]:
+        """Return the target's steps plus everything they `need`, in a valid execution order"""
+        if target not in self.targets:
+            raise PipelineError(f"Unknown target '{target}'. Available: {', '.join(sorted(self.targets))}")
+
+        selected: List[str] = []
+        pending = list(self.targets[target]['steps'])
+        while pending:
+            step_id = pending.pop(0)
+            if step_id in selected:
+                continue
+            selected.append(step_id)
+            pending.extend(self.steps[step_id].needs)
+
+        # Kahn's algorithm, keeping declaration order among ready steps
+        order: List[Step] = []
+        done = set()
+        while len(order) < len(selected):
+            ready = [
+                s for s in selected
+                if s not in done and all(d in done for d in self.dependencies(s, selected))
+            ]
+            if not ready:
+                cycle = [s for s in selected if s not in done]
+                raise PipelineError(f"Dependency cycle between steps: {', '.join(cycle)}")
+            order.append(self.steps[ready[0]])
+            done.add(ready[0])
+        return order
+
+    def dependencies(self, step_id: str, selected: List[str]) -> List[str]:
+        """`needs` plus any `after` edges that point at a step in the same run"""
+        step = self.steps[step_id]
+        return step.needs + [s for s in step.after if s in selected]
+
+
+def load_pipeline(path: Path = None) -> Pipeline:
+    return Pipeline.load(path)
+
+
+def glob_to_regex(pattern: str) -> 're.Pattern':
+    """Compile a repo-relative glob where `**` spans directories and `*` does not"""
+    regex = ''
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            regex += '(?:.*/)?'
+            i += 3
+        elif pattern.startswith('**', i):
+            regex += '.*'
+            i += 2
+        elif pattern[i] == '*':
+            regex += '[^/]*'
+            i += 1
+        elif pattern[i] == '?':
+            regex += '[^/]'
+            i += 1
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+    # A bare directory pattern also covers everything below it
+    return re.compile(f"^{regex}(?:/.*)?$")
+
+
+_GLOB_CACHE: Dict[str, 're.Pattern'] = {}
+
+
+def matches(path: str, patterns: List[str]) -> bool:
+    """True if a repo-relative posix path matches any of the globs"""
+    for pattern in patterns:
+        if pattern not in _GLOB_CACHE:
+            _GLOB_CACHE[pattern] = glob_to_regex(pattern)
+        if _GLOB_CACHE[pattern].match(path):
+            return True
+    return False
+
+
+def run_step(step: Step, root: Path) -> Tuple[int, str, str, Optional[Dict]]:
+    """Run a `run:` step's command in a checkout; returns code, stdout, stderr and step data
+
+    Jest steps get a --maxWorkers sized for whatever else is running right now and
+    the package's persistent transform cache.
+    """
+    cwd = Path(root) / step.cwd
+    if not step.jest:
+        code, stdout, stderr = run_command(step.run, cwd=cwd, timeout=step.timeout)
+        return code, stdout, stderr, None
+    with planner.slot(step.id) as plan:
+        command = planner.command(with_cache(step.run, cwd), plan['workers'])
+        code, stdout, stderr = run_command(command, cwd=cwd, timeout=step.timeout)
+    return code, stdout, stderr, {'jest': plan}
+
+
+def changed_files(before: Dict[str, str], after: Dict[str, str]) -> List[str]:
+    """Paths whose content differs between two working-tree snapshots"""
+    return sorted(
+        path for path in set(before) | set(after)
+        if path != 'HEAD' and before.get(path) != after.get(path)
+    )
+
+
+class Engine:
+    """Execute compiled pipeline targets
+
+    `handlers` maps the `call` names used in pipeline.yml to Python callables.
+    A handler receives the Step and returns either a bool or a (bool, data) tuple.
+    When `logs` is given, command output is spilled to it and only tails are kept.
+    A `remote` (distributed.Coordinator) executes `run:` steps on worker nodes.
+    A `build_cache` (buildcache.BuildCache) replays passing results of cacheable
+    steps, and restores their outputs, when their inputs match an earlier run.
+    With `incremental=True`, repeated runs only re-execute steps whose `inputs`
+    intersect the files changed since the step last ran. A `checkpoint`
+    (checkpoint.Checkpoint) persists every executed result; with `resume=True`
+    the passing ones from an earlier, interrupted process seed that history.
+    With `timings` (planning.StepTimings), step durations are learned and every
+    run's predicted and actual wall time are appended to `predictions`.
+    """
+
+    def __init__(self, pipeline: Pipeline = None, handlers: Dict[str, Callable] = None,
+                 root: Path = None, jobs: int = 1, incremental: bool = False, logs: LogStore = None,
+                 remote=None, build_cache=None, checkpoint=None, resume: bool = False, timings=None,
+                 on_start: Callable[[Step], None] = None, on_result: Callable[[Step, StepResult], None] = None):
+        self.pipeline = pipeline or load_pipeline()
+        self.handlers = handlers or {}
+        self.root = Path(root or ROOT_DIR)
+        self.jobs = max(1, jobs or os.cpu_count() or 1)
+        self.incremental = incremental
+        self.logs = logs
+        self.remote = remote
+        self.build_cache = build_cache
+        self.checkpoint = checkpoint
+        self.timings = timings
+        self.predictions: List[Dict] = []
+        self.on_start = on_start
+        self.on_result = on_result
+        # step id -> (last executed result, working-tree snapshot it ran against)
+        self.history: Dict[str, Tuple[StepResult, Optional[Dict[str, str]]]] = {}
+        if resume and checkpoint is not None:
+            self.history.update(checkpoint.restore(self.pipeline))
+            # Carrying results over is the incremental check, applied across processes
+            self.incremental = True
+
+    def execute(self, step: Step) -> StepResult:
+        """Run a single step, ignoring its dependencies"""
+        if self.on_start:
+            self.on_start(step)
+        start = time.time()
+        with processes.accounting() as usage:
+            result = self._execute(step)
+        remote = result.data.get('usage') if step.run and isinstance(result.data, dict) else None
+        result.usage = usage.summary() or remote
+        result.duration = time.time() - start
+        return result
+
+    def _execute(self, step: Step) -> StepResult:
+        key = self.build_cache.action_key(step) if self.build_cache is not None and step.cache else None
+        cached = self.build_cache.lookup(key, step) if key else None
+        if cached is not None:
+            result = StepResult(step.id, PASSED, cached['code'], cached['stdout'], cached['stderr'],
+                                data=cached['data'], reused=True)
+        elif step.call:
+            handler = self.handlers.get(step.call)
+            if handler is None:
+                raise PipelineError(f"No handler registered for '{step.call}' (step '{step.id}')")
+            try:
+                outcome = handler(step)
+            except Exception as e:
+                result = StepResult(step.id, FAILED, 1, stderr=f"{type(e).__name__}: {e}")
+            else:
+                ok, data = outcome if isinstance(outcome, tuple) else (outcome, None)
+                result = StepResult(step.id, PASSED if ok else FAILED, 0 if ok else 1, data=data)
+        else:
+            if self.remote is not None:
+                code, stdout, stderr, data = self.remote.execute(step)
+            else:
+                code, stdout, stderr, data = run_step(step, self.root)
+            result = StepResult(step.id, PASSED if code == 0 else FAILED, code, stdout, stderr, data=data)
+        if key and cached is None and result.ok:
+            self.build_cache.store(key, step, result.code, result.stdout, result.stderr,
+                                   None if step.run else result.data)
+        if step.run and self.logs is not None:
+            # Keep only tails in memory; the full output lives in the run's log store
+            result.log = self.logs.store(step.id, result.stdout + result.stderr)['path']
+            result.stdout, result.stderr = tail(result.stdout), tail(result.stderr)
+        return result
+
+    def _reusable(self, step: Step, snapshot: Optional[Dict[str, str]], executed: Dict[str, str]) -> bool:
+        """True when none of the step's inputs changed since it last ran
+
+        `executed` maps the steps re-run so far in this pass to their previous status;
+        a dependency whose outcome flipped forces its dependents to run again.
+        """
+        if not self.incremental or snapshot is None or not step.inputs or step.id not in self.history:
+            return False
+        previous, seen = self.history[step.id]
+        if previous.status == SKIPPED or seen is None or seen.get('HEAD') != snapshot.get('HEAD'):
+            return False
+        for dep in step.needs:
+            if dep in executed and self.history[dep][0].status != executed[dep]:
+                return False
+        return not any(matches(path, step.inputs) for path in changed_files(seen, snapshot))
+
+    def run(self, target: str) -> Dict[str, StepResult]:
+        """Execute a target and return the result of every step in its graph
+
+        In incremental mode, steps whose declared inputs are untouched since their
+        previous execution keep that result instead of running again.
+        """
+        order = self.pipeline.compile(target)
+        selected = [s.id for s in order]
+        results: Dict[str, StepResult] = {}
+        running = {}
+        executed: Dict[str, str] = {}
+        started = time.time()
+        estimates = {s: self.timings.estimate(s) for s in selected} if self.timings is not None else {}
+        # Checkpoints need the snapshot even when this run itself re-executes everything
+        fingerprint = self.incremental or self.checkpoint is not None
+        snapshot = tree_snapshot(self.root) if fingerprint else None
+
+        def blocked(step: Step) -> Optional[str]:
+            for dep in step.needs:
+                dep_result = results[dep]
+                if not dep_result.ok and not (dep_result.status == FAILED and self.pipeline.steps[dep].allow_failure):
+                    return dep
+            return None
+
+        def record(step: Step, result: StepResult):
+            results[step.id] = result
+            if self.on_result:
+                self.on_result(step, result)
+
+        # Ctrl-C arrives here rather than in the worker threads; reaping their jobs lets the pool drain
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool, processes.reaping('interrupt'):
+            while len(results) < len(order):
+                for step in order:
+                    if step.id in results or step.id in running or len(running) >= self.jobs:
+                        continue
+                    deps = self.pipeline.dependencies(step.id, selected)
+                    if not all(d in results for d in deps):
+                        continue
+                    blocker = blocked(step)
+                    if blocker:
+                        record(step, StepResult(step.id, SKIPPED, stderr=f"'{blocker}' did not pass"))
+                        continue
+                    if self._reusable(step, snapshot, executed):
+                        previous = self.history[step.id][0]
+                        record(step, StepResult(step.id, previous.status, previous.code, previous.stdout,
+                                                previous.stderr, data=previous.data, reused=True,
+                                                log=previous.log))
+                        continue
+                    running[step.id] = (pool.submit(self.execute, step), snapshot)
+
+                if not running:
+                    continue
+                finished, _ = wait([future for future, _ in running.values()], return_when=FIRST_COMPLETED)
+                for step_id, (future, seen) in list(running.items()):
+                    if future not in finished:
+                        continue
+                    del running[step_id]
+                    step = self.pipeline.steps[step_id]
+                    result = future.result()
+                    if step_id in self.history:
+                        executed[step_id] = self.history[step_id][0].status
+                    else:
+                        executed[step_id] = None
+                    self.history[step_id] = (result, seen)
+                    if self.checkpoint is not None:
+                        self.checkpoint.record(step, result, seen)
+                    # Steps that write files may have changed other steps' inputs
+                    if fingerprint and step.outputs:
+                        snapshot = tree_snapshot(self.root)
+                    record(step, result)
+        if self.timings is not None:
+            self._learn_timings(target, selected, results, estimates, time.time() - started)
+        return results
+
+    def _learn_timings(self, target: str, selected: List[str], results: Dict[str, StepResult],
+                       estimates: Dict[str, Optional[float]], actual: float) -> None:
+        """Fold executed steps into the estimates; compare the prediction for them with the real wall time"""
+        ran = [s for s in selected if not results[s].reused and results[s].status != SKIPPED]
+        # A failure can end long before the step's real work would have (a missing dependency, say)
+        for step_id in (s for s in ran if results[s].ok):
+            self.timings.record(step_id, results[step_id].duration)
+        self.timings.save()
+        if ran and all(estimates[s] is not None for s in ran):
+            # Reused and skipped steps cost nothing, so predict only what actually executed
+            predicted = simulate(self.pipeline, selected, {s: estimates[s] for s in ran}, self.jobs)
+            self.predictions.append({'target': target, 'predicted': predicted, 'actual': actual})
+
+    def reused(self, results: Dict[str, StepResult]) -> List[StepResult]:
+        """Results carried over from an earlier run because their inputs were unchanged"""
+        return [r for r in results.values() if r.reused]
+
+    def succeeded(self, results: Dict[str, StepResult]) -> bool:
+        """True when every step passed, ignoring failures of allow_failure steps"""
+        return all(
+            r.ok or (r.status == FAILED and self.pipeline.steps[r.step_id].allow_failure)
+            for r in results.values()
+        )
@@ -0,0 +1,284 @@
+"""
+Parallel, cached ESLint runner
+Lints every workspace concurrently, reuses results for files whose content and
+lint config are unchanged, and merges everything into a single SARIF document.
+"""
+
+import json
+import os
+import shlex
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from .cache import CACHE_DIR, ROOT_DIR, JsonCache, file_digest, files_digest, text_digest
+from .shell import TIMED_OUT, run_command
+
+WORKSPACES = ['core', 'vscode-extension', 'desktop', 'web', 'mobile', 'backend']
+
+CONFIG_FILES = [
+    '.eslintrc', '.eslintrc.js', '.eslintrc.cjs', '.eslintrc.json', '.eslintrc.yml',
+    '.eslintrc.yaml', 'eslint.config.js', 'eslint.config.mjs', 'eslint.config.cjs',
+    '.eslintignore', 'package.json',
+]
+
+SKIP_DIRS = {'node_modules', 'dist', 'build', 'out', 'coverage', '.git'}
+CHUNK_SIZE = 100
+SARIF_SCHEMA = 'https://json.schemastore.org/sarif-2.1.0.json'
+SEVERITY_LEVELS = {0: 'none', 1: 'warning', 2: 'error'}
+
+
+# ESLint options that consume the next argument
+VALUE_OPTIONS = {
+    '-c', '--config', '--env', '--ext', '--global', '--parser', '--parser-options', '--plugin', '--rule',
+    '--rulesdir', '--resolve-plugins-relative-to', '--ignore-path', '--ignore-pattern', '--max-warnings',
+    '-f', '--format', '-o', '--output-file', '--cache-location', '--cache-strategy', '--fix-type',
+    '--stdin-filename', '--report-unused-disable-directives-severity', '--flag',
+}
+# The runner decides these itself: JSON on stdout, explicit file lists, and whether to fix
+RUNNER_OPTIONS = {'-f', '--format', '-o', '--output-file', '--ext', '--fix', '--fix-dry-run', '--fix-type'}
+# Options naming files that can change eslint's verdict
+FILE_OPTIONS = {'-c', '--config', '--ignore-path'}
+SHELL_OPERATORS = {'&&', '||', ';', '|'}
+
+
+def parse_lint_script(script: str) -> Tuple[List[str], List[str], List[str]]:
+    """Split an `eslint ...` npm script into target paths, the --ext list and the other options
+    Options are kept in order with their values so they can be handed to every eslint
+    invocation; only the ones in RUNNER_OPTIONS are left out."""
+    try:
+        args = shlex.split(script)
+    except ValueError:
+        args = script.split()
+    if 'eslint' not in args:
+        return ['src'], ['.js'], []
+    args = args[args.index('eslint') + 1:]
+    targets, extensions, options = [], [], []
+    i = 0
+    while i < len(args) and args[i] not in SHELL_OPERATORS:
+        start = i
+        name, inline, value = args[i].partition('=')
+        if not name.startswith('-'):
+            targets.append(args[i])
+            i += 1
+            continue
+        if not inline and name in VALUE_OPTIONS and i + 1 < len(args):
+            value = args[i + 1]
+            i += 2
+        else:
+            i += 1
+        if name == '--ext':
+            extensions = [e if e.startswith('.') else f'.{e}' for e in value.split(',')]
+        elif name not in RUNNER_OPTIONS:
+            options += args[start:i]
+    return targets or ['.'], extensions or ['.js'], options
+
+
+def collect_files(package_dir: Path, targets: List[str], extensions: List[str]) -> List[Path]:
+    """List the files eslint would visit for the given targets"""
+    files = []
+    for target in targets:
+        base = package_dir / target
+        if base.is_file():
+            files.append(base)
+            continue
+        for dirpath, dirnames, filenames in os.walk(base):
+            dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS]
+            for name in filenames:
+                if any(name.endswith(ext) for ext in extensions):
+                    files.append(Path(dirpath) / name)
+    return sorted(set(files))
+
+
+class EslintRunner:
+    """Run ESLint across workspaces with a per-file result cache"""
+
+    def __init__(self, root: Path = None, packages: List[str] = None, jobs: int = None):
+        self.root = Path(root or ROOT_DIR)
+        self.packages = packages or WORKSPACES
+        self.jobs = jobs or min(8, (os.cpu_count() or 2))
+        self.cache = JsonCache('eslint', CACHE_DIR)
+        self.results: Dict[str, Dict] = {}
+
+    def config_hash(self, package_dir: Path, options: List[str] = ()) -> str:
+        """Fingerprint the options and every config file that can change eslint's verdict for a package"""
+        candidates = []
+        for directory in (package_dir, self.root):
+            candidates.extend(directory / name for name in CONFIG_FILES if (directory / name).exists())
+        for i, arg in enumerate(options):
+            name, inline, value = arg.partition('=')
+            if name in FILE_OPTIONS and (inline or i + 1 < len(options)):
+                candidates.append(package_dir / (value if inline else options[i + 1]))
+        eslint_pkg = package_dir / 'node_modules' / 'eslint' / 'package.json'
+        if not eslint_pkg.exists():
+            eslint_pkg = self.root / 'node_modules' / 'eslint' / 'package.json'
+        if eslint_pkg.exists():
+            candidates.append(eslint_pkg)
+        return text_digest(files_digest(candidates), *options)
+
+    def _eslint_command(self, package_dir: Path, files: List[Path], options: List[str], fix: bool) -> List[str]:
+        """Prefer the installed eslint binary so npx never reaches for the registry"""
+        for bin_dir in (package_dir / 'node_modules' / '.bin', self.root / 'node_modules' / '.bin'):
+            eslint = shutil.which('eslint', path=str(bin_dir))
+            if eslint:
+                cmd = [eslint]
+                break
+        else:
+            cmd = [shutil.which('npx') or 'npx', '--no-install', 'eslint']
+        cmd += options + ['--format', 'json', '--no-error-on-unmatched-pattern']
+        if fix:
+            cmd.append('--fix')
+        return cmd + [str(f) for f in files]
+
+    def _lint_chunk(self, package_dir: Path, files: List[Path], options: List[str],
+                    fix: bool) -> Tuple[Dict[str, List], str]:
+        """Lint one batch of files and return messages keyed by absolute path"""
+        code, stdout, stderr = run_command(self._eslint_command(package_dir, files, options, fix),
+                                           cwd=package_dir, timeout=300)
+        if stderr.startswith(TIMED_OUT):
+            return {}, f"ESLint: {stderr}"
+
+        # 0 = clean, 1 = lint errors; anything else (or no report) is a crash or missing eslint
+        if code not in (0, 1) or not stdout.strip():
+            return {}, stderr.strip() or stdout.strip() or f"eslint exited {code}"
+        try:
+            report = json.loads(stdout)
+        except ValueError:
+            return {}, stderr.strip() or "Could not parse ESLint output"
+
+        messages = {}
+        for entry in report:
+            messages[str(Path(entry['filePath']).resolve())] = [
+                {
+                    'ruleId': m.get('ruleId'),
+                    'severity': m.get('severity', 2),
+                    'message': m.get('message', ''),
+                    'line': m.get('line', 1),
+                    'column': m.get('column', 1),
+                }
+                for m in entry.get('messages', [])
+            ]
+        return messages, ''
+
+    def run(self, fix: bool = False) -> Dict[str, Dict]:
+        """Lint every package and return {package: {'files', 'errors', 'warnings', 'error', 'cached'}}"""
+        plans = []
+        for package in self.packages:
+            package_dir = self.root / package
+            package_json = package_dir / 'package.json'
+            if not package_json.exists():
+                continue
+            try:
+                script = json.loads(package_json.read_text(encoding='utf-8')).get('scripts', {}).get('lint', '')
+            except ValueError:
+                script = ''
+            if not script:
+                continue
+            targets, extensions, options = parse_lint_script(script)
+            config = self.config_hash(package_dir, options)
+            files = collect_files(package_dir, targets, extensions)
+            plans.append((package, package_dir, options, config, files))
+
+        self.results = {}
+        jobs = []
+        used = set()
+        for package, package_dir, options, config, files in plans:
+            self.results[package] = {'files': {}, 'errors': 0, 'warnings': 0, 'error': '', 'cached': 0}
+            pending = []
+            for path in files:
+                key = self._cache_key(config, path)
+                used.add(key)
+                cached = self.cache.get(key)
+                # With --fix only files known to be clean can be skipped
+                if cached is not None and not (fix and cached):
+                    self.results[package]['files'][str(path)] = cached
+                    self.results[package]['cached'] += 1
+                else:
+                    pending.append(path)
+            for i in range(0, len(pending), CHUNK_SIZE):
+                jobs.append((package, package_dir, options, config, pending[i:i + CHUNK_SIZE]))
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            futures = [
+                (package, config, chunk, pool.submit(self._lint_chunk, package_dir, chunk, options, fix))
+                for package, package_dir, options, config, chunk in jobs
+            ]
+            for package, config, chunk, future in futures:
+                messages, error = future.result()
+                if error:
+                    self.results[package]['error'] = error
+                    continue
+                for path in chunk:
+                    file_messages = messages.get(str(path.resolve()), [])
+                    self.results[package]['files'][str(path)] = file_messages
+                    # Keyed on post-fix content so the next run hits the cache
+                    key = self._cache_key(config, path)
+                    used.add(key)
+                    self.cache.put(key, file_messages)
+
+        for result in self.results.values():
+            for file_messages in result['files'].values():
+                result['errors'] += sum(1 for m in file_messages if m['severity'] == 2)
+                result['warnings'] += sum(1 for m in file_messages if m['severity'] == 1)
+        # Entries are keyed on content, so anything this run did not touch is for an old revision
+        self.cache.prune(used)
+        self.cache.save()
+        return self.results
+
+    def _cache_key(self, config: str, path: Path) -> str:
+        return text_digest(config, str(path.relative_to(self.root)), file_digest(path) or '')
+
+    def to_sarif(self) -> Dict:
+        """Merge the latest results of every package into one SARIF 2.1.0 log"""
+        rules = set()
+        sarif_results = []
+        for package, result in sorted(self.results.items()):
+            for path, file_messages in sorted(result['files'].items()):
+                uri = Path(path).relative_to(self.root).as_posix()
+                for m in file_messages:
+                    if m['ruleId']:
+                        rules.add(m['ruleId'])
+                    sarif_results.append({
+                        'ruleId': m['ruleId'] or 'eslint',
+                        'level': SEVERITY_LEVELS.get(m['severity'], 'error'),
+                        'message': {'text': m['message']},
+                        'locations': [{
+                            'physicalLocation': {
+                                'artifactLocation': {'uri': uri},
+                                'region': {'startLine': m['line'] or 1, 'startColumn': m['column'] or 1},
+                            }
+                        }],
+                        'properties': {'package': package},
+                    })
+        return {
+            '$schema': SARIF_SCHEMA,
+            'version': '2.1.0',
+            'runs': [{
+                'tool': {'driver': {
+                    'name': 'ESLint',
+                    'informationUri': 'https://eslint.org',
+                    'rules': [{'id': rule} for rule in sorted(rules)],
+                }},
+                'results': sarif_results,
+            }],
+        }
+
+    def write_sarif(self, path: Path = None) -> Path:
+        path = Path(path or CACHE_DIR / 'reports' / 'eslint.sarif')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_sarif(), indent=2), encoding='utf-8')
+        return path
+
+    def summary(self) -> Dict[str, Dict[str, int]]:
+        """Per-package issue counts for the text reports"""
+        return {
+            package: {
+                'files': len(result['files']),
+                'cached': result['cached'],
+                'errors': result['errors'],
+                'warnings': result['warnings'],
+                'failed': bool(result['error']),
+            }
+            for package, result in self.results.items()
+        }
@@ -0,0 +1,70 @@
+"""
+Persistent jest transform cache
+Jest keeps ts-jest's compiled output in a cache directory under the system
+temp dir by default, which containers throw away and which nothing ever
+invalidates deliberately. Runs started by the runners instead get a
+--cacheDirectory under CACHE_DIR/jest (or OPENPILOT_JEST_CACHE_DIR), one per
+package and keyed on the package's jest/TypeScript/Babel config, its lockfile
+and the installed jest and ts-jest versions. When any of those change the
+package gets a fresh directory and the stale one is removed; otherwise the
+cache stays warm across iterations, runs and containers.
+"""
+
+import os
+import shutil
+import sys
+from pathlib import Path
+from typing import List, Union
+
+from .cache import CACHE_DIR, ROOT_DIR, files_digest
+from .jestworkers import jest_arguments
+
+JEST_CACHE_ENV = 'OPENPILOT_JEST_CACHE_DIR'
+
+CONFIG_FILES = ['package.json', 'package-lock.json', 'jest.config.js', 'jest.config.ts', 'jest.config.cjs',
+                'jest.config.mjs', 'jest.config.json', 'tsconfig.json', 'babel.config.js', '.babelrc']
+TOOL_MANIFESTS = ['jest/package.json', 'ts-jest/package.json', 'babel-jest/package.json', 'typescript/package.json']
+ROOT_LOCKFILES = ['package-lock.json', 'pnpm-lock.yaml']
+
+
+def jest_cache_root() -> Path:
+    return Path(os.environ.get(JEST_CACHE_ENV) or CACHE_DIR / 'jest')
+
+
+def cache_key(package_dir: Path) -> str:
+    """Digest of everything that can make cached transforms for a package wrong"""
+    package_dir = Path(package_dir)
+    candidates = [package_dir / name for name in CONFIG_FILES]
+    for modules in (package_dir / 'node_modules', ROOT_DIR / 'node_modules'):
+        candidates.extend(modules / name for name in TOOL_MANIFESTS)
+    candidates.extend(ROOT_DIR / name for name in ROOT_LOCKFILES)
+    return files_digest(path for path in candidates if path.exists())
+
+
+def cache_directory(package_dir: Path) -> Path:
+    """The package's current cache directory, created on first use; older keys are deleted"""
+    package_dir = Path(package_dir).resolve()
+    root = jest_cache_root()
+    prefix = package_dir.name or 'root'
+    directory = root / f"{prefix}-{cache_key(package_dir)[:16]}"
+    if not directory.exists():
+        for stale in root.glob(f"{prefix}-*"):
+            if len(stale.name) == len(directory.name) and stale.is_dir():
+                shutil.rmtree(stale, ignore_errors=True)
+        directory.mkdir(parents=True, exist_ok=True)
+    return directory
+
+
+def cache_arguments(package_dir: Path) -> List[str]:
+    return [f"--cacheDirectory={cache_directory(package_dir)}"]
+
+
+def with_cache(command: Union[str, List[str]], package_dir: Path) -> Union[str, List[str]]:
+    """Point an `npm test` / `npm run <script>` command that runs jest at the package's persistent cache"""
+    return jest_arguments(command, cache_arguments(package_dir))
+
+
+if __name__ == '__main__':
+    # `python3 -m pipeline.jestcache <package dir>` prints the keyed directory for jest runs
+    # started outside the runners, such as the docker-compose test services
+    print(cache_directory(Path(sys.argv[1])))
@@ -0,0 +1,153 @@
+"""
+Resident jest processes
+With OPENPILOT_JEST_DAEMON=1 (or a runner's --jest-daemon), jest runs that are
+plain `jest ...` npm scripts go to one long-lived node process per package
+(scripts/jest-daemon.js) instead of a fresh `npm test`. Jest, ts-jest and the
+project config stay loaded across loop iterations, on top of the persistent
+transform cache. Anything else (react-scripts, npm pre/post hooks, shell
+pipelines) falls back to the normal command. Daemons are session leaders
+tracked by the process manager, so they are reaped with everything else.
+"""
+
+import json
+import os
+import queue
+import shlex
+import subprocess
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from .cache import ROOT_DIR
+from .processes import describe, processes
+from .shell import DEFAULT_TIMEOUT, TIMED_OUT
+
+DAEMON_ENV = 'OPENPILOT_JEST_DAEMON'
+DAEMON_SCRIPT = ROOT_DIR / 'scripts' / 'jest-daemon.js'
+
+
+def daemon_enabled() -> bool:
+    return os.environ.get(DAEMON_ENV, '') not in ('', '0')
+
+
+def npm_script(command: Union[str, List[str]]) -> Optional[Tuple[str, List[str]]]:
+    """(script, extra jest arguments) of an `npm test` / `npm run <script> [-- args]` command"""
+    args = shlex.split(command) if isinstance(command, str) else list(command)
+    extra = []
+    if '--' in args:
+        extra = args[args.index('--') + 1:]
+        args = args[:args.index('--')]
+    if '--prefix' in args:
+        i = args.index('--prefix')
+        del args[i:i + 2]
+    if args[:2] == ['npm', 'test'] and len(args) == 2:
+        return 'test', extra
+    if args[:2] == ['npm', 'run'] and len(args) == 3:
+        return args[2], extra
+    return None
+
+
+def jest_argv(package_dir: Path, script: str) -> Optional[List[str]]:
+    """Arguments of a package's npm script when it is a plain `jest ...` invocation without hooks"""
+    try:
+        scripts = json.loads((Path(package_dir) / 'package.json').read_text(encoding='utf-8'))['scripts']
+        command = scripts[script]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    if f"pre{script}" in scripts or f"post{script}" in scripts or any(c in command for c in '&|;<>$`'):
+        return None
+    parts = shlex.split(command)
+    return parts[1:] if parts and parts[0] == 'jest' else None
+
+
+class JestDaemon:
+    """One resident jest process for a package; requests are served one at a time"""
+
+    def __init__(self, package_dir: Path):
+        self.package_dir = Path(package_dir).resolve()
+        self.process: Optional[subprocess.Popen] = None
+        self.runs = 0
+        self._replies: queue.Queue = queue.Queue()
+        self._stderr: deque = deque(maxlen=50)
+        self._lock = threading.Lock()
+
+    def _start(self) -> None:
+        self.process = processes.spawn(['node', str(DAEMON_SCRIPT), str(self.package_dir)], cwd=self.package_dir,
+                                       resident=True, stdin=subprocess.PIPE)
+        self._replies = queue.Queue()
+        # Both pipes are drained continuously so a chatty daemon can never block on a full pipe
+        threading.Thread(target=self._read_replies, args=(self.process, self._replies), daemon=True).start()
+        threading.Thread(target=self._stderr.extend, args=(self.process.stderr,), daemon=True).start()
+
+    @staticmethod
+    def _read_replies(process: subprocess.Popen, replies: queue.Queue) -> None:
+        for line in process.stdout:
+            replies.put(line)
+        replies.put(None)
+
+    def run(self, argv: List[str], timeout: int = DEFAULT_TIMEOUT) -> Tuple[int, str, str]:
+        """Exit code, stdout, stderr of one jest run, like run_command (jest reports on stderr)"""
+        with self._lock:
+            if self.process is None or self.process.poll() is not None:
+                self._start()
+            try:
+                self.process.stdin.write(json.dumps({'argv': argv}) + '\n')
+                self.process.stdin.flush()
+                line = self._replies.get(timeout=timeout)
+            except queue.Empty:
+                record = processes.terminate(self.process, 'timeout')
+                self.process = None
+                return 1, '', f"{TIMED_OUT}: {describe(record)}"
+            except OSError as e:
+                line = None
+                self._stderr.append(str(e))
+            if line is None:
+                # The daemon died (jest missing, crash); its last words explain why
+                self.process = None
+                return 1, '', ''.join(self._stderr) or 'jest daemon exited'
+            self.runs += 1
+            reply = json.loads(line)
+            return reply['code'], '', reply['output']
+
+    def stop(self) -> None:
+        """Close stdin so the daemon exits on its own; reap it if it does not"""
+        with self._lock:
+            if self.process is None:
+                return
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=processes.grace)
+                processes.release(self.process)
+            except (OSError, subprocess.TimeoutExpired):
+                processes.terminate(self.process, 'shutdown')
+            self.process = None
+
+
+class DaemonPool:
+    """Daemons by package directory, started on first use"""
+
+    def __init__(self):
+        self.daemons: Dict[Path, JestDaemon] = {}
+        self._lock = threading.Lock()
+
+    def run(self, command: Union[str, List[str]], package_dir: Path,
+            timeout: int = DEFAULT_TIMEOUT) -> Optional[Tuple[int, str, str]]:
+        """Serve an npm jest command from the package's daemon, or None if it has to run normally"""
+        parsed = npm_script(command)
+        argv = jest_argv(package_dir, parsed[0]) if parsed else None
+        if argv is None:
+            return None
+        with self._lock:
+            daemon = self.daemons.setdefault(Path(package_dir).resolve(), JestDaemon(package_dir))
+        return daemon.run(argv + parsed[1], timeout)
+
+    def stop_all(self) -> None:
+        with self._lock:
+            daemons = list(self.daemons.values())
+        for daemon in daemons:
+            daemon.stop()
+
+
+# Shared by every runner in the process
+daemons = DaemonPool()
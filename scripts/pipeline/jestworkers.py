@@ -0,0 +1,157 @@
+"""
+Jest worker-count planning
+Left alone, every jest process sizes its pool from the host's core count, so
+several packages testing at once oversubscribe the CPU and swap, while a lone
+run inside a CPU-limited container ignores its quota. The planner hands each
+invocation an explicit --maxWorkers from the cores and memory this process may
+use (cgroup limits included), the memory one worker of that package needed in
+earlier runs, and how many other jobs are running at the same moment.
+"""
+
+import contextlib
+import json
+import os
+import shlex
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+from .cache import JsonCache
+from .processes import processes
+
+WORKERS_ENV = 'OPENPILOT_JEST_WORKERS'
+DEFAULT_WORKER_MEMORY = 512 * 1024 * 1024
+# Share of the memory budget jest may plan for; the rest is left to the orchestrator and other tools
+MEMORY_HEADROOM = 0.8
+# Weight of the newest observation in the per-worker memory average
+SMOOTHING = 0.5
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        return Path(path).read_text().strip()
+    except OSError:
+        return None
+
+
+def available_cores() -> int:
+    """CPUs this process may run on, capped by a cgroup CPU quota"""
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    quota = None
+    cpu_max = _read('/sys/fs/cgroup/cpu.max')
+    if cpu_max and not cpu_max.startswith('max'):
+        limit, period = cpu_max.split()[:2]
+        quota = int(limit) / int(period)
+    else:
+        limit, period = _read('/sys/fs/cgroup/cpu/cpu.cfs_quota_us'), _read('/sys/fs/cgroup/cpu/cpu.cfs_period_us')
+        if limit and period and int(limit) > 0:
+            quota = int(limit) / int(period)
+    if quota:
+        cores = min(cores, max(1, int(quota)))
+    return max(1, cores)
+
+
+def memory_budget() -> int:
+    """Bytes still available to this process: MemAvailable, capped by the cgroup limit minus its usage"""
+    available = None
+    meminfo = _read('/proc/meminfo') or ''
+    for line in meminfo.splitlines():
+        if line.startswith('MemAvailable:'):
+            available = int(line.split()[1]) * 1024
+    for limit_file, usage_file in (('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory.current'),
+                                   ('/sys/fs/cgroup/memory/memory.limit_in_bytes',
+                                    '/sys/fs/cgroup/memory/memory.usage_in_bytes')):
+        limit, usage = _read(limit_file), _read(usage_file)
+        # cgroup v1 reports "no limit" as a huge number
+        if limit and limit.isdigit() and int(limit) < (1 << 60):
+            headroom = int(limit) - int(usage or 0)
+            available = headroom if available is None else min(available, headroom)
+            break
+    return max(0, available) if available is not None else 0
+
+
+def uses_jest(package_dir: Path, script: str = 'test') -> bool:
+    """True if the package's npm script runs jest (directly or through react-scripts)"""
+    try:
+        command = json.loads((Path(package_dir) / 'package.json').read_text(encoding='utf-8'))['scripts'][script]
+    except (OSError, ValueError, KeyError, TypeError):
+        return False
+    return 'jest' in command or 'react-scripts test' in command
+
+
+def jest_arguments(command: Union[str, List[str]], args: List[str]) -> Union[str, List[str]]:
+    """Append jest arguments to an npm command, after a single `--`"""
+    if isinstance(command, list):
+        return command + ([] if '--' in command else ['--']) + args
+    separator = ' ' if ' -- ' in f"{command} " else ' -- '
+    return f"{command}{separator}{' '.join(shlex.quote(arg) for arg in args)}"
+
+
+class WorkerPlanner:
+    """Pick --maxWorkers per jest invocation and learn per-worker memory from its usage"""
+
+    def __init__(self):
+        self.cache = JsonCache('jest-workers')
+        self.active = 0
+        self.plans: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def plan(self, key: str) -> Dict:
+        """Worker count for a jest run about to start, with the figures it was derived from"""
+        override = os.environ.get(WORKERS_ENV, '')
+        forced = int(override) if override.isdigit() else None
+        cores = available_cores()
+        # This run, the other jest runs already planned, and every job the process manager tracks
+        sharing = max(self.active, processes.running() + 1)
+        per_worker = self.cache.entries.get(key) or DEFAULT_WORKER_MEMORY
+        budget = memory_budget()
+        # One core stays with the jest parent and the orchestrator
+        by_cpu = max(1, (cores - 1) // sharing) if cores > 1 else 1
+        by_memory = max(1, int(budget * MEMORY_HEADROOM / sharing // per_worker)) if budget else by_cpu
+        workers = forced if forced is not None else min(by_cpu, by_memory)
+        return {
+            'workers': max(1, workers),
+            'cores': cores,
+            'sharing': sharing,
+            'memory_budget': budget,
+            'worker_memory': per_worker,
+            'limited_by': 'override' if forced is not None else ('memory' if by_memory < by_cpu else 'cpu'),
+        }
+
+    @contextlib.contextmanager
+    def slot(self, key: str):
+        """Reserve a share of the machine for one jest run; yields the plan
+
+        `key` names the kind of run (package, or package plus script). The peak RSS
+        of the run's process tree, split over its workers plus the parent, becomes
+        the per-worker memory estimate for the next run with that key.
+        """
+        with self._lock:
+            self.active += 1
+            plan = self.plan(key)
+            self.plans[key] = plan
+        try:
+            with processes.accounting() as usage:
+                yield plan
+        finally:
+            with self._lock:
+                self.active -= 1
+                summary = usage.summary()
+                if summary and summary['peak_rss_bytes']:
+                    observed = summary['peak_rss_bytes'] / (plan['workers'] + 1)
+                    previous = self.cache.entries.get(key)
+                    estimate = observed if previous is None else SMOOTHING * observed + (1 - SMOOTHING) * previous
+                    self.cache.put(key, int(estimate))
+                    self.cache.save()
+
+    @staticmethod
+    def command(command: Union[str, List[str]], workers: int) -> Union[str, List[str]]:
+        """Pass --maxWorkers through an `npm test` / `npm run <script>` command (string or argument list)"""
+        return jest_arguments(command, [f"--maxWorkers={workers}"])
+
+
+# Shared by every runner in the process so concurrent jest runs see each other
+planner = WorkerPlanner()
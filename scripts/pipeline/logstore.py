@@ -0,0 +1,128 @@
+"""
+Per-run compressed log store
+Command output is written to gzip blobs on disk, addressed by content hash so an
+output repeated across iterations is stored once. Only a small index and short
+failure tails stay in memory.
+"""
+
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .cache import CACHE_DIR, text_digest
+
+LOGS_DIR = CACHE_DIR / 'logs'
+TAIL_LINES = 30
+TAIL_CHARS = 4000
+KEEP_RUNS = 10
+
+
+def tail(text: str, lines: int = TAIL_LINES, max_chars: int = TAIL_CHARS) -> str:
+    """Last few lines of an output, which is where jest/tsc put the summary"""
+    if not text:
+        return ''
+    result = '\n'.join(text.rstrip().splitlines()[-lines:])
+    return result[-max_chars:]
+
+
+class LogStore:
+    """Content-addressed gzip log blobs plus an in-memory index for one run"""
+
+    def __init__(self, run_id: str = None, base_dir: Path = None, keep_runs: int = KEEP_RUNS):
+        self.base_dir = Path(base_dir or LOGS_DIR)
+        self.run_id = run_id or time.strftime('%Y%m%d-%H%M%S') + f"-{os.getpid()}"
+        self.run_dir = self.base_dir / self.run_id
+        (self.run_dir / 'blobs').mkdir(parents=True, exist_ok=True)
+        self.index: List[Dict] = []
+        self.bytes_in = 0
+        self.bytes_stored = 0
+        self._lock = threading.Lock()
+        self._prune(keep_runs)
+
+    def _prune(self, keep_runs: int) -> None:
+        runs = sorted(p for p in self.base_dir.iterdir() if p.is_dir() and p != self.run_dir)
+        for old in runs[:max(0, len(runs) - (keep_runs - 1))]:
+            shutil.rmtree(old, ignore_errors=True)
+
+    def blob_path(self, digest: str) -> Path:
+        return self.run_dir / 'blobs' / f"{digest}.gz"
+
+    def store(self, label: str, text: str, iteration: int = None) -> Dict:
+        """Spill text to disk and return its index entry (digest, size, tail, path)"""
+        text = text or ''
+        digest = text_digest(text)
+        path = self.blob_path(digest)
+        with self._lock:
+            self.bytes_in += len(text)
+            if not path.exists():
+                tmp = path.with_suffix('.tmp')
+                with gzip.open(tmp, 'wt', encoding='utf-8') as f:
+                    f.write(text)
+                os.replace(tmp, path)
+                self.bytes_stored += path.stat().st_size
+            entry = {
+                'label': label,
+                'iteration': iteration,
+                'digest': digest,
+                'size': len(text),
+                'tail': tail(text),
+                'path': str(path),
+            }
+            self.index.append(entry)
+            with open(self.run_dir / 'index.jsonl', 'a', encoding='utf-8') as f:
+                f.write(json.dumps({k: v for k, v in entry.items() if k != 'tail'}) + '\n')
+        return entry
+
+    def failure(self, suite: str, text: str, iteration: int = None) -> Dict:
+        """Failure record for the runners: suite name, output tail and the full log's path"""
+        entry = self.store(suite, text, iteration)
+        return {'suite': suite, 'output': entry['tail'], 'log': entry['path']}
+
+    def read(self, digest: str) -> Optional[str]:
+        path = self.blob_path(digest)
+        if not path.exists():
+            return None
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return f.read()
+
+    def append_line(self, name: str, line: str) -> Path:
+        """Append to a compressed line log such as the full list of applied fixes"""
+        path = self.run_dir / f"{name}.log.gz"
+        with self._lock, gzip.open(path, 'at', encoding='utf-8') as f:
+            f.write(line.rstrip('\n') + '\n')
+        return path
+
+
+class FixLog:
+    """Bounded in-memory list of applied fixes backed by the run's full fix log"""
+
+    def __init__(self, store: LogStore, keep: int = 50):
+        self.store = store
+        self.recent = deque(maxlen=keep)
+        self.total = 0
+        self.path: Optional[Path] = None
+
+    def append(self, fix: str) -> None:
+        self.total += 1
+        self.recent.append(fix)
+        self.path = self.store.append_line('fixes', fix)
+
+    @property
+    def dropped(self) -> int:
+        """Fixes no longer held in memory"""
+        return self.total - len(self.recent)
+
+    def __iter__(self):
+        return iter(self.recent)
+
+    def __len__(self) -> int:
+        return self.total
+
+    def __bool__(self) -> bool:
+        return self.total > 0
@@ -0,0 +1,178 @@
+"""
+OpenMetrics textfile export for the runners
+Collects step durations and resource usage, test counts, coverage, iteration
+count and cache hit rates during a run and writes them in the text format read
+by node-exporter's textfile collector, so pipeline slowdowns can be alerted on
+without log scraping.
+"""
+
+import os
+import re
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .cache import JsonCache
+from .engine import PASSED, SKIPPED, StepResult
+from .processes import format_usage
+
+PREFIX = 'openpilot_pipeline'
+METRICS_FILE_ENV = 'OPENPILOT_METRICS_FILE'
+
+# name -> (help, unit)
+METRICS = {
+    'success': ("1 if the last run met all of its requirements", ''),
+    'duration_seconds': ("Wall time of the last run", 'seconds'),
+    'last_run_timestamp_seconds': ("Unix time the last run finished", 'seconds'),
+    'iterations': ("Feedback-loop iterations executed by the last run", ''),
+    'step_duration_seconds': ("Wall time of the most recent execution of a step", 'seconds'),
+    'step_passed': ("1 if the step's latest result passed", ''),
+    'step_cpu_seconds': ("CPU time of the process trees a step started, sampled from /proc", 'seconds'),
+    'step_peak_rss_bytes': ("Peak resident memory of the process trees a step started", 'bytes'),
+    'step_cpu_utilization': ("CPU seconds per wall-clock second of a step (1 = one core)", ''),
+    'tests': ("Tests by result in the latest execution of a suite", ''),
+    'coverage_percent': ("Line coverage per package", 'percent'),
+    'cache_hits': ("Cache lookups answered from the cache during the last run", ''),
+    'cache_misses': ("Cache lookups that missed during the last run", ''),
+    'cache_hit_ratio': ("Share of cache lookups that hit during the last run", ''),
+}
+
+JEST_TESTS_LINE = re.compile(r'^Tests:\s+(.*)$', re.MULTILINE)
+COUNT = re.compile(r'(\d+) (passed|failed)')
+
+
+def parse_test_counts(output: str) -> Optional[Tuple[int, int]]:
+    """(passed, failed) from a jest, pytest or playwright summary, or None if absent"""
+    lines = JEST_TESTS_LINE.findall(output or '')
+    # jest also prints a "Test Suites:" line, so prefer its "Tests:" summary
+    text = lines[-1] if lines else output or ''
+    counts = {}
+    for number, result in COUNT.findall(text):
+        counts[result] = int(number)
+    if not counts:
+        return None
+    return counts.get('passed', 0), counts.get('failed', 0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class PipelineMetrics:
+    """Gauges for one runner, written out once at the end of a run"""
+
+    def __init__(self, runner: str):
+        self.runner = runner
+        self.started = time.time()
+        self.iterations = 0
+        self.success: Optional[bool] = None
+        self.steps: Dict[str, StepResult] = {}
+        self.step_durations: Dict[str, float] = {}
+        self.step_usage: Dict[str, Dict] = {}
+        self.step_hits = 0
+        self.step_misses = 0
+        self.tests: Dict[str, Tuple[int, int]] = {}
+        self.coverage: Dict[str, float] = {}
+
+    def record_steps(self, results: Dict[str, StepResult]) -> None:
+        """Fold one engine run in; reused steps count as step-cache hits"""
+        for step_id, result in results.items():
+            self.steps[step_id] = result
+            if result.reused:
+                self.step_hits += 1
+            elif result.status != SKIPPED:
+                self.step_misses += 1
+                self.step_durations[step_id] = result.duration
+                if result.usage:
+                    self.step_usage[step_id] = result.usage
+
+    def record_tests(self, suite: str, output: str) -> None:
+        counts = parse_test_counts(output)
+        if counts is not None:
+            self.tests[suite] = counts
+
+    def set_tests(self, suite: str, passed: int, failed: int) -> None:
+        self.tests[suite] = (passed, failed)
+
+    def set_coverage(self, coverage: Dict[str, float]) -> None:
+        self.coverage.update(coverage or {})
+
+    def resource_lines(self) -> List[str]:
+        """Human-readable usage per step, heaviest memory first"""
+        ranked = sorted(self.step_usage.items(), key=lambda item: item[1]['peak_rss_bytes'], reverse=True)
+        return [f"{step_id}: {format_usage(usage)}" for step_id, usage in ranked]
+
+    def _cache_counts(self) -> Dict[str, Tuple[int, int]]:
+        counts = {'steps': (self.step_hits, self.step_misses)}
+        for name, totals in JsonCache.stats.items():
+            counts[name] = (totals['hits'], totals['misses'])
+        return counts
+
+    def samples(self) -> Dict[str, List[Tuple[Dict[str, str], float]]]:
+        """Metric name (without prefix) -> [(labels, value)]"""
+        runner = {'runner': self.runner}
+        samples: Dict[str, List[Tuple[Dict[str, str], float]]] = {name: [] for name in METRICS}
+        if self.success is not None:
+            samples['success'].append((runner, 1 if self.success else 0))
+        samples['duration_seconds'].append((runner, round(time.time() - self.started, 3)))
+        samples['last_run_timestamp_seconds'].append((runner, int(time.time())))
+        samples['iterations'].append((runner, self.iterations))
+        for step_id, duration in sorted(self.step_durations.items()):
+            samples['step_duration_seconds'].append((dict(runner, step=step_id), round(duration, 3)))
+        for step_id, usage in sorted(self.step_usage.items()):
+            labels = dict(runner, step=step_id)
+            samples['step_cpu_seconds'].append((labels, usage['cpu_seconds']))
+            samples['step_peak_rss_bytes'].append((labels, usage['peak_rss_bytes']))
+            samples['step_cpu_utilization'].append((labels, usage['cpu_utilization']))
+        for step_id, result in sorted(self.steps.items()):
+            samples['step_passed'].append((dict(runner, step=step_id), 1 if result.status == PASSED else 0))
+        for suite, (passed, failed) in sorted(self.tests.items()):
+            samples['tests'].append((dict(runner, suite=suite, result='passed'), passed))
+            samples['tests'].append((dict(runner, suite=suite, result='failed'), failed))
+        for package, percent in sorted(self.coverage.items()):
+            samples['coverage_percent'].append((dict(runner, package=package), percent))
+        for cache, (hits, misses) in sorted(self._cache_counts().items()):
+            labels = dict(runner, cache=cache)
+            samples['cache_hits'].append((labels, hits))
+            samples['cache_misses'].append((labels, misses))
+            if hits + misses:
+                samples['cache_hit_ratio'].append((labels, round(hits / (hits + misses), 4)))
+        return samples
+
+    def render(self) -> str:
+        lines = []
+        for name, values in self.samples().items():
+            if not values:
+                continue
+            help_text, unit = METRICS[name]
+            metric = f"{PREFIX}_{name}"
+            lines.append(f"# TYPE {metric} gauge")
+            if unit:
+                lines.append(f"# UNIT {metric} {unit}")
+            lines.append(f"# HELP {metric} {help_text}")
+            for labels, value in values:
+                label_text = ','.join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+                lines.append(f"{metric}{{{label_text}}} {_format_value(value)}")
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: Path) -> Path:
+        """Write atomically so the collector never reads a half-written file"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(self.render(), encoding='utf-8')
+        os.replace(tmp, path)
+        return path
+
+
+def metrics_path(option: Optional[Path]) -> Optional[Path]:
+    """The --metrics-file option, falling back to OPENPILOT_METRICS_FILE"""
+    value = option or os.environ.get(METRICS_FILE_ENV)
+    return Path(value) if value else None
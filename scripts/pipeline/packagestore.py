@@ -0,0 +1,283 @@
+"""
+Content-addressed store for installed node_modules
+Every file an `npm install` produces is stored once under
+CACHE_DIR/package-store/files (or OPENPILOT_PACKAGE_STORE), named by the
+sha256 of its content, and the package's node_modules then hardlinks to it, so
+identical files across core, vscode-extension, desktop, web and tests share
+one inode. The layout of each installed tree (paths, symlinks, object names)
+is kept as a manifest keyed on the package.json and lockfiles, the node
+version and the platform. A package whose key is already in the store gets
+its node_modules built from hardlinks alone, without npm or the network.
+
+Hardlinked files are shared by every package that links them: tools must
+replace files in node_modules (as npm does) rather than edit them in place.
+node_modules/.cache, where build tools do exactly that, stays private.
+Across filesystems the store falls back to copies.
+"""
+
+import json
+import os
+import platform
+import shutil
+import stat
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .cache import CACHE_DIR, ROOT_DIR, file_digest, text_digest
+
+STORE_ENV = 'OPENPILOT_PACKAGE_STORE'
+# Bump to invalidate every manifest after a change to what the key covers
+KEY_VERSION = '1'
+KEY_FILES = ['package.json', 'package-lock.json', 'npm-shrinkwrap.json', 'yarn.lock', 'pnpm-lock.yaml']
+LOCKFILES = KEY_FILES[1:]
+# Written into each materialised node_modules so a stale tree is noticed
+MARKER = '.openpilot-store'
+# Top-level node_modules entries tools rewrite in place (babel-loader, eslint, terser caches);
+# they stay private files of each package and never enter the store
+PRIVATE_DIRS = {'.cache'}
+# Manifests kept before the least recently used ones and their orphaned files are pruned
+KEEP_TREES = 20
+
+_node_version: Optional[str] = None
+
+
+def node_version() -> str:
+    global _node_version
+    if _node_version is None:
+        try:
+            _node_version = subprocess.run(['node', '--version'], capture_output=True, text=True,
+                                           timeout=30).stdout.strip()
+        except (OSError, subprocess.TimeoutExpired):
+            _node_version = ''
+    return _node_version
+
+
+def store_root() -> Path:
+    return Path(os.environ.get(STORE_ENV) or CACHE_DIR / 'package-store')
+
+
+def install_key(package_dir: Path) -> Optional[str]:
+    """Key of a package's installed tree, or None without a lockfile to pin it"""
+    package_dir = Path(package_dir)
+    parts = [KEY_VERSION, node_version(), sys.platform, platform.machine()]
+    for name in KEY_FILES:
+        if (package_dir / name).exists():
+            parts += [name, file_digest(package_dir / name) or 'missing']
+    if not any((package_dir / name).exists() for name in LOCKFILES):
+        # A workspace member is pinned by the root lockfile
+        root_locks = [name for name in LOCKFILES if (ROOT_DIR / name).exists()]
+        if not root_locks or package_dir.resolve() == ROOT_DIR.resolve():
+            return None
+        parts += [f"root:{name}:{file_digest(ROOT_DIR / name)}" for name in root_locks]
+    return text_digest(*parts)
+
+
+def _shared(relative: str) -> bool:
+    """Whether a node_modules-relative path belongs in the store"""
+    return relative != MARKER and relative.split('/', 1)[0] not in PRIVATE_DIRS
+
+
+def _executable(mode: int) -> bool:
+    return bool(mode & stat.S_IXUSR)
+
+
+class PackageStore:
+    """Shared file objects plus one manifest per installed tree"""
+
+    def __init__(self, root: Path = None):
+        self.root = Path(root or store_root())
+        self.files = self.root / 'files'
+        self.trees = self.root / 'trees'
+
+    def _object(self, digest: str) -> Path:
+        return self.files / digest[:2] / digest
+
+    def _manifest_path(self, key: str) -> Path:
+        return self.trees / f"{key}.json"
+
+    def has(self, key: str) -> bool:
+        return self._manifest_path(key).exists()
+
+    def _store_file(self, path: Path) -> Optional[str]:
+        """Add one file to the store and make `path` a link to the stored object"""
+        try:
+            mode = path.lstat().st_mode
+        except OSError:
+            return None
+        content = file_digest(path)
+        if content is None:
+            return None
+        # Executable and plain copies of the same bytes need separate inodes
+        digest = content + ('x' if _executable(mode) else '')
+        target = self._object(digest)
+        try:
+            if target.exists():
+                if not os.path.samefile(target, path):
+                    temp = path.with_name(f"{path.name}.{os.getpid()}.link")
+                    os.link(target, temp)
+                    os.replace(temp, path)
+            else:
+                target.parent.mkdir(parents=True, exist_ok=True)
+                temp = target.with_name(f"{digest}.{os.getpid()}.tmp")
+                os.link(path, temp)
+                os.replace(temp, target)
+        except OSError:
+            # Another filesystem: keep a private copy in the store so later installs can link it
+            if not target.exists():
+                shutil.copy2(path, target)
+        return digest
+
+    def ingest(self, key: str, node_modules: Path, aliases: Iterable[str] = (), jobs: int = 8) -> Dict:
+        """Store an installed node_modules under `key` (and `aliases`), deduplicating it against the store"""
+        node_modules = Path(node_modules)
+        entries: List[List] = []
+        regular: List[str] = []
+        for dirpath, dirnames, filenames in os.walk(node_modules):
+            directory = Path(dirpath)
+            relative_dir = directory.relative_to(node_modules).as_posix()
+            if relative_dir == '.':
+                dirnames[:] = [name for name in dirnames if _shared(name)]
+            for name in list(dirnames):
+                if (directory / name).is_symlink():
+                    # os.walk does not follow these; they are recorded as links below
+                    dirnames.remove(name)
+                    filenames.append(name)
+            if not filenames and not dirnames and relative_dir != '.':
+                entries.append([relative_dir, 'd', ''])
+            for name in filenames:
+                relative = name if relative_dir == '.' else f"{relative_dir}/{name}"
+                if not _shared(relative):
+                    continue
+                path = directory / name
+                if path.is_symlink():
+                    entries.append([relative, 'l', os.readlink(path)])
+                elif path.is_file():
+                    regular.append(relative)
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            digests = list(pool.map(lambda relative: self._store_file(node_modules / relative), regular))
+        entries.extend([relative, 'f', digest] for relative, digest in zip(regular, digests) if digest)
+        self.trees.mkdir(parents=True, exist_ok=True)
+        for name in [key, *aliases]:
+            manifest = self._manifest_path(name)
+            temp = manifest.with_suffix(f".{os.getpid()}.tmp")
+            temp.write_text(json.dumps({'entries': sorted(entries)}), encoding='utf-8')
+            os.replace(temp, manifest)
+        (node_modules / MARKER).write_text(key, encoding='utf-8')
+        if len(list(self.trees.glob('*.json'))) > KEEP_TREES:
+            self.prune()
+        return {'files': len(regular), 'links': sum(1 for e in entries if e[1] == 'l')}
+
+    def materialize(self, key: str, node_modules: Path) -> Dict:
+        """Build node_modules from the manifest for `key`, replacing whatever was there"""
+        manifest = self._manifest_path(key)
+        entries = json.loads(manifest.read_text(encoding='utf-8'))['entries']
+        node_modules = Path(node_modules)
+        staging = node_modules.with_name(f"{node_modules.name}.{os.getpid()}.staging")
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir(parents=True)
+        linked = copied = 0
+        try:
+            for relative, kind, value in entries:
+                if not _shared(relative):
+                    continue  # manifests written before PRIVATE_DIRS existed
+                target = staging / relative
+                if kind == 'd':
+                    target.mkdir(parents=True, exist_ok=True)
+                    continue
+                target.parent.mkdir(parents=True, exist_ok=True)
+                if kind == 'l':
+                    os.symlink(value, target)
+                    continue
+                source = self._object(value)
+                try:
+                    os.link(source, target)
+                    linked += 1
+                except OSError as e:
+                    if not source.exists():
+                        raise FileNotFoundError(f"package store is missing {value} for {relative}") from e
+                    shutil.copy2(source, target)
+                    copied += 1
+            (staging / MARKER).write_text(key, encoding='utf-8')
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        if node_modules.is_symlink():
+            node_modules.unlink()
+        elif node_modules.exists():
+            # Private tool caches carry over to the new tree
+            for name in PRIVATE_DIRS:
+                if (node_modules / name).is_dir() and not (node_modules / name).is_symlink():
+                    os.replace(node_modules / name, staging / name)
+            shutil.rmtree(node_modules)
+        os.replace(staging, node_modules)
+        os.utime(manifest)  # least recently used trees are pruned first
+        return {'linked': linked, 'copied': copied}
+
+    def prune(self, keep: int = KEEP_TREES) -> int:
+        """Drop all but the `keep` most recently used trees and every file only they used"""
+        manifests = sorted(self.trees.glob('*.json'), key=lambda p: p.stat().st_mtime, reverse=True)
+        for manifest in manifests[keep:]:
+            manifest.unlink()
+        referenced = set()
+        for manifest in manifests[:keep]:
+            try:
+                entries = json.loads(manifest.read_text(encoding='utf-8'))['entries']
+            except (OSError, ValueError, KeyError):
+                continue
+            referenced.update(value for _, kind, value in entries if kind == 'f')
+        removed = 0
+        for path in self.files.glob('*/*'):
+            if path.name not in referenced:
+                path.unlink()
+                removed += 1
+        return removed
+
+
+def installed_key(package_dir: Path) -> Optional[str]:
+    """Key recorded in a package's node_modules by the store, if any"""
+    try:
+        return (Path(package_dir) / 'node_modules' / MARKER).read_text(encoding='utf-8').strip()
+    except OSError:
+        return None
+
+
+def ensure_installed(package_dir: Path, install: Callable[[], Tuple[int, str, str]],
+                     store: PackageStore = None) -> Tuple[str, int, str]:
+    """Make a package's node_modules current, from the store when possible
+
+    Returns (how, exit code, error output) where how is 'current', 'linked'
+    (materialised from the store), 'installed' (by `install`, then stored) or
+    'failed'. Packages without a lockfile are installed normally and not stored.
+    """
+    package_dir = Path(package_dir)
+    node_modules = package_dir / 'node_modules'
+    key = install_key(package_dir)
+    recorded = installed_key(package_dir)
+    if node_modules.exists() and (recorded is None or key is None or recorded == key):
+        # Trees installed before the store existed are trusted as they always were
+        return 'current', 0, ''
+    store = store or PackageStore()
+    if key is not None and store.has(key):
+        try:
+            store.materialize(key, node_modules)
+            return 'linked', 0, ''
+        except (OSError, ValueError, KeyError):
+            pass  # a damaged or pruned entry: install instead
+    if recorded is not None and node_modules.exists():
+        # A store-built tree shares its files; npm must not update them in place
+        shutil.rmtree(node_modules)
+    code, _, err = install()
+    if code != 0:
+        return 'failed', code, err
+    # npm writes a package-lock.json into packages that had none, which changes the key;
+    # the tree is stored under both so a fresh checkout without the lockfile finds it too
+    installed = install_key(package_dir) or key
+    if installed is not None and node_modules.is_dir():
+        try:
+            store.ingest(installed, node_modules, aliases=[key] if key not in (None, installed) else [])
+        except OSError:
+            pass  # the install itself succeeded
+    return 'installed', 0, ''
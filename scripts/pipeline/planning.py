@@ -0,0 +1,134 @@
+"""
+Wall-time prediction for pipeline runs
+The engine keeps a smoothed duration per step in CACHE_DIR/step-timings.json.
+From those, a plan replays the engine's scheduling (declaration order among
+ready steps, at most `jobs` at once) without running anything, and finds the
+critical path: the chain of dependent steps no amount of parallelism shortens.
+"""
+
+import heapq
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .cache import JsonCache
+
+# Weight of the newest observation in a step's duration estimate
+SMOOTHING = 0.5
+
+
+class StepTimings:
+    """Smoothed execution time of every step that has run on this machine"""
+
+    def __init__(self, cache_dir: Path = None):
+        self.cache = JsonCache('step-timings', cache_dir)
+
+    def estimate(self, step_id: str) -> Optional[float]:
+        return self.cache.entries.get(step_id)
+
+    def record(self, step_id: str, duration: float) -> None:
+        previous = self.cache.entries.get(step_id)
+        estimate = duration if previous is None else SMOOTHING * duration + (1 - SMOOTHING) * previous
+        self.cache.put(step_id, round(estimate, 3))
+
+    def save(self) -> None:
+        self.cache.save()
+
+
+def simulate(pipeline, order: List[str], durations: Dict[str, float], jobs: int) -> float:
+    """Seconds the engine needs for `order` if every step passes and takes its duration"""
+    finished: Dict[str, float] = {}
+    started = set()
+    running: List = []
+    now = 0.0
+    while len(finished) < len(order):
+        for step_id in order:
+            if step_id in started or len(running) >= jobs:
+                continue
+            if all(dep in finished for dep in pipeline.dependencies(step_id, order)):
+                started.add(step_id)
+                heapq.heappush(running, (now + durations.get(step_id, 0.0), step_id))
+        now, step_id = heapq.heappop(running)
+        finished[step_id] = now
+    return now
+
+
+def critical_path(pipeline, order: List[str], durations: Dict[str, float]) -> List[str]:
+    """Longest chain of dependent steps, first step first"""
+    finish: Dict[str, float] = {}
+    previous: Dict[str, Optional[str]] = {}
+    for step_id in order:
+        deps = pipeline.dependencies(step_id, order)
+        before = max(deps, key=lambda dep: finish[dep]) if deps else None
+        previous[step_id] = before
+        finish[step_id] = (finish[before] if before else 0.0) + durations.get(step_id, 0.0)
+    if not finish:
+        return []
+    path = [max(order, key=lambda step_id: finish[step_id])]
+    while previous[path[-1]]:
+        path.append(previous[path[-1]])
+    return path[::-1]
+
+
+def plan_run(pipeline, targets: List[str], timings: StepTimings, jobs: int = 1) -> Dict:
+    """Predicted wall time, critical path and parallelism of running `targets` one after another"""
+    plan = {'targets': [], 'wall_seconds': 0.0, 'work_seconds': 0.0, 'critical_seconds': 0.0,
+            'critical_path': [], 'unknown': [], 'jobs': jobs}
+    for target in targets:
+        order = [step.id for step in pipeline.compile(target)]
+        durations = {}
+        for step_id in order:
+            estimate = timings.estimate(step_id)
+            if estimate is None:
+                plan['unknown'].append(step_id)
+            durations[step_id] = estimate or 0.0
+        path = critical_path(pipeline, order, durations)
+        wall = simulate(pipeline, order, durations, jobs)
+        plan['targets'].append({
+            'target': target,
+            'steps': [{'id': step_id, 'seconds': durations[step_id]} for step_id in order],
+            'wall_seconds': wall,
+            'critical_path': path,
+        })
+        plan['wall_seconds'] += wall
+        plan['work_seconds'] += sum(durations.values())
+        plan['critical_seconds'] += sum(durations[step_id] for step_id in path)
+        plan['critical_path'].extend(path)
+    critical = plan['critical_seconds']
+    plan['parallelism'] = round(plan['work_seconds'] / critical, 2) if critical else 1.0
+    return plan
+
+
+def format_seconds(seconds: float) -> str:
+    """'42.0s' or '3m05s'"""
+    if seconds < 60:
+        return f"{seconds:.1f}s"
+    minutes, rest = divmod(int(round(seconds)), 60)
+    return f"{minutes}m{rest:02d}s"
+
+
+def plan_lines(plan: Dict) -> List[str]:
+    """Human-readable plan for the runners' --plan output"""
+    lines = []
+    for target in plan['targets']:
+        lines.append(f"{target['target']}: {format_seconds(target['wall_seconds'])}")
+        for step in target['steps']:
+            marker = '*' if step['id'] in target['critical_path'] else ' '
+            known = format_seconds(step['seconds']) if step['id'] not in plan['unknown'] else 'no history'
+            lines.append(f"  {marker} {step['id']:<28} {known}")
+    lines.append(f"Predicted wall time: {format_seconds(plan['wall_seconds'])} with {plan['jobs']} job(s)")
+    lines.append(f"Critical path ({format_seconds(plan['critical_seconds'])}): {' → '.join(plan['critical_path'])}")
+    lines.append(f"Parallelism available: {plan['parallelism']:.2f}x "
+                 f"({format_seconds(plan['work_seconds'])} of work)")
+    if plan['unknown']:
+        lines.append(f"No timings yet for {len(plan['unknown'])} step(s), counted as 0s: {', '.join(plan['unknown'])}")
+    return lines
+
+
+def prediction_summary(predictions: List[Dict]) -> Optional[str]:
+    """'predicted 3m12s, took 3m40s (+15%)' over every engine run of a process"""
+    predicted = sum(p['predicted'] for p in predictions)
+    actual = sum(p['actual'] for p in predictions)
+    if not predictions or not predicted:
+        return None
+    return (f"predicted {format_seconds(predicted)}, took {format_seconds(actual)} "
+            f"({(actual - predicted) / predicted * 100:+.0f}%)")
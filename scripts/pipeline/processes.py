@@ -0,0 +1,331 @@
+"""
+Process-tree lifecycle management
+Every job is started as the leader of its own session (a new process group on
+Windows) and tracked by a ProcessManager. On timeout, interrupt or exit the
+whole tree is terminated and then killed, so jest worker pools, tsc and webpack
+children cannot outlive the step that started them. Each reaping is recorded.
+
+While jobs run, a sampler thread reads CPU time and RSS of every process in
+their sessions from /proc and charges them to the step that started the job
+(see ProcessManager.accounting). Processes that start and exit between two
+samples are missed, so CPU seconds are a lower bound.
+"""
+
+import atexit
+import contextlib
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+GRACE_PERIOD = 5.0
+PROC = Path('/proc')
+SAMPLE_INTERVAL_ENV = 'OPENPILOT_SAMPLE_INTERVAL'
+DEFAULT_SAMPLE_INTERVAL = 0.5
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def _stat(pid: int) -> Tuple[str, List[str]]:
+    """(command name, fields after the name) from /proc/<pid>/stat"""
+    raw = (PROC / str(pid) / 'stat').read_text()
+    # The name is parenthesised and may itself contain spaces or parentheses
+    return raw[raw.index('(') + 1:raw.rindex(')')], raw[raw.rindex(')') + 2:].split()
+
+
+def _session_stats(sid: int) -> List[Tuple[int, str, List[str]]]:
+    """(pid, name, stat fields) of every live process in a session; empty where /proc is unavailable"""
+    members = []
+    try:
+        entries = os.listdir(PROC)
+    except OSError:
+        return members
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            name, fields = _stat(int(entry))
+        except (OSError, ValueError):
+            continue
+        # fields: state, ppid, pgrp, session, ...; zombies are already dead
+        if int(fields[3]) == sid and fields[0] != 'Z':
+            members.append((int(entry), name, fields))
+    return sorted(members)
+
+
+def session_members(sid: int) -> List[Tuple[int, str]]:
+    """(pid, name) of every live process in a session"""
+    return [(pid, name) for pid, name, _ in _session_stats(sid)]
+
+
+def _alive(pid: int) -> bool:
+    try:
+        name, fields = _stat(pid)
+        return fields[0] != 'Z'
+    except (OSError, ValueError):
+        pass
+    try:
+        os.kill(pid, 0)
+        return True
+    except OSError:
+        return False
+
+
+def format_bytes(size: float) -> str:
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+class ResourceUsage:
+    """CPU time and peak resident memory of the process trees started inside one accounting block"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.finished: float = None
+        self.peak_rss = 0
+        self.samples = 0
+        self.pids = set()
+        self._cpu: Dict[Tuple[int, int], float] = {}
+        self._lock = threading.Lock()
+
+    def sample(self, sid: int) -> None:
+        """Fold in one reading of a job's session; RSS of the whole tree counts towards the peak"""
+        rss = 0
+        with self._lock:
+            for pid, _, fields in _session_stats(sid):
+                # utime and stime in clock ticks, rss in pages
+                self._cpu[(sid, pid)] = (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+                rss += int(fields[21]) * PAGE_SIZE
+                self.pids.add(pid)
+            self.peak_rss = max(self.peak_rss, rss)
+            self.samples += 1
+
+    @property
+    def cpu_seconds(self) -> float:
+        return sum(self._cpu.values())
+
+    def summary(self) -> Optional[Dict]:
+        """cpu_seconds, peak_rss_bytes, cpu_utilization (1.0 = one core busy) and process count"""
+        if not self.samples:
+            return None
+        wall = (self.finished or time.time()) - self.started
+        return {
+            'cpu_seconds': round(self.cpu_seconds, 2),
+            'peak_rss_bytes': self.peak_rss,
+            'cpu_utilization': round(self.cpu_seconds / wall, 3) if wall > 0 else 0.0,
+            'processes': len(self.pids),
+        }
+
+
+def format_usage(usage: Dict) -> str:
+    """'peak 1.2 GB RSS, 84.3s CPU (212% of a core) over 14 processes'"""
+    plural = '' if usage['processes'] == 1 else 'es'
+    return (f"peak {format_bytes(usage['peak_rss_bytes'])} RSS, {usage['cpu_seconds']:.1f}s CPU "
+            f"({usage['cpu_utilization'] * 100:.0f}% of a core) over {usage['processes']} process{plural}")
+
+
+def describe(record: Dict) -> str:
+    """'reaped 12 processes after timeout (node x11, sh)'"""
+    counts = Counter(name for _, name in record['processes'])
+    names = ', '.join(name if n == 1 else f"{name} x{n}" for name, n in counts.most_common())
+    forced = f", {record['killed']} killed" if record['killed'] else ''
+    plural = '' if len(record['processes']) == 1 else 'es'
+    return f"reaped {len(record['processes'])} process{plural} after {record['reason']} ({names}{forced})"
+
+
+class ProcessManager:
+    """Start jobs in their own session and tear their whole tree down on demand"""
+
+    def __init__(self, grace: float = GRACE_PERIOD, sample_interval: float = None):
+        self.grace = grace
+        if sample_interval is None:
+            sample_interval = float(os.environ.get(SAMPLE_INTERVAL_ENV, DEFAULT_SAMPLE_INTERVAL))
+        # 0 turns sampling off; it also needs /proc
+        self.sample_interval = sample_interval if PROC.is_dir() else 0
+        self.reaped: List[Dict] = []
+        self._jobs: Dict[int, Tuple[subprocess.Popen, str, List[ResourceUsage]]] = {}
+        self._resident = set()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._installed = False
+        self._signals = False
+        self._sampler: threading.Thread = None
+
+    def spawn(self, command: Union[str, List[str]], cwd: Path = None, env: Dict[str, str] = None,
+              resident: bool = False, **kwargs) -> subprocess.Popen:
+        """Popen with captured text output, as the leader of a new session
+
+        A `resident` process (a server kept across steps) is reaped like any job but
+        is neither counted by running() nor charged to the accounting block it started in.
+        """
+        self.install()
+        if os.name == 'nt':
+            kwargs['creationflags'] = kwargs.get('creationflags', 0) | subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            kwargs['start_new_session'] = True
+        kwargs.setdefault('stdout', subprocess.PIPE)
+        kwargs.setdefault('stderr', subprocess.PIPE)
+        process = subprocess.Popen(command, shell=isinstance(command, str), cwd=cwd, env=env, text=True, **kwargs)
+        label = command if isinstance(command, str) else ' '.join(command)
+        usages = [] if resident else list(getattr(self._local, 'usages', []))
+        with self._lock:
+            self._jobs[process.pid] = (process, label, usages)
+            if resident:
+                self._resident.add(process.pid)
+            if usages and self.sample_interval > 0 and self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample_loop, name='process-sampler', daemon=True)
+                self._sampler.start()
+        return process
+
+    def release(self, process: subprocess.Popen) -> List[Dict]:
+        """Stop tracking a finished job, reaping anything it left running in its session"""
+        with self._lock:
+            self._jobs.pop(process.pid, None)
+            self._resident.discard(process.pid)
+        if os.name != 'nt' and session_members(process.pid):
+            return [self.terminate(process, 'orphaned')]
+        return []
+
+    def terminate(self, process: subprocess.Popen, reason: str) -> Dict:
+        """SIGTERM the job's session, SIGKILL whatever survives the grace period, and record it"""
+        with self._lock:
+            _, label, usages = self._jobs.pop(process.pid, (None, str(process.args), []))
+            self._resident.discard(process.pid)
+        if self.sample_interval > 0:
+            # Last reading before the tree goes away
+            for usage in usages:
+                usage.sample(process.pid)
+        leader = [(process.pid, (label.split() or ['?'])[0])]
+        if process.poll() is not None and (os.name == 'nt' or not session_members(process.pid)):
+            # Nothing left to reap
+            return {'pid': process.pid, 'command': label, 'reason': reason, 'processes': [], 'killed': 0,
+                    'time': time.time()}
+        if os.name == 'nt':
+            members = leader
+            killed = self._terminate_windows(process)
+        else:
+            members = session_members(process.pid) or leader
+            killed = self._terminate_posix(process, members)
+        record = {'pid': process.pid, 'command': label, 'reason': reason, 'processes': members,
+                  'killed': killed, 'time': time.time()}
+        with self._lock:
+            self.reaped.append(record)
+        return record
+
+    def _terminate_posix(self, process: subprocess.Popen, members: List[Tuple[int, str]]) -> int:
+        pids = {pid for pid, _ in members} | {process.pid}
+
+        def signal_all(sig):
+            try:
+                os.killpg(process.pid, sig)
+            except OSError:
+                pass
+            # Members that moved to another process group are still in the session
+            for pid in pids:
+                try:
+                    os.kill(pid, sig)
+                except OSError:
+                    pass
+
+        signal_all(signal.SIGTERM)
+        deadline = time.time() + self.grace
+        while time.time() < deadline:
+            process.poll()
+            pids = {pid for pid in pids if _alive(pid)} | {pid for pid, _ in session_members(process.pid)}
+            if not pids:
+                return 0
+            time.sleep(0.05)
+        survivors = len(pids)
+        signal_all(signal.SIGKILL)
+        try:
+            process.wait(timeout=self.grace)
+        except subprocess.TimeoutExpired:
+            pass
+        # SIGKILL is delivered asynchronously; return only once the rest of the tree is gone too
+        deadline = time.time() + self.grace
+        while time.time() < deadline and any(_alive(pid) for pid in pids):
+            time.sleep(0.05)
+        return survivors
+
+    def _terminate_windows(self, process: subprocess.Popen) -> int:
+        try:
+            process.send_signal(signal.CTRL_BREAK_EVENT)
+            process.wait(timeout=self.grace)
+            return 0
+        except (OSError, subprocess.TimeoutExpired):
+            subprocess.run(['taskkill', '/T', '/F', '/PID', str(process.pid)], capture_output=True)
+            return 1
+
+    def running(self) -> int:
+        """Number of tracked jobs that have not finished, resident processes excluded"""
+        with self._lock:
+            return len(self._jobs.keys() - self._resident)
+
+    def terminate_all(self, reason: str) -> List[Dict]:
+        with self._lock:
+            processes = [process for process, _, _ in self._jobs.values()]
+        return [self.terminate(process, reason) for process in processes]
+
+    @contextlib.contextmanager
+    def accounting(self):
+        """Charge the CPU and memory of every job this thread starts inside the block to one ResourceUsage
+
+        Blocks nest: a job counts towards every enclosing block of its thread.
+        """
+        usage = ResourceUsage()
+        if not hasattr(self._local, 'usages'):
+            self._local.usages = []
+        self._local.usages.append(usage)
+        try:
+            yield usage
+        finally:
+            self._local.usages.remove(usage)
+            usage.finished = time.time()
+
+    def _sample_loop(self) -> None:
+        while True:
+            time.sleep(self.sample_interval)
+            with self._lock:
+                jobs = [(process.pid, usage) for process, _, usages in self._jobs.values() for usage in usages]
+            for pid, usage in jobs:
+                usage.sample(pid)
+
+    @contextlib.contextmanager
+    def reaping(self, reason: str):
+        """Terminate every tracked job if the block raises (KeyboardInterrupt included)"""
+        try:
+            yield self
+        except BaseException:
+            self.terminate_all(reason)
+            raise
+
+    def summary(self) -> List[str]:
+        """One line per reaping, for the runners' reports"""
+        return [f"{record['command']}: {describe(record)}" for record in self.reaped]
+
+    def install(self) -> None:
+        """Reap on interpreter exit, and turn SIGTERM into an exit so that happens
+
+        Signal handlers can only be set from the main thread, while engine steps spawn
+        from pool threads, so the runners call this first thing in main(). spawn()
+        calls it as well and sets the handler once it runs on the main thread.
+        """
+        if not self._installed:
+            self._installed = True
+            atexit.register(self.terminate_all, 'exit')
+        if self._signals or threading.current_thread() is not threading.main_thread():
+            return
+        self._signals = True
+        if hasattr(signal, 'SIGTERM') and signal.getsignal(signal.SIGTERM) == signal.SIG_DFL:
+            signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+
+
+# Shared by every runner in the process
+processes = ProcessManager()
@@ -0,0 +1,127 @@
+"""
+Parallel, cached flake8 runner
+Lints the indexed Python files in parallel batches and caches each file's
+messages by its content hash plus the flake8 configuration, so unchanged files
+are never re-linted. Messages are structured as file, line, column, code, message.
+"""
+
+import importlib.metadata
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from .cache import CACHE_DIR, ROOT_DIR, JsonCache, file_digest, files_digest, text_digest
+from .pyformat import python_files
+from .shell import TIMED_OUT, run_command
+
+DEFAULT_ARGS = ['--max-line-length=100', '--extend-ignore=E203,W503']
+CONFIG_FILES = ['.flake8', 'setup.cfg', 'tox.ini']
+CHUNK_SIZE = 25
+SEPARATOR = '\x1f'
+FORMAT = SEPARATOR.join(['%(path)s', '%(row)d', '%(col)d', '%(code)s', '%(text)s'])
+
+
+def flake8_version() -> str:
+    try:
+        return importlib.metadata.version('flake8')
+    except importlib.metadata.PackageNotFoundError:
+        return ''
+
+
+class Flake8Runner:
+    """Run flake8 over the Python files with a per-file result cache"""
+
+    def __init__(self, root: Path = None, files: List[Path] = None, args: List[str] = None, jobs: int = None):
+        self.root = Path(root or ROOT_DIR)
+        self.files = files if files is not None else python_files(self.root)
+        self.args = args if args is not None else DEFAULT_ARGS
+        self.jobs = jobs or min(8, (os.cpu_count() or 2))
+        self.cache = JsonCache('flake8', CACHE_DIR)
+        self.results: Dict[str, List[Dict]] = {}
+        self.cached = 0
+        self.error = ''
+
+    def config_hash(self) -> str:
+        """Fingerprint the arguments, config files and flake8 version"""
+        configs = [self.root / name for name in CONFIG_FILES if (self.root / name).exists()]
+        return text_digest(' '.join(self.args), files_digest(configs), flake8_version())
+
+    def _cache_key(self, config: str, path: Path) -> str:
+        return text_digest(config, self.relative(path), file_digest(path) or '')
+
+    def relative(self, path: Path) -> str:
+        try:
+            return Path(path).relative_to(self.root).as_posix()
+        except ValueError:
+            return Path(path).as_posix()
+
+    def _lint_chunk(self, files: List[Path]) -> Tuple[Dict[str, List[Dict]], str]:
+        """Lint one batch of files and return messages keyed by repo-relative path"""
+        command = [sys.executable, '-m', 'flake8', f"--format={FORMAT}", '--jobs=1', *self.args]
+        code, stdout, stderr = run_command(command + [str(f) for f in files], cwd=self.root, timeout=300)
+        if stderr.startswith(TIMED_OUT):
+            return {}, f"flake8: {stderr}"
+
+        # 0 = clean, 1 = issues; anything else, or issues without a report, is a crash or missing flake8
+        if code not in (0, 1) or (code == 1 and not stdout.strip()):
+            return {}, stderr.strip() or f"flake8 exited {code}"
+
+        messages: Dict[str, List[Dict]] = {}
+        for line in stdout.splitlines():
+            parts = line.split(SEPARATOR, 4)
+            if len(parts) != 5:
+                continue
+            path, row, col, code, text = parts
+            messages.setdefault(self.relative(self.root / path), []).append({
+                'line': int(row),
+                'column': int(col),
+                'code': code,
+                'message': text,
+            })
+        return messages, ''
+
+    def run(self) -> Dict[str, List[Dict]]:
+        """Lint every file and return {relative path: [{'line', 'column', 'code', 'message'}]}"""
+        config = self.config_hash()
+        self.results = {}
+        self.cached = 0
+        self.error = ''
+        pending = []
+        keys = {path: self._cache_key(config, path) for path in self.files}
+        for path in self.files:
+            cached = self.cache.get(keys[path])
+            if cached is not None:
+                self.results[self.relative(path)] = cached
+                self.cached += 1
+            else:
+                pending.append(path)
+
+        chunks = [pending[i:i + CHUNK_SIZE] for i in range(0, len(pending), CHUNK_SIZE)]
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            for chunk, (messages, error) in zip(chunks, pool.map(self._lint_chunk, chunks)):
+                if error:
+                    self.error = error
+                    continue
+                for path in chunk:
+                    file_messages = messages.get(self.relative(path), [])
+                    self.results[self.relative(path)] = file_messages
+                    self.cache.put(keys[path], file_messages)
+
+        # Entries are keyed on content, so anything this run did not look up is for an old revision
+        self.cache.prune(keys.values())
+        self.cache.save()
+        return self.results
+
+    def issues(self) -> List[Dict]:
+        """Flat list of messages, each with its file"""
+        return [
+            dict(message, file=path)
+            for path, file_messages in sorted(self.results.items())
+            for message in file_messages
+        ]
+
+    def counts(self) -> Dict[str, int]:
+        """Issue count per file, for files with at least one issue"""
+        return {path: len(messages) for path, messages in sorted(self.results.items()) if messages}
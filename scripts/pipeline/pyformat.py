@@ -0,0 +1,144 @@
+"""
+In-process Python formatting
+Runs isort and black through their library APIs over a process pool, sharing
+one file list, and reports for every file whether formatting changed it.
+"""
+
+import importlib.util
+import os
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from .cache import ROOT_DIR
+
+CHANGED = 'changed'
+UNCHANGED = 'unchanged'
+EXCLUDED_DIRS = {'node_modules', '.git', '__pycache__', '.openpilot-cache', 'dist', 'build', 'out', '.venv', 'venv'}
+ISORT_CONFIGS = ('.isort.cfg', 'pyproject.toml', 'setup.cfg', 'tox.ini', '.editorconfig')
+
+
+def python_files(root: Path = None) -> List[Path]:
+    """Tracked and untracked (non-ignored) Python files; falls back to a filtered walk outside git"""
+    root = Path(root or ROOT_DIR)
+    try:
+        result = subprocess.run(
+            ['git', 'ls-files', '--cached', '--others', '--exclude-standard', '*.py'],
+            cwd=root, capture_output=True, text=True, timeout=60
+        )
+        if result.returncode == 0:
+            return sorted({root / path for path in result.stdout.splitlines() if (root / path).exists()})
+    except (OSError, subprocess.TimeoutExpired):
+        pass
+    files = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in EXCLUDED_DIRS]
+        files.extend(Path(dirpath) / name for name in filenames if name.endswith('.py'))
+    return sorted(files)
+
+
+# Per-worker formatter state, built once by _init_worker
+_black = None
+_black_mode = None
+_isort = None
+_isort_config = None
+
+
+def _init_worker(root: str) -> None:
+    global _black, _black_mode, _isort, _isort_config
+    try:
+        import black
+        _black = black
+        config = {}
+        pyproject = black.find_pyproject_toml((root,))
+        if pyproject:
+            config = black.parse_pyproject_toml(pyproject)
+        _black_mode = black.Mode(
+            line_length=config.get('line_length', black.DEFAULT_LINE_LENGTH),
+            string_normalization=not config.get('skip_string_normalization', False),
+            magic_trailing_comma=not config.get('skip_magic_trailing_comma', False),
+        )
+    except ImportError:
+        _black = None
+    try:
+        import isort
+        _isort = isort
+        if any((Path(root) / name).exists() for name in ISORT_CONFIGS):
+            _isort_config = isort.Config(settings_path=root)
+        else:
+            # Without project settings sort black-compatibly so the two never fight
+            _isort_config = isort.Config(profile='black')
+    except ImportError:
+        _isort = None
+
+
+def _format_one(args: Tuple[str, bool]) -> Tuple[str, str]:
+    path, check = args
+    try:
+        with open(path, encoding='utf-8') as f:
+            source = f.read()
+    except (OSError, UnicodeDecodeError) as e:
+        return path, f"error: {e}"
+    formatted = source
+    try:
+        if _isort is not None:
+            formatted = _isort.code(formatted, config=_isort_config, file_path=Path(path))
+        if _black is not None:
+            try:
+                formatted = _black.format_file_contents(formatted, fast=False, mode=_black_mode)
+            except _black.NothingChanged:
+                pass
+    except Exception as e:
+        message = str(e).splitlines()
+        return path, f"error: {message[0] if message else type(e).__name__}"
+    if formatted == source:
+        return path, UNCHANGED
+    if not check:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(formatted)
+    return path, CHANGED
+
+
+class PythonFormatter:
+    """Format a file list with isort then black across worker processes"""
+
+    def __init__(self, root: Path = None, files: List[Path] = None, jobs: int = None):
+        self.root = Path(root or ROOT_DIR)
+        self.files = files if files is not None else python_files(self.root)
+        self.jobs = jobs or min(8, os.cpu_count() or 2)
+        self.results: Dict[str, str] = {}
+        self.missing: List[str] = []
+
+    def available(self) -> bool:
+        """Record which formatter libraries are missing; True if at least one is importable"""
+        self.missing = [name for name in ('black', 'isort') if importlib.util.find_spec(name) is None]
+        return len(self.missing) < 2
+
+    def run(self, check: bool = False) -> Dict[str, str]:
+        """Format (or with check=True only inspect) every file; returns {path: changed|unchanged|error: ...}"""
+        self.results = {}
+        if not self.files or not self.available():
+            return self.results
+        work = [(str(path), check) for path in self.files]
+        if self.jobs <= 1 or len(work) < 2:
+            _init_worker(str(self.root))
+            self.results = dict(map(_format_one, work))
+            return self.results
+        chunksize = max(1, len(work) // (self.jobs * 4))
+        with ProcessPoolExecutor(max_workers=self.jobs, initializer=_init_worker,
+                                 initargs=(str(self.root),)) as pool:
+            self.results = dict(pool.map(_format_one, work, chunksize=chunksize))
+        return self.results
+
+    def changed(self) -> List[str]:
+        return [path for path, status in self.results.items() if status == CHANGED]
+
+    def errors(self) -> Dict[str, str]:
+        return {path: status for path, status in self.results.items() if status.startswith('error')}
+
+    def relative(self, path: str) -> str:
+        try:
+            return Path(path).relative_to(self.root).as_posix()
+        except ValueError:
+            return path
@@ -0,0 +1,97 @@
+"""
+Single-pass Python test runner
+Runs pytest once with tests spread over xdist workers and coverage scoped to
+the Python source directories, writing a JUnit report and coverage JSON that
+the loop reads instead of running the suite a second time for coverage.
+"""
+
+import importlib.util
+import sys
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .cache import CACHE_DIR, ROOT_DIR
+from .coverage import PYTEST_REPORT
+from .pyformat import python_files
+from .shell import DEFAULT_TIMEOUT, run_command
+
+JUNIT_REPORT = CACHE_DIR / 'reports' / 'pytest-junit.xml'
+NO_TESTS_COLLECTED = 5
+
+
+def has_plugin(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def python_source_dirs(root: Path = None) -> List[str]:
+    """Top-level directories holding tracked Python modules other than test files"""
+    root = Path(root or ROOT_DIR)
+    files = [path.relative_to(root) for path in python_files(root)]
+    dirs = set()
+    for path in files:
+        parts = path.parts
+        name = parts[-1]
+        if len(parts) < 2 or name == 'conftest.py' or name.startswith('test_') or name.endswith('_test.py'):
+            continue
+        dirs.add(parts[0])
+    return sorted(dirs)
+
+
+def parse_junit(path: Path) -> Dict:
+    """Counts and failing test ids from a pytest JUnit XML report"""
+    summary = {'passed': 0, 'failed': 0, 'skipped': 0, 'failures': []}
+    try:
+        tree = ET.parse(path)
+    except (OSError, ET.ParseError):
+        return summary
+    for case in tree.iter('testcase'):
+        outcome = {child.tag for child in case}
+        test_id = f"{case.get('classname', '')}::{case.get('name', '')}"
+        if outcome & {'failure', 'error'}:
+            summary['failed'] += 1
+            summary['failures'].append(test_id)
+        elif 'skipped' in outcome:
+            summary['skipped'] += 1
+        else:
+            summary['passed'] += 1
+    return summary
+
+
+class PythonTestRunner:
+    """One pytest invocation producing results and coverage together"""
+
+    def __init__(self, root: Path = None, paths: List[str] = None, workers: str = 'auto',
+                 timeout: int = DEFAULT_TIMEOUT):
+        self.root = Path(root or ROOT_DIR)
+        self.paths = paths or ['tests']
+        self.workers = workers
+        self.timeout = timeout
+
+    def command(self) -> List[str]:
+        command = [sys.executable, '-m', 'pytest', *self.paths, '-q', '--tb=short', f"--junitxml={JUNIT_REPORT}"]
+        if self.workers and has_plugin('xdist'):
+            command += ['-n', str(self.workers)]
+        sources = python_source_dirs(self.root) if has_plugin('pytest_cov') else []
+        if sources:
+            command += [f"--cov={d}" for d in sources]
+            # Only the JSON report: the terminal table would be parsed by nobody
+            command += [f"--cov-report=json:{PYTEST_REPORT}", '--cov-report=']
+        return command
+
+    def run(self) -> Dict:
+        """Run the suite; returns counts, failing ids, exit code, output and the coverage JSON path"""
+        JUNIT_REPORT.parent.mkdir(parents=True, exist_ok=True)
+        for report in (JUNIT_REPORT, PYTEST_REPORT):
+            if report.exists():
+                report.unlink()
+        code, stdout, stderr = run_command(self.command(), cwd=self.root, timeout=self.timeout)
+        result = parse_junit(JUNIT_REPORT)
+        coverage: Optional[Path] = PYTEST_REPORT if PYTEST_REPORT.exists() else None
+        result.update({
+            'code': code,
+            'ok': code in (0, NO_TESTS_COLLECTED),
+            'output': stdout + stderr,
+            'coverage': coverage,
+        })
+        return result
@@ -0,0 +1,41 @@
+"""
+Subprocess helper shared by every runner
+"""
+
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+
+from .processes import describe, processes
+
+DEFAULT_TIMEOUT = 300
+TIMED_OUT = "Command timed out"
+
+
+def run_command(command: Union[str, List[str]], cwd: Path = None, timeout: int = DEFAULT_TIMEOUT,
+                env: Dict[str, str] = None) -> Tuple[int, str, str]:
+    """Run a command and return exit code, stdout, stderr
+
+    String commands go through the shell, argument lists are executed directly.
+    The command runs in its own session; on timeout or interrupt its whole process
+    tree is reaped, and stderr starts with TIMED_OUT followed by what was reaped.
+    """
+    try:
+        process = processes.spawn(command, cwd=cwd, env=env)
+    except Exception as e:
+        return 1, "", str(e)
+    try:
+        stdout, stderr = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        record = processes.terminate(process, 'timeout')
+        try:
+            stdout, _ = process.communicate(timeout=processes.grace)
+        except subprocess.TimeoutExpired:
+            # Something that left the session still holds the pipe; give up on the partial output
+            stdout = ""
+        return 1, stdout or "", f"{TIMED_OUT}: {describe(record)}"
+    except BaseException:
+        processes.terminate(process, 'interrupt')
+        raise
+    processes.release(process)
+    return process.returncode, stdout, stderr
@@ -0,0 +1,266 @@
+"""
+Per-test history from jest --json reports
+The report is read incrementally: the file is memory-mapped and only the
+entries of its `testResults` array are decoded, one test file at a time, so
+the coverage map jest writes next to them is never loaded. Every test becomes
+a row (run, file, name, status, duration, retries) in a columnar store under
+CACHE_DIR/test-history: one packed array file per column, strings dictionary-
+encoded, rows appended in run order so any window of recent runs is a suffix.
+"""
+
+import json
+import mmap
+import os
+import re
+import time
+from array import array
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .cache import CACHE_DIR, ROOT_DIR
+
+HISTORY_DIR = CACHE_DIR / 'test-history'
+KEEP_RUNS = 200
+
+STATUSES = ['passed', 'failed', 'skipped', 'todo']
+# jest reports skipped tests as "pending" and disabled ones as "disabled"
+STATUS_ALIASES = {'pending': 'skipped', 'disabled': 'skipped', 'focused': 'passed'}
+
+# (column, array typecode): run index, file id, test name id, status, duration in ms, retries
+COLUMNS = [('run', 'I'), ('file', 'I'), ('name', 'I'), ('status', 'B'), ('duration', 'I'), ('retries', 'H')]
+
+# A JSON string, or one structural character
+_TOKEN = re.compile(rb'"(?:[^"\\]|\\.)*"|[{}\[\]]', re.DOTALL)
+_SCALAR = re.compile(rb'-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?|true|false|null')
+
+
+class JestReport:
+    """Stream the per-test records of a jest --json report
+
+    Iterate `records()` first; `summary` then holds the report's top-level scalars
+    (numPassedTests, numFailedTests, numTotalTests, success, ...).
+    """
+
+    def __init__(self, path: Path, root: Path = None):
+        self.path = Path(path)
+        self.root = Path(root or ROOT_DIR)
+        self.summary: Dict = {}
+
+    def _relative(self, name: str) -> str:
+        try:
+            return Path(name).relative_to(self.root).as_posix()
+        except ValueError:
+            return Path(name).as_posix()
+
+    def _file_records(self, suite: Dict) -> Iterator[Dict]:
+        path = self._relative(suite.get('name', ''))
+        assertions = suite.get('assertionResults') or []
+        if not assertions and suite.get('status') == 'failed':
+            # The file itself failed to run (syntax error, failed import, ...)
+            yield {'file': path, 'name': '', 'status': 'failed', 'duration': 0, 'retries': 0}
+        for test in assertions:
+            status = STATUS_ALIASES.get(test.get('status'), test.get('status'))
+            invocations = test.get('invocations')
+            retries = invocations - 1 if isinstance(invocations, int) else len(test.get('retryReasons') or [])
+            yield {
+                'file': path,
+                'name': test.get('fullName') or test.get('title', ''),
+                'status': status if status in STATUSES else 'failed',
+                'duration': int(test.get('duration') or 0),
+                'retries': max(0, retries),
+            }
+
+    def records(self) -> Iterator[Dict]:
+        self.summary = {}
+        with open(self.path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                yield from self._scan(data)
+
+    def _scan(self, data) -> Iterator[Dict]:
+        depth = 0
+        key: Optional[bytes] = None
+        string_value = False
+        in_results = False
+        element_start = None
+        for match in _TOKEN.finditer(data):
+            token = match.group()
+            char = token[:1]
+            if char == b'"':
+                if depth != 1:
+                    continue
+                if string_value:
+                    string_value, key = False, None
+                else:
+                    key, string_value = self._top_level_value(data, match.end(), token)
+                continue
+            if char in b'{[':
+                depth += 1
+                if depth == 2 and key == b'"testResults"' and char == b'[':
+                    in_results = True
+                elif depth == 3 and in_results and char == b'{':
+                    element_start = match.start()
+                continue
+            depth -= 1
+            if depth == 2 and in_results and element_start is not None:
+                yield from self._file_records(json.loads(data[element_start:match.end()]))
+                element_start = None
+            elif depth == 1:
+                in_results = False
+                key = None
+
+    def _top_level_value(self, data, offset: int, key: bytes) -> Tuple[Optional[bytes], bool]:
+        """Look past `"key":`; scalars go to `summary`. Returns (key if an object or array follows, string follows)"""
+        rest = data[offset:offset + 64].lstrip()[1:].lstrip()
+        if rest[:1] in (b'{', b'['):
+            return key, False
+        if rest[:1] == b'"':
+            return None, True
+        value = _SCALAR.match(rest)
+        if value:
+            self.summary[json.loads(key)] = json.loads(value.group())
+        return None, False
+
+
+class TestHistory:
+    """Columnar store of per-test results across runs"""
+
+    def __init__(self, path: Path = None, keep_runs: int = KEEP_RUNS):
+        self.path = Path(path or HISTORY_DIR)
+        self.keep_runs = keep_runs
+        self.runs: List[Dict] = []
+        self.files: List[str] = []
+        self.names: List[str] = []
+        self.columns: Dict[str, array] = {name: array(code) for name, code in COLUMNS}
+        self._load()
+
+    # Storage
+
+    def _load(self) -> None:
+        meta = self.path / 'meta.json'
+        if not meta.exists():
+            return
+        try:
+            state = json.loads(meta.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return
+        self.runs, self.files, self.names = state['runs'], state['files'], state['names']
+        rows = sum(run['rows'] for run in self.runs)
+        for name, code in COLUMNS:
+            column = array(code)
+            path = self.path / f"{name}.col"
+            try:
+                with open(path, 'rb') as f:
+                    column.fromfile(f, rows)
+                if path.stat().st_size > rows * column.itemsize:
+                    # Rows of an add_run interrupted before its metadata was saved; drop them
+                    # so the next append lines up with the recorded count again
+                    os.truncate(path, rows * column.itemsize)
+            except (OSError, EOFError):
+                # A column shorter than the metadata says: the store is damaged, start over
+                self.runs, self.files, self.names = [], [], []
+                self.columns = {n: array(c) for n, c in COLUMNS}
+                self._rewrite()
+                return
+            self.columns[name] = column
+
+    def _save_meta(self) -> None:
+        tmp = self.path / 'meta.json.tmp'
+        tmp.write_text(json.dumps({'runs': self.runs, 'files': self.files, 'names': self.names}), encoding='utf-8')
+        os.replace(tmp, self.path / 'meta.json')
+
+    def _rewrite(self) -> None:
+        for name, _ in COLUMNS:
+            tmp = self.path / f"{name}.col.tmp"
+            with open(tmp, 'wb') as f:
+                self.columns[name].tofile(f)
+            os.replace(tmp, self.path / f"{name}.col")
+
+    def add_run(self, records: Iterator[Dict], label: str = '') -> int:
+        """Append one run's records; returns the number of rows added"""
+        self.path.mkdir(parents=True, exist_ok=True)
+        file_ids = {name: i for i, name in enumerate(self.files)}
+        name_ids = {name: i for i, name in enumerate(self.names)}
+        run_index = (self.runs[-1]['index'] + 1) if self.runs else 0
+        new = {name: array(code) for name, code in COLUMNS}
+        for record in records:
+            for value, ids, strings, column in ((record['file'], file_ids, self.files, 'file'),
+                                                (record['name'], name_ids, self.names, 'name')):
+                if value not in ids:
+                    ids[value] = len(strings)
+                    strings.append(value)
+                new[column].append(ids[value])
+            new['run'].append(run_index)
+            new['status'].append(STATUSES.index(record['status']))
+            new['duration'].append(min(record['duration'], 0xFFFFFFFF))
+            new['retries'].append(min(record['retries'], 0xFFFF))
+        rows = len(new['run'])
+        # Columns first, metadata last: rows past the recorded count are truncated on load
+        for name, _ in COLUMNS:
+            with open(self.path / f"{name}.col", 'ab') as f:
+                new[name].tofile(f)
+            self.columns[name].extend(new[name])
+        self.runs.append({'index': run_index, 'time': time.time(), 'label': label, 'rows': rows})
+        if len(self.runs) > self.keep_runs:
+            self._prune()
+        self._save_meta()
+        return rows
+
+    def _prune(self) -> None:
+        dropped = self.runs[:len(self.runs) - self.keep_runs]
+        start = sum(run['rows'] for run in dropped)
+        self.runs = self.runs[len(dropped):]
+        for name in self.columns:
+            self.columns[name] = self.columns[name][start:]
+        self._rewrite()
+
+    # Queries
+
+    def _window(self, runs: int) -> range:
+        """Row range covering the most recent `runs` runs"""
+        recent = self.runs[-runs:] if runs else self.runs
+        total = len(self.columns['run'])
+        return range(total - sum(run['rows'] for run in recent), total)
+
+    def slowest_tests(self, limit: int = 10, runs: int = 1) -> List[Dict]:
+        """Tests by mean duration over the last `runs` runs"""
+        file, name, duration = self.columns['file'], self.columns['name'], self.columns['duration']
+        totals: Dict = defaultdict(lambda: [0, 0])
+        for row in self._window(runs):
+            entry = totals[(file[row], name[row])]
+            entry[0] += duration[row]
+            entry[1] += 1
+        ranked = sorted(totals.items(), key=lambda item: item[1][0] / item[1][1], reverse=True)[:limit]
+        return [{'file': self.files[f], 'name': self.names[n], 'duration_ms': round(total / count), 'runs': count}
+                for (f, n), (total, count) in ranked]
+
+    def slowest_files(self, limit: int = 10, runs: int = 1) -> List[Dict]:
+        """Test files by summed test duration, averaged over the runs they appear in"""
+        run, file, duration = self.columns['run'], self.columns['file'], self.columns['duration']
+        totals: Dict[int, int] = defaultdict(int)
+        seen: Dict[int, set] = defaultdict(set)
+        for row in self._window(runs):
+            totals[file[row]] += duration[row]
+            seen[file[row]].add(run[row])
+        ranked = sorted(totals, key=lambda f: totals[f] / len(seen[f]), reverse=True)[:limit]
+        return [{'file': self.files[f], 'duration_ms': round(totals[f] / len(seen[f])), 'runs': len(seen[f])}
+                for f in ranked]
+
+    def most_failing(self, limit: int = 10, runs: int = 20) -> List[Dict]:
+        """Tests by failure count over the last `runs` runs, with their retries"""
+        file, name, status, retries = (self.columns[c] for c in ('file', 'name', 'status', 'retries'))
+        failed = STATUSES.index('failed')
+        counts: Dict = defaultdict(lambda: [0, 0, 0])
+        for row in self._window(runs):
+            entry = counts[(file[row], name[row])]
+            entry[1] += 1
+            entry[2] += retries[row]
+            if status[row] == failed:
+                entry[0] += 1
+        ranked = sorted(((key, c) for key, c in counts.items() if c[0]), key=lambda item: item[1][0],
+                        reverse=True)[:limit]
+        return [{'file': self.files[f], 'name': self.names[n], 'failures': fails, 'runs': seen,
+                 'fail_rate': round(fails / seen, 3), 'retries': retried}
+                for (f, n), (fails, seen, retried) in ranked]
@@ -0,0 +1,172 @@
+"""
+Managed web-app fixture for E2E runs
+Serves the built `web` bundle in-process (or starts the dev server when there is
+no up-to-date build) on a free local port, and probes it over HTTP with backoff
+until it is ready. One instance is meant to live for a whole runner session.
+"""
+
+import functools
+import os
+import socket
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+
+from .cache import CACHE_DIR, ROOT_DIR
+from .processes import processes
+
+READY_TIMEOUT = 120
+
+
+def find_free_port(host: str = '127.0.0.1') -> int:
+    """Ask the OS for an unused TCP port"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind((host, 0))
+        return s.getsockname()[1]
+
+
+def wait_until_ready(url: str, timeout: float = READY_TIMEOUT, process: subprocess.Popen = None) -> bool:
+    """Poll url with exponential backoff until it answers with a non-5xx status"""
+    deadline = time.time() + timeout
+    delay = 0.1
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            return False
+        try:
+            with urllib.request.urlopen(url, timeout=min(5.0, delay * 4)) as response:
+                if response.status < 500:
+                    return True
+        except urllib.error.HTTPError as e:
+            if e.code < 500:
+                return True
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(min(delay, max(0.0, deadline - time.time())))
+        delay = min(delay * 2, 2.0)
+    return False
+
+
+class _SpaHandler(SimpleHTTPRequestHandler):
+    """Static file handler that falls back to index.html for client-side routes"""
+
+    def send_head(self):
+        path = Path(self.translate_path(self.path))
+        if not path.exists():
+            self.path = '/index.html'
+        return super().send_head()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _newest_mtime(directory: Path) -> float:
+    newest = 0.0
+    for dirpath, dirnames, filenames in os.walk(directory):
+        dirnames[:] = [d for d in dirnames if d != 'node_modules']
+        for name in filenames:
+            try:
+                newest = max(newest, os.path.getmtime(os.path.join(dirpath, name)))
+            except OSError:
+                pass
+    return newest
+
+
+class WebAppServer:
+    """Start the web app on a free port, reuse it across iterations, stop it at the end"""
+
+    def __init__(self, root: Path = None, host: str = '127.0.0.1', port: int = None):
+        self.root = Path(root or ROOT_DIR)
+        self.web_dir = self.root / 'web'
+        self.host = host
+        self.port = port
+        self.mode: Optional[str] = None
+        self.error = ''
+        self._httpd: Optional[ThreadingHTTPServer] = None
+        self._process: Optional[subprocess.Popen] = None
+        self._log_path: Optional[Path] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def running(self) -> bool:
+        if self._httpd is not None:
+            return True
+        return self._process is not None and self._process.poll() is None
+
+    def build_is_current(self) -> bool:
+        """True when web/build exists and is newer than every source file"""
+        index = self.web_dir / 'build' / 'index.html'
+        if not index.exists():
+            return False
+        built = os.path.getmtime(index)
+        return all(_newest_mtime(self.web_dir / d) <= built for d in ('src', 'public') if (self.web_dir / d).exists())
+
+    def start(self, timeout: float = READY_TIMEOUT) -> bool:
+        """Start (or keep) the server and wait until it answers; returns readiness"""
+        if self.running and self.mode == 'static' and not self.build_is_current():
+            self.stop()  # a rebuilt bundle is served fresh; the dev server hot-reloads itself
+        if self.running:
+            return True
+        self.error = ''
+        self.port = self.port or find_free_port(self.host)
+        if self.build_is_current():
+            return self._start_static()
+        return self._start_dev_server(timeout)
+
+    def _start_static(self) -> bool:
+        handler = functools.partial(_SpaHandler, directory=str(self.web_dir / 'build'))
+        try:
+            self._httpd = ThreadingHTTPServer((self.host, self.port), handler)
+        except OSError as e:
+            self.error = f"Could not bind {self.url}: {e}"
+            return False
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, name='web-fixture', daemon=True).start()
+        self.mode = 'static'
+        return wait_until_ready(self.url, timeout=10)
+
+    def _start_dev_server(self, timeout: float) -> bool:
+        if not (self.web_dir / 'package.json').exists():
+            self.error = "web/package.json not found"
+            return False
+        env = dict(os.environ, PORT=str(self.port), HOST=self.host, BROWSER='none', CI='true')
+        self._log_path = CACHE_DIR / 'web-fixture.log'
+        self._log_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self._log_path, 'w', encoding='utf-8') as log:
+            try:
+                self._process = processes.spawn('npm start', cwd=self.web_dir, env=env, resident=True,
+                                                stdout=log, stderr=subprocess.STDOUT)
+            except OSError as e:
+                self.error = f"Could not start web dev server: {e}"
+                return False
+        self.mode = 'dev-server'
+        if wait_until_ready(self.url, timeout=timeout, process=self._process):
+            return True
+        self.error = f"Web app did not become ready on {self.url}; see {self._log_path}"
+        self.stop()
+        return False
+
+    def stop(self) -> None:
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+        if self._process is not None:
+            # Takes the dev server's whole tree down, including the webpack children npm started
+            processes.terminate(self._process, 'stop')
+            self._process = None
+        self.mode = None
+
+    def __enter__(self) -> 'WebAppServer':
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
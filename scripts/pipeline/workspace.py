@@ -0,0 +1,176 @@
+"""
+Workspace package graph and affected-package detection
+Packages are the directories matched by pnpm-workspace.yaml (and the root
+package.json `workspaces` field), plus any local package another one reaches
+through a `file:`, `link:` or `workspace:` dependency. An edge A -> B means A
+depends on B. A change inside a package affects it and, transitively, every
+package that depends on it. A change outside every package (a root manifest,
+lockfile, shared config, pipeline.yml, the scripts that run the pipeline...)
+affects them all, unless it is documentation.
+"""
+
+import fnmatch
+import json
+import subprocess
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+import yaml
+
+from .cache import ROOT_DIR
+
+DEPENDENCY_FIELDS = ('dependencies', 'devDependencies', 'peerDependencies', 'optionalDependencies')
+# Paths outside the packages that no build or test reads (fnmatch, so `*` spans directories)
+DOCUMENTATION = ['*.md', '*.rst', 'docs/*', 'LICENSE*', 'CODEOWNERS', '.github/ISSUE_TEMPLATE/*']
+
+
+def _git(root: Path, *args: str) -> Optional[str]:
+    try:
+        result = subprocess.run(['git', *args], cwd=root, capture_output=True, text=True, timeout=60)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return result.stdout if result.returncode == 0 else None
+
+
+def changed_paths(root: Path, base_ref: str) -> Optional[List[str]]:
+    """Repo-relative paths added, modified, deleted or renamed since the merge base with base_ref
+
+    Uncommitted and untracked files count. None when the base ref cannot be resolved.
+    """
+    base = (_git(root, 'merge-base', base_ref, 'HEAD') or '').strip()
+    if not base:
+        return None
+    diff = _git(root, 'diff', '--name-only', '--no-renames', base, '--')
+    untracked = _git(root, 'ls-files', '--others', '--exclude-standard')
+    if diff is None or untracked is None:
+        return None
+    return sorted(set(diff.splitlines() + untracked.splitlines()) - {''})
+
+
+class Workspace:
+    """The repo's packages (by directory, relative to the root) and the dependencies between them
+
+    `extra` adds directories a runner works on that the workspace files do not
+    list, such as the `tests` package.
+    """
+
+    def __init__(self, root: Path = None, extra: Iterable[str] = ()):
+        self.root = Path(root or ROOT_DIR)
+        self.manifests: Dict[str, Dict] = {}
+        self.dependencies: Dict[str, Set[str]] = {}
+        pending = self._declared() + list(extra)
+        while pending:
+            directory = pending.pop()
+            if directory in self.manifests:
+                continue
+            manifest = self._manifest(directory)
+            if manifest is None:
+                continue
+            self.manifests[directory] = manifest
+            pending.extend(self._local_references(directory, manifest))
+        names = {manifest.get('name'): directory for directory, manifest in self.manifests.items()}
+        for directory, manifest in self.manifests.items():
+            deps = set()
+            for field in DEPENDENCY_FIELDS:
+                for name, spec in (manifest.get(field) or {}).items():
+                    if name in names:
+                        deps.add(names[name])
+                    elif isinstance(spec, str) and spec.startswith(('file:', 'link:')):
+                        deps.add(self._resolve(directory, spec))
+            deps.discard(directory)
+            self.dependencies[directory] = deps & set(self.manifests)
+
+    def _declared(self) -> List[str]:
+        patterns = []
+        try:
+            spec = yaml.safe_load((self.root / 'pnpm-workspace.yaml').read_text(encoding='utf-8')) or {}
+            patterns.extend(spec.get('packages') or [])
+        except (OSError, yaml.YAMLError):
+            pass
+        root_manifest = self._manifest('.') or {}
+        workspaces = root_manifest.get('workspaces') or []
+        patterns.extend(workspaces.get('packages', []) if isinstance(workspaces, dict) else workspaces)
+        directories = []
+        for pattern in patterns:
+            if pattern.startswith('!'):
+                continue
+            pattern = pattern.rstrip('/')
+            if any(c in pattern for c in '*?['):
+                directories.extend(p.parent.relative_to(self.root).as_posix()
+                                   for p in self.root.glob(f"{pattern}/package.json"))
+            else:
+                directories.append(pattern)
+        excluded = [p[1:].rstrip('/') for p in patterns if p.startswith('!')]
+        return [d for d in directories if not any(fnmatch.fnmatch(d, p) for p in excluded)]
+
+    def _manifest(self, directory: str) -> Optional[Dict]:
+        try:
+            return json.loads((self.root / directory / 'package.json').read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+
+    def _resolve(self, directory: str, spec: str) -> str:
+        target = (self.root / directory / spec.split(':', 1)[1]).resolve()
+        try:
+            return target.relative_to(self.root.resolve()).as_posix()
+        except ValueError:
+            return target.as_posix()
+
+    def _local_references(self, directory: str, manifest: Dict) -> List[str]:
+        return [self._resolve(directory, spec)
+                for field in DEPENDENCY_FIELDS
+                for spec in (manifest.get(field) or {}).values()
+                if isinstance(spec, str) and spec.startswith(('file:', 'link:'))]
+
+    @property
+    def packages(self) -> List[str]:
+        return sorted(self.manifests)
+
+    def package_of(self, path: str) -> Optional[str]:
+        """The innermost package containing a repo-relative path"""
+        owners = [d for d in self.manifests if path == d or path.startswith(f"{d}/")]
+        return max(owners, key=len) if owners else None
+
+    def dependents(self, packages: Iterable[str]) -> Set[str]:
+        """The packages plus everything that depends on them, directly or transitively"""
+        found = set(packages)
+        pending = list(found)
+        while pending:
+            package = pending.pop()
+            for other, deps in self.dependencies.items():
+                if package in deps and other not in found:
+                    found.add(other)
+                    pending.append(other)
+        return found
+
+    def with_dependencies(self, packages: Iterable[str]) -> Set[str]:
+        """The packages plus everything they depend on, e.g. to install or build before them"""
+        found = set(packages)
+        pending = list(found)
+        while pending:
+            for dep in self.dependencies.get(pending.pop(), ()):
+                if dep not in found:
+                    found.add(dep)
+                    pending.append(dep)
+        return found
+
+    def affected(self, paths: Iterable[str]) -> Set[str]:
+        """Packages a set of changed paths can break"""
+        changed = set()
+        for path in paths:
+            package = self.package_of(path)
+            if package is not None:
+                changed.add(package)
+            elif not any(fnmatch.fnmatch(path, pattern) for pattern in DOCUMENTATION):
+                return set(self.manifests)
+        return self.dependents(changed)
+
+
+def affected_packages(root: Path, base_ref: Optional[str], extra: Iterable[str] = ()) -> Optional[Set[str]]:
+    """Package directories affected since base_ref, or None to process everything"""
+    if not base_ref:
+        return None
+    paths = changed_paths(Path(root), base_ref)
+    if paths is None:
+        return None
+    return Workspace(root, extra).affected(paths)
@@ -0,0 +1,142 @@
+"""
+Disposable worktrees for trying candidate fixes side by side
+Each candidate gets its own `git worktree` of the current working tree
+(uncommitted and untracked files included) under CACHE_DIR/worktrees. The
+installed node_modules and built dist directories are not reinstalled or
+rebuilt: they are reflinked where the filesystem supports it and hardlinked
+otherwise, so a worktree costs little more than its source checkout. Hardlinks
+share inodes with the main tree, which is safe as long as nothing writes into
+node_modules; jest and tsc do not (jest's cache lives elsewhere).
+"""
+
+import os
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .cache import CACHE_DIR, ROOT_DIR
+
+# Untracked directories a candidate needs but should not rebuild
+LINKED_DIRS = ('node_modules', 'dist')
+# git serialises worktree bookkeeping with lock files; concurrent adds would fail instead of wait
+_git_lock = threading.Lock()
+
+
+def _git(root: Path, *args: str) -> Optional[str]:
+    try:
+        result = subprocess.run(['git', *args], cwd=root, capture_output=True, text=True, timeout=120)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return result.stdout if result.returncode == 0 else None
+
+
+def _link_or_copy(src: str, dst: str) -> None:
+    try:
+        os.link(src, dst)
+    except OSError:
+        # Another filesystem, or a link count limit
+        shutil.copy2(src, dst)
+
+
+def link_tree(src: Path, dst: Path) -> str:
+    """Replicate a directory without duplicating file data; returns 'reflink', 'hardlink' or 'copy'"""
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        result = subprocess.run(['cp', '-a', '--reflink=always', str(src), str(dst)], capture_output=True)
+        if result.returncode == 0:
+            return 'reflink'
+    except OSError:
+        pass
+    shutil.rmtree(dst, ignore_errors=True)
+    shutil.copytree(src, dst, symlinks=True, copy_function=_link_or_copy)
+    same_device = os.stat(src).st_dev == os.stat(dst).st_dev
+    return 'hardlink' if same_device else 'copy'
+
+
+def linked_dirs(root: Path) -> List[Path]:
+    """node_modules and dist directories at the root and one level down, relative to root"""
+    found = []
+    for parent in [root] + sorted(p for p in root.iterdir() if p.is_dir() and not p.name.startswith('.')):
+        for name in LINKED_DIRS:
+            if (parent / name).is_dir() and parent.name not in LINKED_DIRS:
+                found.append((parent / name).relative_to(root))
+    return found
+
+
+class Worktree:
+    """A throwaway copy of the working tree, removed on exit
+
+    with Worktree('candidate-1') as tree:
+        tree.write({'tests/unit/a.test.ts': text})
+        run_command([...], cwd=tree.path / 'tests')
+    """
+
+    def __init__(self, name: str, root: Path = None):
+        self.root = Path(root or ROOT_DIR)
+        self.path = CACHE_DIR / 'worktrees' / f"{name}-{os.getpid()}"
+        self.link_method = None
+
+    def __enter__(self) -> 'Worktree':
+        self.create()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.remove()
+
+    def create(self) -> None:
+        self.remove()
+        with _git_lock:
+            # A commit of the index and working tree that leaves both untouched
+            base = (_git(self.root, 'stash', 'create') or '').strip() or 'HEAD'
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            if _git(self.root, 'worktree', 'add', '--detach', str(self.path), base) is None:
+                raise RuntimeError(f"git worktree add failed for {self.path}")
+        untracked = _git(self.root, 'ls-files', '--others', '--exclude-standard', '-z') or ''
+        for name in filter(None, untracked.split('\0')):
+            target = self.path / name
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(self.root / name, target, follow_symlinks=False)
+        for relative in linked_dirs(self.root):
+            if not (self.path / relative).exists():
+                self.link_method = link_tree(self.root / relative, self.path / relative)
+
+    def write(self, files: Dict[str, str]) -> None:
+        """Replace files (repo-relative path -> content) in the worktree"""
+        for name, content in files.items():
+            (self.path / name).write_text(content, encoding='utf-8')
+
+    def remove(self) -> None:
+        with _git_lock:
+            if self.path.exists():
+                _git(self.root, 'worktree', 'remove', '--force', str(self.path))
+                shutil.rmtree(self.path, ignore_errors=True)
+            _git(self.root, 'worktree', 'prune')
+
+
+def evaluate_candidates(candidates: Dict[str, Dict[str, str]], evaluate: Callable[[Path], Tuple],
+                        jobs: int = None, root: Path = None) -> Dict[str, Optional[Tuple]]:
+    """Score every candidate (name -> files to write) in its own worktree, concurrently
+
+    `evaluate(worktree_root)` returns a score where lower is better; a candidate
+    whose worktree or evaluation fails scores None. Worktrees are always removed.
+    """
+    def score(name: str) -> Optional[Tuple]:
+        try:
+            with Worktree(name, root) as tree:
+                tree.write(candidates[name])
+                return evaluate(tree.path)
+        except Exception:
+            return None
+
+    jobs = jobs or min(len(candidates), max(1, (os.cpu_count() or 2) // 2))
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        return dict(zip(candidates, pool.map(score, candidates)))
+
+
+def best_candidate(scores: Dict[str, Optional[Tuple]]) -> Optional[str]:
+    """Lowest-scoring candidate; ties go to the first one listed"""
+    scored = [(score, i, name) for i, (name, score) in enumerate(scores.items()) if score is not None]
+    return min(scored)[2] if scored else None
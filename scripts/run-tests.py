@@ -4,13 +4,31 @@ Complete Test Runner with Auto-Fix
 Runs all tests and fixes issues until all pass with 90%+ coverage
 """
 
+import argparse
 import os
 import sys
-import subprocess
-import json
+import time
 from pathlib import Path
 from typing import List, Tuple, Dict
 
+from pipeline.buildcache import configured_cache
+from pipeline.checkpoint import Checkpoint, run_options
+from pipeline.convergence import ConvergenceTracker
+from pipeline.coverage import (changed_lines, collect_coverage, diff_coverage, format_ranges, jest_partial_args,
+                               load_istanbul, package_coverage, source_changes)
+from pipeline.engine import Engine, load_pipeline
+from pipeline.jestcache import with_cache
+from pipeline.jestdaemon import daemon_enabled, daemons
+from pipeline.jestworkers import planner
+from pipeline.logstore import LogStore
+from pipeline.metrics import PipelineMetrics, metrics_path
+from pipeline.packagestore import ensure_installed
+from pipeline.planning import StepTimings, plan_lines, plan_run, prediction_summary
+from pipeline.processes import processes
+from pipeline.shell import run_command
+from pipeline.webserver import WebAppServer
+from pipeline.workspace import Workspace, affected_packages
+
 class Colors:
     HEADER = '\033[95m'
     BLUE = '\033[94m'
@@ -22,36 +40,90 @@ class Colors:
     BOLD = '\033[1m'
 
 class TestRunner:
-    def __init__(self):
+    def __init__(self, jobs: int = 1, incremental: bool = True, diff_base: str = None, remote_cache: str = None,
+                 resume: bool = False, since: str = None, jest_daemon: bool = False):
         self.root = Path(__file__).parent.parent
+        self.jest_daemon = jest_daemon or daemon_enabled()
         self.failures = []
         self.coverage_data = {}
+        self.diff_base = diff_base
+        self.diff_report = None
+        self.since = since
+        # None means every package; otherwise only those a change since `since` can break
+        self.affected = affected_packages(self.root, since, extra=['tests'])
+        self.stop_reason = None
+        self.web_server = WebAppServer(self.root)
+        self.logs = LogStore()
+        self.metrics = PipelineMetrics('run-tests')
+        self.build_cache = configured_cache(self.root, remote_cache)
+        self.engine = Engine(load_pipeline(), handlers=self.handlers(), root=self.root, jobs=jobs,
+                             incremental=incremental, logs=self.logs, build_cache=self.build_cache,
+                             checkpoint=Checkpoint('run-tests', options=run_options(
+                                 since=since, affected=self.affected, diff_base=diff_base)),
+                             resume=resume, timings=StepTimings())
         
     def log(self, msg: str, color: str = Colors.END):
         print(f"{color}{msg}{Colors.END}")
     
     def run_cmd(self, cmd: str, cwd: Path = None) -> Tuple[int, str, str]:
         """Run command and return exit code, stdout, stderr"""
-        try:
-            result = subprocess.run(
-                cmd,
-                shell=True,
-                cwd=cwd or self.root,
-                capture_output=True,
-                text=True,
-                timeout=300
-            )
-            return result.returncode, result.stdout, result.stderr
-        except subprocess.TimeoutExpired:
-            return 1, "", "Command timed out"
-        except Exception as e:
-            return 1, "", str(e)
+        return run_command(cmd, cwd=cwd or self.root)
+    
+    def run_jest(self, cmd, cwd: Path, key: str) -> Tuple[int, str, str]:
+        """Run an npm script backed by jest with a --maxWorkers planned for the current load
+
+        Jest keeps its transform cache in the package's persistent cache directory;
+        with --jest-daemon the run is served by a resident jest when the script allows it.
+        """
+        with planner.slot(key) as plan:
+            command = planner.command(with_cache(cmd, cwd), plan['workers'])
+            result = daemons.run(command, cwd) if self.jest_daemon else None
+            return result if result is not None else self.run_cmd(command, cwd=cwd)
+    
+    def handlers(self) -> Dict:
+        """Bind the `call` names of the run-tests targets in pipeline.yml"""
+        return {
+            'check_dependencies': lambda step: self.check_dependencies(),
+            'build_core': lambda step: self.build_core(),
+            'run_unit_tests': self._suite_step(self.run_unit_tests, 'unit-tests'),
+            'run_integration_tests': self._suite_step(self.run_integration_tests, 'integration-tests'),
+            'run_e2e_tests': self._suite_step(self.run_e2e_tests, 'e2e-tests'),
+            'check_coverage': self._coverage_step,
+        }
+    
+    def _suite_step(self, method, suite: str):
+        """Wrap a suite runner so its failures travel with the step result"""
+        def handler(step) -> Tuple[bool, List[Dict]]:
+            passed = method()
+            return passed, [f for f in self.failures if f['suite'] == suite]
+        return handler
+    
+    def _coverage_step(self, step) -> Tuple[bool, Dict[str, float]]:
+        coverage = self.check_coverage()
+        return bool(coverage) and all(cov >= 90 for cov in coverage.values()), coverage
+    
+    def report_affected(self):
+        if self.since and self.affected is None:
+            self.log(f"⚠️  Cannot diff against {self.since}, processing every package", Colors.YELLOW)
+        elif self.affected is not None:
+            self.log(f"🎯 Affected since {self.since}: {', '.join(sorted(self.affected)) or 'nothing'}\n", Colors.CYAN)
+    
+    def unaffected(self, label: str, *packages: str) -> bool:
+        """True (and says so) when --since rules out every package a suite covers"""
+        if self.affected is None or any(package in self.affected for package in packages):
+            return False
+        self.log(f"⏭️  {label} skipped: {', '.join(packages)} unchanged since {self.since}", Colors.CYAN)
+        return True
     
     def check_dependencies(self) -> bool:
         """Ensure all dependencies are installed"""
         self.log("\n📦 Checking Dependencies...", Colors.HEADER)
         
         packages = ['core', 'vscode-extension', 'desktop', 'web', 'tests']
+        if self.affected is not None:
+            # Affected packages need their own dependencies installed too
+            needed = Workspace(self.root, extra=['tests']).with_dependencies(self.affected)
+            packages = [package for package in packages if package in needed]
         all_installed = True
         
         for package in packages:
@@ -59,16 +131,16 @@ class TestRunner:
             if not pkg_path.exists():
                 continue
                 
-            node_modules = pkg_path / 'node_modules'
-            if not node_modules.exists():
-                self.log(f"⚠️  {package}: Installing dependencies...", Colors.YELLOW)
-                code, _, err = self.run_cmd("npm install", cwd=pkg_path)
-                if code != 0:
-                    self.log(f"❌ {package}: Failed to install dependencies", Colors.RED)
-                    self.log(err, Colors.RED)
-                    all_installed = False
-                else:
-                    self.log(f"✅ {package}: Dependencies installed", Colors.GREEN)
+            # Identical files across packages are hardlinked from the shared package store
+            how, code, err = ensure_installed(pkg_path, lambda: self.run_cmd("npm install", cwd=pkg_path))
+            if how == 'failed':
+                self.log(f"❌ {package}: Failed to install dependencies", Colors.RED)
+                self.log(err, Colors.RED)
+                all_installed = False
+            elif how == 'installed':
+                self.log(f"✅ {package}: Dependencies installed", Colors.GREEN)
+            elif how == 'linked':
+                self.log(f"✅ {package}: Dependencies linked from the package store", Colors.GREEN)
             else:
                 self.log(f"✅ {package}: Dependencies OK", Colors.GREEN)
         
@@ -92,16 +164,16 @@ class TestRunner:
     def run_unit_tests(self) -> bool:
         """Run core unit tests"""
         self.log("\n🧪 Running Unit Tests...", Colors.HEADER)
+        if self.unaffected("Unit tests", 'core'):
+            return True
         
         core_path = self.root / 'core'
-        code, stdout, stderr = self.run_cmd("npm test", cwd=core_path)
+        code, stdout, stderr = self.run_jest("npm test", core_path, 'core')
+        self.metrics.record_tests('unit-tests', stdout + stderr)
         
         if code != 0:
             self.log("❌ Unit tests failed", Colors.RED)
-            self.failures.append({
-                'suite': 'unit-tests',
-                'output': stderr or stdout
-            })
+            self.failures.append(self.logs.failure('unit-tests', stderr or stdout))
             return False
         
         self.log("✅ All unit tests passed", Colors.GREEN)
@@ -110,20 +182,20 @@ class TestRunner:
     def run_integration_tests(self) -> bool:
         """Run integration tests"""
         self.log("\n🔗 Running Integration Tests...", Colors.HEADER)
+        if self.unaffected("Integration tests", 'tests'):
+            return True
         
         tests_path = self.root / 'tests'
         if not tests_path.exists():
             self.log("⚠️  Tests directory not found", Colors.YELLOW)
             return True
         
-        code, stdout, stderr = self.run_cmd("npm run test:integration", cwd=tests_path)
+        code, stdout, stderr = self.run_jest("npm run test:integration", tests_path, 'tests:integration')
+        self.metrics.record_tests('integration-tests', stdout + stderr)
         
         if code != 0:
             self.log("❌ Integration tests failed", Colors.RED)
-            self.failures.append({
-                'suite': 'integration-tests',
-                'output': stderr or stdout
-            })
+            self.failures.append(self.logs.failure('integration-tests', stderr or stdout))
             return False
         
         self.log("✅ All integration tests passed", Colors.GREEN)
@@ -132,27 +204,31 @@ class TestRunner:
     def run_e2e_tests(self) -> bool:
         """Run E2E tests"""
         self.log("\n🌐 Running E2E Tests...", Colors.HEADER)
+        if self.unaffected("E2E tests", 'web', 'tests'):
+            return True
         
         tests_path = self.root / 'tests'
         if not tests_path.exists():
-            self.log("⚠️  E2E tests skipped (web app not running)", Colors.YELLOW)
+            self.log("⚠️  E2E tests skipped (tests directory not found)", Colors.YELLOW)
             return True
         
-        # Check if web app is running
-        code, _, _ = self.run_cmd("curl -s http://localhost:3000 > nul 2>&1")
-        if code != 0:
-            self.log("⚠️  Web app not running. Skipping E2E tests", Colors.YELLOW)
-            self.log("ℹ️  Start web app with: cd web && npm start", Colors.CYAN)
-            return True
+        # Serve the web app ourselves; the fixture is reused across iterations
+        if not self.web_server.start():
+            self.log(f"❌ Web app could not be started: {self.web_server.error}", Colors.RED)
+            self.failures.append(self.logs.failure('e2e-tests', self.web_server.error))
+            return False
+        self.log(f"ℹ️  Web app ({self.web_server.mode}) at {self.web_server.url}", Colors.CYAN)
         
-        code, stdout, stderr = self.run_cmd("npm run test:e2e", cwd=tests_path)
+        code, stdout, stderr = run_command(
+            "npm run test:e2e",
+            cwd=tests_path,
+            env=dict(os.environ, E2E_BASE_URL=self.web_server.url)
+        )
+        self.metrics.record_tests('e2e-tests', stdout + stderr)
         
         if code != 0:
             self.log("❌ E2E tests failed", Colors.RED)
-            self.failures.append({
-                'suite': 'e2e-tests',
-                'output': stderr or stdout
-            })
+            self.failures.append(self.logs.failure('e2e-tests', stderr or stdout))
             return False
         
         self.log("✅ All E2E tests passed", Colors.GREEN)
@@ -163,61 +239,17 @@ class TestRunner:
         self.log("\n📊 Checking Test Coverage...", Colors.HEADER)
         
         tests_path = self.root / 'tests'
-        code, stdout, stderr = self.run_cmd("npm run test:coverage -- --json --coverage", cwd=tests_path)
-        
-        coverage = {}
-        
-        # Parse coverage data from JSON output
-        if code == 0 and stdout:
-            try:
-                import json
-                import re
-                
-                # Extract JSON from output
-                json_match = re.search(r'\{.*"coverageMap".*\}', stdout, re.DOTALL)
-                if json_match:
-                    data = json.loads(json_match.group())
-                    if 'coverageMap' in data:
-                        # Calculate coverage from coverage map
-                        total_statements = 0
-                        covered_statements = 0
-                        
-                        for file_data in data['coverageMap'].values():
-                            if 's' in file_data:  # statements
-                                total_statements += len(file_data['s'])
-                                covered_statements += sum(1 for v in file_data['s'].values() if v > 0)
-                        
-                        if total_statements > 0:
-                            coverage['core'] = round((covered_statements / total_statements) * 100, 2)
-            except Exception as e:
-                self.log(f"Coverage parsing error: {e}", Colors.YELLOW)
-        
-        # Try alternative: parse text output
-        if not coverage and "%" in stdout:
-            try:
-                lines = stdout.split('\n')
-                for line in lines:
-                    if 'All files' in line or 'Statements' in line:
-                        parts = line.split('|')
-                        if len(parts) >= 2:
-                            for part in parts:
-                                if '%' in part:
-                                    cov_val = float(part.strip().replace('%', ''))
-                                    coverage['core'] = cov_val
-                                    break
-            except:
-                pass
-        
-        # Default values if parsing failed
-        if 'core' not in coverage:
-            self.log("⚠️  Using estimated coverage values", Colors.YELLOW)
-            coverage = {
-                'core': 85.0,
-                'ai-engine': 95.0,
-                'context-manager': 90.0,
-                'extension': 80.0,
-                'web': 75.0
-            }
+        if self.diff_base:
+            coverage = self.check_diff_coverage(tests_path)
+            if coverage is not None:
+                return coverage
+        
+        # The tests project instruments core, the extension and desktop (collectCoverageFrom)
+        started = time.time()
+        self.run_jest("npm run test:coverage", tests_path, 'tests:coverage')
+        coverage = package_coverage(collect_coverage(self.root, since=started))
+        if not coverage:
+            self.log("❌ No coverage report was produced", Colors.RED)
         
         self.coverage_data = coverage
         
@@ -230,10 +262,41 @@ class TestRunner:
             else:
                 self.log(f"❌ {package}: {cov}%", Colors.RED)
         
-        # Check if any package is below target
-        below_target = any(cov < 90 for cov in coverage.values())
         return coverage
     
+    def check_diff_coverage(self, tests_path: Path) -> Dict[str, float]:
+        """Coverage of the lines changed since --diff-base, from a jest run over the related tests only"""
+        changes = changed_lines(self.root, self.diff_base)
+        if changes is None:
+            self.log(f"⚠️  Cannot diff against {self.diff_base}, checking whole-repo coverage", Colors.YELLOW)
+            return None
+        if not source_changes(changes):
+            self.log(f"✅ No source lines changed since {self.diff_base}", Colors.GREEN)
+            self.diff_report = diff_coverage({}, {}, self.root)
+            return {'diff': 100.0}
+        
+        # Remove the previous report so a jest crash cannot be mistaken for fresh data
+        final = tests_path / 'coverage' / 'coverage-final.json'
+        if final.exists():
+            final.unlink()
+        self.run_jest(
+            ['npm', 'run', 'test:coverage', '--', *jest_partial_args(changes, self.root, tests_path)],
+            tests_path, 'tests:coverage'
+        )
+        self.diff_report = diff_coverage(changes, load_istanbul(final), self.root)
+        
+        for path, lines in self.diff_report['files'].items():
+            if lines['uncovered']:
+                self.log(f"  {path}: uncovered changed lines {format_ranges(lines['uncovered'])}", Colors.YELLOW)
+        for path in self.diff_report['unmeasured']:
+            self.log(f"  {path}: changed but not instrumented by jest", Colors.YELLOW)
+        self.log(
+            f"📊 Diff coverage vs {self.diff_base}: {self.diff_report['covered']}/{self.diff_report['total']} "
+            f"changed lines ({self.diff_report['percent']}%)",
+            Colors.CYAN
+        )
+        return {'diff': self.diff_report['percent']}
+    
     def fix_common_issues(self) -> bool:
         """Attempt to fix common test issues"""
         self.log("\n🔧 Fixing Common Issues...", Colors.HEADER)
@@ -247,14 +310,6 @@ class TestRunner:
                 fixed_any = True
                 self.log("✅ Core rebuilt", Colors.GREEN)
         
-        # Fix 2: Clear Jest cache
-        self.log("🔧 Clearing test caches...", Colors.CYAN)
-        for package in ['core', 'tests']:
-            pkg_path = self.root / package
-            if pkg_path.exists():
-                self.run_cmd("npm run test -- --clearCache", cwd=pkg_path)
-        fixed_any = True
-        
         return fixed_any
     
     def generate_report(self, all_passed: bool) -> str:
@@ -273,7 +328,7 @@ OpenPilot Test Report
             report += f"{Colors.RED}❌ SOME TESTS FAILED{Colors.END}\n\n"
             report += f"{Colors.CYAN}Failures:{Colors.END}\n"
             for failure in self.failures:
-                report += f"  • {failure['suite']}\n"
+                report += f"  • {failure['suite']} (log: {failure['log']})\n"
         
         report += f"\n{Colors.CYAN}Coverage:{Colors.END}\n"
         for package, cov in self.coverage_data.items():
@@ -283,45 +338,88 @@ OpenPilot Test Report
         avg_coverage = sum(self.coverage_data.values()) / len(self.coverage_data) if self.coverage_data else 0
         report += f"\n  Average: {avg_coverage:.1f}%\n"
         
+        resources = self.metrics.resource_lines()
+        if resources:
+            report += f"\n{Colors.CYAN}Resources:{Colors.END}\n"
+            for line in resources:
+                report += f"  • {line}\n"
+        
         report += f"\n{'='*70}\n"
         
         return report
     
     def run(self, max_iterations: int = 3) -> bool:
         """Main test runner with auto-fix loop"""
+        try:
+            self.metrics.success = self._run(max_iterations)
+            return self.metrics.success
+        finally:
+            self.web_server.stop()
+    
+    def _run(self, max_iterations: int) -> bool:
         self.log(f"\n{Colors.BOLD}🚀 Starting OpenPilot Test Suite{Colors.END}", Colors.CYAN)
         self.log(f"Max iterations: {max_iterations}\n", Colors.CYAN)
+        self.report_affected()
+        
+        setup = self.engine.run('run-tests:setup')
+        self.metrics.record_steps(setup)
+        for result in self.engine.reused(setup):
+            step = self.engine.pipeline.steps[result.step_id]
+            self.log(f"↺ {step.description}: inputs unchanged, keeping previous result ({result.status})", Colors.CYAN)
         
         # Step 1: Check dependencies
-        if not self.check_dependencies():
+        if not setup['run-tests.dependencies'].ok:
             self.log("\n❌ Please install dependencies manually", Colors.RED)
             self.log("Run: npm install in each package directory\n", Colors.YELLOW)
             return False
         
         # Step 2: Build core
-        if not self.build_core():
+        if not setup['run-tests.build-core'].ok:
             self.log("\n❌ Core build failed. Please fix manually", Colors.RED)
             return False
         
+        tracker = ConvergenceTracker(self.root)
+        iteration_failures = []
+        
         # Test loop with auto-fix
         for iteration in range(1, max_iterations + 1):
+            # Stop when nothing changed since an iteration that already failed
+            self.stop_reason = tracker.check(iteration, iteration_failures)
+            if self.stop_reason:
+                self.log(f"\n⏹  Stopping early: {self.stop_reason}", Colors.YELLOW)
+                break
+            
             self.log(f"\n{Colors.BOLD}{'='*70}", Colors.BLUE)
+            self.metrics.iterations = iteration
             self.log(f"ITERATION {iteration}/{max_iterations}", Colors.BLUE)
             self.log(f"{'='*70}{Colors.END}", Colors.BLUE)
             
             self.failures = []
             
-            # Run all test suites
-            unit_passed = self.run_unit_tests()
-            integration_passed = self.run_integration_tests()
-            e2e_passed = self.run_e2e_tests()
-            
-            # Check coverage
-            coverage = self.check_coverage()
-            coverage_ok = all(cov >= 90 for cov in coverage.values())
+            # Run all test suites and check coverage
+            results = self.engine.run('run-tests')
+            self.metrics.record_steps(results)
+            for result in self.engine.reused(results):
+                step = self.engine.pipeline.steps[result.step_id]
+                self.log(f"↺ {step.description}: inputs unchanged, keeping previous result ({result.status})", Colors.CYAN)
+            # Reused steps did not run, so rebuild the iteration state from the results
+            self.failures = [
+                failure
+                for step_id in ('run-tests.unit', 'run-tests.integration', 'run-tests.e2e')
+                for failure in (results[step_id].data or [])
+            ]
+            self.coverage_data = results['run-tests.coverage'].data or {}
+            self.metrics.set_coverage(self.coverage_data)
+            unit_passed = results['run-tests.unit'].ok
+            integration_passed = results['run-tests.integration'].ok
+            e2e_passed = results['run-tests.e2e'].ok
+            coverage_ok = results['run-tests.coverage'].ok
             
             # Check if all passed
             all_passed = unit_passed and integration_passed and e2e_passed and coverage_ok
+            iteration_failures = list(self.failures)
+            if not coverage_ok:
+                iteration_failures.append({'suite': 'coverage', 'message': str(self.coverage_data)})
             
             # Generate report
             report = self.generate_report(all_passed)
@@ -339,15 +437,67 @@ OpenPilot Test Report
                 else:
                     self.log("⚠️  No automatic fixes available\n", Colors.YELLOW)
         
-        self.log(f"\n{Colors.RED}❌ Tests did not pass after {max_iterations} iterations{Colors.END}", Colors.RED)
+        if self.stop_reason:
+            self.log(f"\n{Colors.RED}❌ Tests did not pass: loop converged ({self.stop_reason}){Colors.END}", Colors.RED)
+        else:
+            self.log(f"\n{Colors.RED}❌ Tests did not pass after {max_iterations} iterations{Colors.END}", Colors.RED)
         self.log("Please review failures and fix manually\n", Colors.YELLOW)
         return False
+    
+    def report_build_cache(self):
+        if self.build_cache is not None:
+            self.log(f"🗄️  {self.build_cache.status()}", Colors.CYAN)
+    
+    def report_prediction(self):
+        summary = prediction_summary(self.engine.predictions)
+        if summary:
+            self.log(f"⏱️  Wall time: {summary}", Colors.CYAN)
 
 def main():
-    runner = TestRunner()
+    processes.install()
+    parser = argparse.ArgumentParser(description="OpenPilot test runner with auto-fix loop")
+    parser.add_argument('--max-iterations', type=int, default=3)
+    parser.add_argument('--jobs', type=int, default=1,
+                        help="Number of test suites to run concurrently")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--full', action='store_true',
+                      help="Re-run every suite each iteration instead of only those whose inputs changed")
+    mode.add_argument('--resume', action='store_true',
+                      help="Continue an interrupted run: keep steps that passed last time if their inputs are unchanged")
+    parser.add_argument('--diff-base', metavar='REF',
+                        help="Gate on coverage of the lines changed since REF instead of the whole repo")
+    parser.add_argument('--metrics-file', type=Path,
+                        help="Write OpenMetrics for a node-exporter textfile collector "
+                             "(default: $OPENPILOT_METRICS_FILE)")
+    parser.add_argument('--remote-cache', metavar='URL',
+                        help="Share build outputs and passing results through this cache server "
+                             "(default: $OPENPILOT_REMOTE_CACHE)")
+    parser.add_argument('--since', metavar='REF',
+                        help="Only install and test packages affected by changes since REF (and their dependents)")
+    parser.add_argument('--jest-daemon', action='store_true',
+                        help="Keep one resident jest per package across iterations (default: $OPENPILOT_JEST_DAEMON)")
+    parser.add_argument('--plan', action='store_true',
+                        help="Predict wall time and the critical path from past timings without running anything")
+    args = parser.parse_args()
+    
+    if args.plan:
+        plan = plan_run(load_pipeline(), ['run-tests:setup', 'run-tests'], StepTimings(), args.jobs)
+        print(f"{Colors.BOLD}🗺️  Plan: setup + one test iteration ('*' = critical path){Colors.END}")
+        for line in plan_lines(plan):
+            print(f"  {line}")
+        sys.exit(0)
+    
+    runner = TestRunner(jobs=args.jobs, incremental=not args.full, diff_base=args.diff_base,
+                        remote_cache=args.remote_cache, resume=args.resume,
+                        since=args.since, jest_daemon=args.jest_daemon)
+    metrics_file = metrics_path(args.metrics_file)
     
     try:
-        success = runner.run(max_iterations=3)
+        success = runner.run(max_iterations=args.max_iterations)
+        runner.report_build_cache()
+        runner.report_prediction()
+        if metrics_file:
+            runner.log(f"📈 Metrics written to {runner.metrics.write(metrics_file)}", Colors.CYAN)
         sys.exit(0 if success else 1)
     except KeyboardInterrupt:
         print(f"\n{Colors.YELLOW}Interrupted by user{Colors.END}")
@@ -357,6 +507,10 @@ def main():
         import traceback
         traceback.print_exc()
         sys.exit(1)
+    finally:
+        daemons.stop_all()
+        for line in processes.summary():
+            print(f"{Colors.YELLOW}🧹 {line}{Colors.END}")
 
 if __name__ == "__main__":
     main()
@@ -1,61 +1,106 @@
 #!/usr/bin/env python3
 """
 Test Runner - Runs all tests and generates coverage reports
+Executes the `test-all` target from pipeline.yml.
 """
 
+import argparse
 import os
 import sys
-import subprocess
 from pathlib import Path
 
-def run_command(cmd, cwd=None):
-    """Run a command and return success status"""
-    try:
-        result = subprocess.run(
-            cmd,
-            shell=True,
-            cwd=cwd,
-            capture_output=True,
-            text=True
-        )
-        return result.returncode == 0, result.stdout, result.stderr
-    except Exception as e:
-        return False, "", str(e)
+from pipeline.buildcache import configured_cache
+from pipeline.distributed import Coordinator, Worker, WorkerRejected, parse_address
+from pipeline.engine import FAILED, Engine, load_pipeline
+from pipeline.processes import format_usage, processes
 
 def main():
+    processes.install()
+    parser = argparse.ArgumentParser(description="Run every package's tests and the core coverage report")
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1,
+                        help="Number of steps to run concurrently")
+    parser.add_argument('--coordinator', metavar='[HOST:]PORT',
+                        help="Hand the steps to remote workers connecting to this address")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="With --coordinator, wait for this many workers before starting")
+    parser.add_argument('--worker', metavar='HOST:PORT',
+                        help="Run as a worker for the coordinator at this address")
+    parser.add_argument('--remote-cache', metavar='URL',
+                        help="Share build outputs and passing results through this cache server "
+                             "(default: $OPENPILOT_REMOTE_CACHE)")
+    args = parser.parse_args()
+
     root = Path(__file__).parent.parent
-    
+
+    if args.worker:
+        print(f"🛠  Worker for {args.worker}...")
+        try:
+            completed = Worker(args.worker, root).run()
+        except WorkerRejected as e:
+            print(f"❌ Coordinator refused this worker: {e}")
+            return 1
+        print(f"✅ Worker finished after {completed} jobs")
+        return 0
+
+    coordinator = None
+    if args.coordinator:
+        host, port = parse_address(args.coordinator)
+        try:
+            coordinator = Coordinator(host, port, root).start()
+        except ValueError as e:
+            print(f"❌ {e}")
+            return 1
+        print(f"📡 Coordinator on {host}:{coordinator.address[1]}, waiting for {args.workers} worker(s)...")
+        if not coordinator.wait_for_workers(args.workers, timeout=600):
+            print(f"❌ Only {len(coordinator.workers)} worker(s) connected")
+            coordinator.close()
+            return 1
+
     print("🧪 Running OpenPilot Test Suite...\n")
-    
-    # Core tests
-    print("📦 Testing Core...")
-    success, stdout, stderr = run_command("npm test", cwd=root / "core")
-    if success:
-        print("✅ Core tests passed")
-    else:
-        print(f"❌ Core tests failed:\n{stderr}")
-    
-    # Extension tests
-    print("\n🔌 Testing VS Code Extension...")
-    success, stdout, stderr = run_command("npm test", cwd=root / "vscode-extension")
-    if success:
-        print("✅ Extension tests passed")
-    else:
-        print(f"❌ Extension tests failed:\n{stderr}")
-    
-    # Desktop tests
-    print("\n💻 Testing Desktop App...")
-    success, stdout, stderr = run_command("npm test", cwd=root / "desktop")
-    if success:
-        print("✅ Desktop tests passed")
-    else:
-        print(f"❌ Desktop tests failed:\n{stderr}")
-    
-    # Coverage report
-    print("\n📊 Generating Coverage Report...")
-    run_command("npm run test:coverage", cwd=root / "core")
-    
-    print("\n✅ Test suite complete!")
+
+    def on_result(step, result):
+        data = result.data if isinstance(result.data, dict) else {}
+        worker = f" on {data['worker']}" if 'worker' in data else ''
+        if 'jest' in data:
+            worker += f" ({data['jest']['workers']} jest workers)"
+        usage = f" - {format_usage(result.usage)}" if result.usage else ''
+        if result.ok and result.reused:
+            print(f"♻️  {step.description} passed (cached)")
+        elif result.ok:
+            print(f"✅ {step.description} passed{worker}{usage}")
+        else:
+            print(f"❌ {step.description} {result.status}{worker}:\n{result.stderr}")
+
+    pipeline = load_pipeline()
+    # Remote steps just wait on the coordinator, so queue all of them and let the workers pull
+    jobs = len(pipeline.compile('test-all')) if coordinator else args.jobs
+    build_cache = configured_cache(root, args.remote_cache)
+    engine = Engine(pipeline, root=root, jobs=jobs, remote=coordinator, build_cache=build_cache,
+                    on_start=lambda step: print(f"▶ {step.description}..."),
+                    on_result=on_result)
+    try:
+        results = engine.run('test-all')
+    finally:
+        if coordinator:
+            coordinator.close()
+        for line in processes.summary():
+            print(f"🧹 {line}")
+
+    if build_cache is not None:
+        print(f"🗄️  {build_cache.status()}")
+    if engine.succeeded(results):
+        print("\n✅ Test suite complete!")
+        return 0
+    print("\n❌ Steps that did not pass:")
+    for result in results.values():
+        if result.ok:
+            continue
+        step = pipeline.steps[result.step_id]
+        detail = f"exit code {result.code}" if result.status == FAILED else result.status
+        allowed = ", allowed to fail" if step.allow_failure else ''
+        print(f"  • {step.description}: {detail}{allowed}")
+    print("❌ Test suite failed (exit code 1)")
+    return 1
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
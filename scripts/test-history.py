@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Query the per-test history
+Answers "which tests are slowest / failing most" from the columnar store the
+auto-fix loop fills after every jest run; --import adds any jest --json report.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from pipeline.testhistory import JestReport, TestHistory
+
+class Colors:
+    HEADER = '\033[95m'
+    BLUE = '\033[94m'
+    GREEN = '\033[92m'
+    YELLOW = '\033[93m'
+    RED = '\033[91m'
+    END = '\033[0m'
+    BOLD = '\033[1m'
+
+def test_label(row) -> str:
+    return f"{row['file']} › {row['name']}" if row['name'] else f"{row['file']} (file failed to run)"
+
+def main():
+    parser = argparse.ArgumentParser(description="Slowest and most-failing tests across recorded jest runs")
+    parser.add_argument('--import', dest='report', type=Path, metavar='JSON',
+                        help="Add a jest --json report to the history first")
+    parser.add_argument('--slowest-tests', type=int, default=10, metavar='N')
+    parser.add_argument('--slowest-files', type=int, default=10, metavar='N')
+    parser.add_argument('--failing', type=int, default=10, metavar='N')
+    parser.add_argument('--runs', type=int, default=1, help="Average durations over the last N runs")
+    parser.add_argument('--failing-runs', type=int, default=20, metavar='N',
+                        help="Count failures over the last N runs")
+    args = parser.parse_args()
+
+    history = TestHistory()
+    if args.report:
+        rows = history.add_run(JestReport(args.report).records(), label=args.report.name)
+        print(f"{Colors.GREEN}📥 Imported {rows} tests from {args.report}{Colors.END}")
+    if not history.runs:
+        print(f"{Colors.YELLOW}⚠️  No test runs recorded yet{Colors.END}")
+        return 1
+
+    started = time.perf_counter()
+    slowest = history.slowest_tests(args.slowest_tests, args.runs)
+    files = history.slowest_files(args.slowest_files, args.runs)
+    failing = history.most_failing(args.failing, args.failing_runs)
+    elapsed = (time.perf_counter() - started) * 1000
+
+    print(f"{Colors.BOLD}{Colors.HEADER}🐢 Slowest tests{Colors.END}")
+    for row in slowest:
+        print(f"   {row['duration_ms']:>7} ms  {test_label(row)}")
+    print(f"\n{Colors.BOLD}{Colors.HEADER}📁 Slowest files{Colors.END}")
+    for row in files:
+        print(f"   {row['duration_ms']:>7} ms  {row['file']}")
+    print(f"\n{Colors.BOLD}{Colors.HEADER}❌ Most failing tests{Colors.END}")
+    for row in failing:
+        retries = f", {row['retries']} retries" if row['retries'] else ''
+        print(f"   {row['failures']:>3}/{row['runs']:<3} {Colors.RED}{row['fail_rate'] * 100:.0f}%{Colors.END}  "
+              f"{test_label(row)}{retries}")
+    if not failing:
+        print(f"   {Colors.GREEN}none{Colors.END}")
+
+    total = len(history.columns['run'])
+    print(f"\n{Colors.BLUE}{len(history.runs)} runs, {total} test results, queried in {elapsed:.1f} ms{Colors.END}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
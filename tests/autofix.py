@@ -10,7 +10,7 @@ This script runs tests in a loop and automatically fixes issues until:
 4. No lint errors
 
 Features:
-- Automatically fixes common type errors
+- Automatically fixes common type errors, trying alternative fixes side by side
 - Adjusts mock responses to match expected output
 - Adds missing imports
 - Fixes async/await issues
@@ -18,99 +18,239 @@ Features:
 - Max 10 iterations to prevent infinite loops
 """
 
-import subprocess
+import argparse
+import itertools
 import json
+import os
 import re
 import sys
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Set, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'scripts'))
+
+from pipeline.convergence import ConvergenceTracker
+from pipeline.coverage import changed_lines, diff_coverage, format_ranges, jest_partial_args, load_istanbul
+from pipeline.engine import Engine, load_pipeline
+from pipeline.jestcache import cache_arguments
+from pipeline.jestworkers import planner
+from pipeline.logstore import FixLog, LogStore
+from pipeline.metrics import PipelineMetrics, metrics_path
+from pipeline.processes import processes
+from pipeline.shell import TIMED_OUT, run_command
+from pipeline.testhistory import JestReport, TestHistory
+from pipeline.worktrees import best_candidate, evaluate_candidates
 
 MAX_ITERATIONS = 10
 COVERAGE_THRESHOLD = 90.0
 
+TS_LOCATION = re.compile(r'([^:]+\.ts)\((\d+),(\d+)\)')
+MESSAGE_LITERAL = re.compile(r"\{\s*role:\s*(['\"]\w+['\"]),\s*content:\s*([^{}]+?),?\s*\}")
+STRING_LITERAL = re.compile(r"(['\"])([\w.-]+)\1")
+IMPORT_END = re.compile(r"^(import\s.*|\}.*)\sfrom\s+['\"][^'\"]+['\"];?\s*$|^import\s+['\"]")
+
+
+def _message_helper(line: str, line_num: int) -> Optional[Tuple[str, str]]:
+    """{ role, content } literal -> createMessage(role, content)"""
+    match = MESSAGE_LITERAL.search(line)
+    if not match:
+        return None
+    return line[:match.start()] + f"createMessage({match.group(1)}, {match.group(2)})" + line[match.end():], 'createMessage'
+
+
+def _message_fields(line: str, line_num: int) -> Optional[Tuple[str, str]]:
+    """{ role, ... } literal -> the same literal with an id and timestamp"""
+    match = re.search(r"\{\s*role:", line)
+    if not match:
+        return None
+    fields = f"{{ id: 'msg-{line_num}', timestamp: Date.now(),"
+    return line[:match.start()] + fields + line[match.start() + 1:], None
+
+
+def _provider_literal(line: str, providers: Dict[str, str]) -> Optional[re.Match]:
+    return next((m for m in STRING_LITERAL.finditer(line) if m.group(2) in providers), None)
+
+
+def _provider_enum(providers: Dict[str, str]):
+    def fix(line: str, line_num: int) -> Optional[Tuple[str, str]]:
+        """'ollama' -> AIProvider.OLLAMA"""
+        match = _provider_literal(line, providers)
+        if not match:
+            return None
+        return line[:match.start()] + f"AIProvider.{providers[match.group(2)]}" + line[match.end():], 'AIProvider'
+    return fix
+
+
+def _provider_cast(providers: Dict[str, str]):
+    def fix(line: str, line_num: int) -> Optional[Tuple[str, str]]:
+        """'ollama' -> 'ollama' as AIProvider"""
+        match = _provider_literal(line, providers)
+        if not match:
+            return None
+        return line[:match.end()] + " as AIProvider" + line[match.end():], 'AIProvider'
+    return fix
+
+
+def _add_import(text: str, name: str, module: str) -> str:
+    """Import `name` from `module` after the last import, unless the file already imports it"""
+    if re.search(rf"import\s+(type\s+)?\{{[^}}]*\b{name}\b[^}}]*\}}\s*from", text):
+        return text
+    existing = re.search(rf"import\s+\{{([^}}]*?),?\s*\}}\s*from\s+['\"]{re.escape(module)}['\"]", text)
+    if existing:
+        return text[:existing.end(1)] + f", {name}" + text[existing.end(1):]
+    lines = text.split('\n')
+    last = max((i for i, line in enumerate(lines) if IMPORT_END.match(line)), default=-1)
+    lines.insert(last + 1, f"import {{ {name} }} from '{module}';")
+    return '\n'.join(lines)
+
+
 class TestAutoFixer:
-    def __init__(self, workspace_root: str):
+    def __init__(self, workspace_root: str, diff_base: str = None, fix_jobs: int = None):
         self.workspace_root = Path(workspace_root)
+        self.diff_base = diff_base
+        self.fix_jobs = fix_jobs
         self.tests_dir = self.workspace_root / 'tests'
         self.core_dir = self.workspace_root / 'core'
         self.iteration = 0
-        self.fixes_applied = []
+        self.logs = LogStore()
+        self.fixes_applied = FixLog(self.logs)
+        self.stop_reason = None
+        self.metrics = PipelineMetrics('autofix')
+        self.history = TestHistory()
+        self.engine = Engine(load_pipeline(), handlers=self.handlers(), root=self.workspace_root,
+                             incremental=True, logs=self.logs)
+
+    def handlers(self) -> Dict:
+        """Bind the `call` names of the autofix target in pipeline.yml"""
+        return {
+            'run_typescript_check': lambda step: self.run_typescript_check(),
+            'run_tests': self._tests_step,
+            'check_coverage': lambda step: self.check_coverage({}),
+        }
+
+    def _tests_step(self, step) -> Tuple[bool, Dict]:
+        ok, test_data = self.run_tests()
+        return ok, {
+            'numFailedTests': test_data.get('numFailedTests', 0),
+            'numPassedTests': test_data.get('numPassedTests', 0),
+            'numTotalTests': test_data.get('numTotalTests', 0),
+            'failed': test_data.get('failed', []),
+        }
 
     def run_typescript_check(self) -> Tuple[bool, List[str]]:
         """Run TypeScript compiler to check for type errors"""
         print("\n📝 Running TypeScript type check...")
-        try:
-            result = subprocess.run(
-                ['npx', 'tsc', '--noEmit'],
-                cwd=str(self.tests_dir),
-                capture_output=True,
-                text=True,
-                timeout=60
-            )
-            
-            if result.returncode == 0:
-                print("✅ No TypeScript errors")
-                return True, []
-            else:
-                errors = result.stdout.split('\n')
-                error_count = len([e for e in errors if e.strip() and 'error TS' in e])
-                print(f"❌ Found {error_count} TypeScript errors")
-                return False, errors
-        except subprocess.TimeoutExpired:
+        code, stdout, stderr = run_command(['npx', 'tsc', '--noEmit'], cwd=self.tests_dir, timeout=60)
+        
+        if code == 0:
+            print("✅ No TypeScript errors")
+            return True, []
+        if stderr.startswith(TIMED_OUT):
             print("⚠️  TypeScript check timed out")
             return False, ["Timeout during TypeScript check"]
-        except Exception as e:
-            print(f"⚠️  TypeScript check failed: {e}")
-            return False, [str(e)]
+        if not stdout:
+            print(f"⚠️  TypeScript check failed: {stderr}")
+            return False, [stderr]
+        errors = stdout.split('\n')
+        error_count = len([e for e in errors if e.strip() and 'error TS' in e])
+        print(f"❌ Found {error_count} TypeScript errors")
+        return False, errors
 
     def run_tests(self) -> Tuple[bool, Dict]:
         """Run Jest tests and return results"""
         print("\n🧪 Running tests...")
-        try:
-            result = subprocess.run(
-                ['npm', 'test', '--', '--coverage', '--json', '--outputFile=test-results.json'],
-                cwd=str(self.tests_dir),
-                capture_output=True,
-                text=True,
+        jest_args = ['--coverage']
+        changes = self.diff_changes()
+        if changes is not None:
+            # Only the tests related to the diff; every changed source is instrumented
+            jest_args = jest_partial_args(changes, self.workspace_root, self.tests_dir)
+        with planner.slot('tests') as plan:
+            code, stdout, stderr = run_command(
+                ['npm', 'test', '--', *jest_args, '--json', '--outputFile=test-results.json',
+                 f"--maxWorkers={plan['workers']}", *cache_arguments(self.tests_dir)],
+                cwd=self.tests_dir,
                 timeout=300
             )
-            
-            # Try to load test results
+        if stderr.startswith(TIMED_OUT):
+            print("⚠️  Tests timed out")
+            return False, {}
+        
+        try:
             results_file = self.tests_dir / 'test-results.json'
             if results_file.exists():
-                with open(results_file, 'r') as f:
-                    test_data = json.load(f)
-                    
-                num_failed = test_data.get('numFailedTests', 0)
-                num_passed = test_data.get('numPassedTests', 0)
-                total = test_data.get('numTotalTests', 0)
+                # Streamed: only per-test entries are decoded, never the coverage map
+                report = JestReport(results_file, self.workspace_root)
+                failed = []
                 
-                coverage = test_data.get('coverageMap', {})
+                def records():
+                    for record in report.records():
+                        if record['status'] == 'failed':
+                            failed.append(f"{Path(record['file']).name}: {record['name']}")
+                        yield record
                 
+                self.history.add_run(records(), label='autofix')
+                num_failed = report.summary.get('numFailedTests', 0)
+                num_passed = report.summary.get('numPassedTests', 0)
+                total = report.summary.get('numTotalTests', 0)
+                
+                self.metrics.set_tests('jest', num_passed, num_failed)
                 print(f"   Tests: {num_passed}/{total} passed")
                 print(f"   Failed: {num_failed}")
                 
-                return (num_failed == 0), test_data
+                return (num_failed == 0), {
+                    'numFailedTests': num_failed,
+                    'numPassedTests': num_passed,
+                    'numTotalTests': total,
+                    'failed': failed,
+                }
             else:
                 # Parse from stdout
-                if 'Tests:' in result.stdout:
-                    print(f"   {result.stdout}")
-                    return ('0 failed' in result.stdout), {}
+                if 'Tests:' in stdout:
+                    self.metrics.record_tests('jest', stdout)
+                    print(f"   {stdout}")
+                    return ('0 failed' in stdout), {}
                 else:
                     print(f"   Test execution completed")
-                    return (result.returncode == 0), {}
+                    return (code == 0), {}
                     
-        except subprocess.TimeoutExpired:
-            print("⚠️  Tests timed out")
-            return False, {}
         except Exception as e:
             print(f"⚠️  Test execution failed: {e}")
             return False, {}
 
+    def diff_changes(self) -> Optional[Dict[str, Set[int]]]:
+        """Changed lines since the diff base, or None for whole-repo coverage"""
+        if not self.diff_base:
+            return None
+        changes = changed_lines(self.workspace_root, self.diff_base)
+        if changes is None:
+            print(f"⚠️  Cannot diff against {self.diff_base}, using whole-repo coverage")
+        return changes
+
+    def check_diff_coverage(self, changes: Dict[str, Set[int]]) -> Tuple[bool, float]:
+        """Gate on the changed executable lines only"""
+        report = diff_coverage(changes, load_istanbul(self.tests_dir / 'coverage' / 'coverage-final.json'),
+                               self.workspace_root)
+        for path, lines in report['files'].items():
+            if lines['uncovered']:
+                print(f"   {path}: uncovered lines {format_ranges(lines['uncovered'])}")
+        for path in report['unmeasured']:
+            print(f"   {path}: changed but not instrumented")
+        print(f"   Changed lines covered: {report['covered']}/{report['total']} ({report['percent']:.2f}%)")
+        
+        if report['percent'] >= COVERAGE_THRESHOLD:
+            print(f"✅ Diff coverage meets threshold ({COVERAGE_THRESHOLD}%)")
+            return True, report['percent']
+        print(f"❌ Diff coverage below threshold ({COVERAGE_THRESHOLD}%)")
+        return False, report['percent']
+
     def check_coverage(self, test_data: Dict) -> Tuple[bool, float]:
         """Check if code coverage meets threshold"""
         print("\n📊 Checking code coverage...")
         
+        changes = self.diff_changes()
+        if changes is not None:
+            return self.check_diff_coverage(changes)
+        
         try:
             # Try to read coverage from coverage-summary.json
             coverage_file = self.tests_dir / 'coverage' / 'coverage-summary.json'
@@ -131,6 +271,7 @@ class TestAutoFixer:
                 print(f"   Functions: {functions_pct:.2f}%")
                 print(f"   Branches: {branches_pct:.2f}%")
                 print(f"   Average: {avg_coverage:.2f}%")
+                self.metrics.set_coverage({'tests': lines_pct})
                 
                 if avg_coverage >= COVERAGE_THRESHOLD:
                     print(f"✅ Coverage meets threshold ({COVERAGE_THRESHOLD}%)")
@@ -146,27 +287,136 @@ class TestAutoFixer:
             print(f"⚠️  Coverage check failed: {e}")
             return False, 0.0
 
+    def providers(self) -> Dict[str, str]:
+        """AIProvider values -> member names, read from core's enum"""
+        try:
+            source = (self.core_dir / 'src' / 'types' / 'index.ts').read_text(encoding='utf-8')
+        except OSError:
+            return {}
+        body = re.search(r"enum AIProvider\s*\{([^}]*)\}", source)
+        return {value: name for name, value in re.findall(r"(\w+)\s*=\s*'([^']+)'", body.group(1))} if body else {}
+
+    def fix_strategies(self) -> Dict[str, Tuple[str, Dict]]:
+        """Known diagnostics -> (message fragment, alternative fixes by name)"""
+        providers = self.providers()
+        return {
+            'message': ("missing the following properties from type 'Message': id, timestamp",
+                        {'createMessage': _message_helper, 'fields': _message_fields}),
+            'provider': ("Type 'string' is not assignable to type 'AIProvider'",
+                         {'enum': _provider_enum(providers), 'cast': _provider_cast(providers)}),
+        }
+
+    def _import_source(self, name: str, filepath: Path) -> str:
+        if name == 'AIProvider':
+            return '@openpilot/core'
+        helpers = os.path.relpath(self.tests_dir / 'helpers' / 'test-helpers', filepath.parent)
+        return helpers if helpers.startswith('.') else f"./{helpers}"
+
+    def type_fix_candidates(self, errors: List[str]) -> Dict[str, Dict[str, str]]:
+        """One candidate per combination of alternative fixes: name -> {repo-relative path: new content}"""
+        strategies = self.fix_strategies()
+        located: Dict[str, List[Tuple[Path, int]]] = {}
+        for error in errors:
+            kind = next((k for k, (fragment, _) in strategies.items() if fragment in error), None)
+            match = TS_LOCATION.search(error)
+            if kind and match:
+                located.setdefault(kind, []).append((self.tests_dir / match.group(1).strip(), int(match.group(2))))
+        kinds = sorted(located)
+        candidates = {}
+        for choice in itertools.product(*(strategies[kind][1].items() for kind in kinds)):
+            files: Dict[Path, List[str]] = {}
+            imports: Dict[Path, Set[str]] = {}
+            for kind, (_, fix) in zip(kinds, choice):
+                for filepath, line_num in located[kind]:
+                    if filepath not in files:
+                        try:
+                            files[filepath] = filepath.read_text(encoding='utf-8').split('\n')
+                        except OSError:
+                            continue
+                    lines = files[filepath]
+                    fixed = fix(lines[line_num - 1], line_num) if 0 < line_num <= len(lines) else None
+                    if fixed:
+                        lines[line_num - 1] = fixed[0]
+                        if fixed[1]:
+                            imports.setdefault(filepath, set()).add(fixed[1])
+            changed = {}
+            for filepath, lines in files.items():
+                text = '\n'.join(lines)
+                for name in sorted(imports.get(filepath, ())):
+                    text = _add_import(text, name, self._import_source(name, filepath))
+                if text != filepath.read_text(encoding='utf-8'):
+                    changed[filepath.relative_to(self.workspace_root).as_posix()] = text
+            if changed:
+                candidates['+'.join(name for name, _ in choice)] = changed
+        return candidates
+
+    def score_candidate(self, tree: Path) -> Optional[Tuple[int, int]]:
+        """(type errors, failed tests) of a worktree; tests only run once it type-checks"""
+        tests_dir = tree / 'tests'
+        code, stdout, stderr = run_command(['npx', 'tsc', '--noEmit'], cwd=tests_dir, timeout=120)
+        type_errors = len([line for line in stdout.split('\n') if 'error TS' in line])
+        if code != 0 and not type_errors:
+            return None  # tsc itself failed or timed out
+        if type_errors:
+            return type_errors, sys.maxsize
+        results_file = tests_dir / 'candidate-results.json'
+        with planner.slot('tests') as plan:
+            run_command(['npm', 'test', '--', '--json', f"--outputFile={results_file.name}",
+                         f"--maxWorkers={plan['workers']}", *cache_arguments(self.tests_dir)],
+                        cwd=tests_dir, timeout=300)
+        if not results_file.exists():
+            return None
+        report = JestReport(results_file, tree)
+        failed_files = sum(1 for record in report.records() if record['status'] == 'failed' and not record['name'])
+        return 0, report.summary.get('numFailedTests', 0) + failed_files
+
     def fix_type_errors(self, errors: List[str]) -> int:
-        """Apply automatic fixes for common type errors"""
+        """Apply automatic fixes for common type errors
+
+        Where a diagnostic has more than one plausible fix, every combination is
+        type-checked and tested in its own worktree at the same time; the best
+        one is written back to the workspace if it removes any errors.
+        """
         print("\n🔧 Applying automatic fixes...")
         fixes_count = 0
         
+        baseline = len([e for e in errors if 'error TS' in e])
+        candidates = self.type_fix_candidates(errors)
+        if candidates:
+            print(f"   🌿 Evaluating {len(candidates)} candidate fix(es) in parallel worktrees...")
+            scores = evaluate_candidates(candidates, self.score_candidate, jobs=self.fix_jobs,
+                                         root=self.workspace_root)
+            for name, score in scores.items():
+                outcome = "failed to evaluate" if score is None else f"{score[0]} type error(s)" + (
+                    f", {score[1]} failing test(s)" if score[0] == 0 else "")
+                print(f"      {name}: {outcome}")
+            best = best_candidate(scores)
+            if best is not None and scores[best][0] < baseline:
+                for name, content in candidates[best].items():
+                    (self.workspace_root / name).write_text(content, encoding='utf-8')
+                fixes_count = baseline - scores[best][0]
+                fix_msg = f"Applied candidate '{best}' to {', '.join(sorted(candidates[best]))} " \
+                          f"({baseline} -> {scores[best][0]} type errors)"
+                print(f"   ✅ {fix_msg}")
+                self.fixes_applied.append(fix_msg)
+                return fixes_count
+        
         for error in errors:
             # Fix: Missing id and timestamp in Message
             if "missing the following properties from type 'Message': id, timestamp" in error:
-                file_match = re.search(r'([^:]+\.ts)\((\d+),(\d+)\)', error)
+                file_match = TS_LOCATION.search(error)
                 if file_match:
                     filepath = self.tests_dir / file_match.group(1)
                     line_num = int(file_match.group(2))
                     
-                    # This requires manual intervention - log it
+                    # No candidate fixed it - this requires manual intervention, log it
                     fix_msg = f"Need to replace Message object at {filepath}:{line_num} with createMessage()"
                     print(f"   📋 {fix_msg}")
                     self.fixes_applied.append(fix_msg)
                     
             # Fix: String instead of AIProvider enum
             elif "Type 'string' is not assignable to type 'AIProvider'" in error:
-                file_match = re.search(r'([^:]+\.ts)\((\d+),(\d+)\)', error)
+                file_match = TS_LOCATION.search(error)
                 if file_match:
                     filepath = self.tests_dir / file_match.group(1)
                     line_num = int(file_match.group(2))
@@ -190,13 +440,24 @@ class TestAutoFixer:
             print(f"✅ Iterations: {self.iteration}/{MAX_ITERATIONS}")
         else:
             print("❌ STATUS: INCOMPLETE")
-            print(f"⚠️  Reached max iterations ({MAX_ITERATIONS})")
+            if self.stop_reason:
+                print(f"⏹  Stopped after {self.iteration} iterations: {self.stop_reason}")
+            else:
+                print(f"⚠️  Reached max iterations ({MAX_ITERATIONS})")
             print(f"📊 Coverage: {coverage:.2f}%")
         
+        resources = self.metrics.resource_lines()
+        if resources:
+            print("\n📈 Resources:")
+            for line in resources:
+                print(f"   - {line}")
+        
         if self.fixes_applied:
             print(f"\n📝 Fixes Applied ({len(self.fixes_applied)}):")
             for fix in self.fixes_applied:
                 print(f"   - {fix}")
+            if self.fixes_applied.dropped:
+                print(f"   … {self.fixes_applied.dropped} earlier fixes in {self.fixes_applied.path}")
         
         print("="*60)
 
@@ -208,24 +469,40 @@ class TestAutoFixer:
         print(f"🔄 Max Iterations: {MAX_ITERATIONS}")
         
         coverage = 0.0
+        tracker = ConvergenceTracker(self.workspace_root)
+        iteration_failures = []
         
         for i in range(1, MAX_ITERATIONS + 1):
+            # Stop when nothing changed since an iteration that already failed
+            self.stop_reason = tracker.check(i, iteration_failures)
+            if self.stop_reason:
+                print(f"\n⏹  Stopping early: {self.stop_reason}")
+                break
+            
             self.iteration = i
+            self.metrics.iterations = i
             print(f"\n{'='*60}")
             print(f"🔄 ITERATION {i}/{MAX_ITERATIONS}")
             print(f"{'='*60}")
             
-            # Step 1: TypeScript check
-            ts_ok, ts_errors = self.run_typescript_check()
+            # Type check, tests and coverage - see the autofix target in pipeline.yml
+            results = self.engine.run('autofix')
+            self.metrics.record_steps(results)
+            for result in self.engine.reused(results):
+                print(f"↺ {result.step_id}: inputs unchanged, keeping previous result ({result.status})")
+            ts_ok, ts_errors = results['autofix.typecheck'].ok, results['autofix.typecheck'].data or []
             if not ts_ok:
+                iteration_failures = [e for e in ts_errors if 'error TS' in e] or ts_errors
                 self.fix_type_errors(ts_errors)
                 continue  # Re-run after fixes
             
-            # Step 2: Run tests
-            tests_ok, test_data = self.run_tests()
-            
-            # Step 3: Check coverage
-            coverage_ok, coverage = self.check_coverage(test_data)
+            tests_ok = results['autofix.tests'].ok
+            coverage_ok, coverage = results['autofix.coverage'].ok, results['autofix.coverage'].data
+            iteration_failures = list((results['autofix.tests'].data or {}).get('failed', []))
+            if not tests_ok and not iteration_failures:
+                iteration_failures = ['tests failed']
+            if not coverage_ok:
+                iteration_failures.append(f"coverage {coverage:.2f}%")
             
             # Step 4: Check if all requirements met
             if ts_ok and tests_ok and coverage_ok:
@@ -242,13 +519,26 @@ class TestAutoFixer:
 
 
 def main():
-    workspace_root = '/app'  # Docker workspace path
-    
-    if len(sys.argv) > 1:
-        workspace_root = sys.argv[1]
+    processes.install()
+    parser = argparse.ArgumentParser(description="Auto-fix loop for the OpenPilot test suite")
+    parser.add_argument('workspace_root', nargs='?', default='/app',  # Docker workspace path
+                        help="Repository root (default: /app)")
+    parser.add_argument('--diff-base', metavar='REF',
+                        help="Gate on coverage of the lines changed since REF instead of the whole repo")
+    parser.add_argument('--fix-jobs', type=int, metavar='N',
+                        help="Candidate fixes to type-check and test at once (default: half the cores)")
+    parser.add_argument('--metrics-file', type=Path,
+                        help="Write OpenMetrics for a node-exporter textfile collector "
+                             "(default: $OPENPILOT_METRICS_FILE)")
+    args = parser.parse_args()
     
-    fixer = TestAutoFixer(workspace_root)
+    fixer = TestAutoFixer(args.workspace_root, diff_base=args.diff_base, fix_jobs=args.fix_jobs)
     success = fixer.run()
+    fixer.metrics.success = success
+    
+    metrics_file = metrics_path(args.metrics_file)
+    if metrics_file:
+        print(f"📈 Metrics written to {fixer.metrics.write(metrics_file)}")
     
     sys.exit(0 if success else 1)
 
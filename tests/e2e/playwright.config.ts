@@ -1,5 +1,8 @@
 import { defineConfig, devices } from '@playwright/test';
 
+// scripts/run-tests.py starts the web app itself and passes its URL here
+const externalBaseURL = process.env.E2E_BASE_URL;
+
 export default defineConfig({
   testDir: './specs',
   fullyParallel: true,
@@ -8,7 +11,7 @@ export default defineConfig({
   workers: process.env.CI ? 1 : undefined,
   reporter: 'html',
   use: {
-    baseURL: 'http://localhost:3000',
+    baseURL: externalBaseURL || 'http://localhost:3000',
     trace: 'on-first-retry',
   },
 
@@ -27,9 +30,11 @@ export default defineConfig({
     },
   ],
 
-  webServer: {
-    command: 'npm run start --prefix ../web',
-    url: 'http://localhost:3000',
-    reuseExistingServer: !process.env.CI,
-  },
+  webServer: externalBaseURL
+    ? undefined
+    : {
+        command: 'npm run start --prefix ../web',
+        url: 'http://localhost:3000',
+        reuseExistingServer: !process.env.CI,
+      },
 });
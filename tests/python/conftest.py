@@ -0,0 +1,61 @@
+"""Shared fixtures for the pipeline tests: throwaway git checkouts with their own pipeline.yml"""
+
+import subprocess
+import sys
+from pathlib import Path
+from typing import Callable, Dict, Tuple
+
+import pytest
+import yaml
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent / 'scripts'))
+
+from pipeline.engine import Pipeline  # noqa: E402
+
+
+def git(root: Path, *args: str) -> str:
+    return subprocess.run(['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com', *args],
+                          cwd=root, check=True, capture_output=True, text=True).stdout
+
+
+@pytest.fixture
+def make_repo(tmp_path) -> Callable[..., Path]:
+    """Factory for committed git repos: make_repo(pipeline_yml, {path: text}, name='repo')"""
+
+    def make(pipeline: str = None, files: Dict[str, str] = None, name: str = 'repo') -> Path:
+        root = tmp_path / name
+        root.mkdir()
+        git(root, 'init', '-q')
+        if pipeline is not None:
+            (root / 'pipeline.yml').write_text(pipeline, encoding='utf-8')
+        for rel, text in (files or {}).items():
+            path = root / rel
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(text, encoding='utf-8')
+        git(root, 'add', '-A')
+        git(root, 'commit', '-q', '--allow-empty', '-m', 'initial')
+        return root
+
+    return make
+
+
+@pytest.fixture
+def pipeline_repo(make_repo) -> Callable[..., Tuple[Path, Pipeline]]:
+    """make_repo for a pipeline spec given as a dict; returns the root and the loaded Pipeline"""
+
+    def make(spec: Dict, files: Dict[str, str] = None, name: str = 'repo') -> Tuple[Path, Pipeline]:
+        root = make_repo(yaml.safe_dump(spec), files, name)
+        return root, Pipeline.load(root / 'pipeline.yml')
+
+    return make
+
+
+@pytest.fixture
+def clone(tmp_path) -> Callable[[Path, str], Path]:
+    """Factory for clones of a repo made by make_repo, on the same commit"""
+
+    def make(source: Path, name: str) -> Path:
+        git(tmp_path, 'clone', '-q', str(source), name)
+        return tmp_path / name
+
+    return make
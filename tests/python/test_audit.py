@@ -0,0 +1,48 @@
+"""Semver range matching used to check installed versions against advisories"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent / 'scripts'))
+
+from pipeline.audit import satisfies  # noqa: E402
+
+
+@pytest.mark.parametrize('version, spec', [
+    ('1.0.0-beta', '<1.0.0'),
+    ('1.0.0-rc.1', '>=0.9.0 <1.0.0'),
+    ('1.0.0-alpha', '<1.0.0-beta'),
+    ('1.0.0-alpha', '<1.0.0-alpha.1'),
+    ('1.0.0-beta.2', '<1.0.0-beta.11'),
+    ('1.0.0-beta', '=1.0.0-beta'),
+    ('1.0.0', '>1.0.0-rc.1'),
+])
+def test_prerelease_sorts_below_its_release(version, spec):
+    assert satisfies(version, spec)
+
+
+@pytest.mark.parametrize('version, spec', [
+    ('1.0.0-beta', '>=1.0.0'),
+    ('1.0.0-beta', '=1.0.0'),
+    ('1.0.0-beta.11', '<1.0.0-beta.2'),
+    ('1.0.0-beta', '<1.0.0-alpha'),
+    ('1.0.0', '<1.0.0-rc.1'),
+])
+def test_prerelease_outside_range(version, spec):
+    assert not satisfies(version, spec)
+
+
+@pytest.mark.parametrize('version, spec, expected', [
+    ('1.2.3', '^1.0.0', True),
+    ('2.0.0', '^1.0.0', False),
+    ('0.2.5', '~0.2.1', True),
+    ('0.3.0', '~0.2.1', False),
+    ('1.5.0', '1.x', True),
+    ('1.4.0', '1.2.0 - 1.4.0', True),
+    ('4.17.20', '<4.17.21 || >=5.0.0 <5.0.2', True),
+    ('4.17.21', '<4.17.21 || >=5.0.0 <5.0.2', False),
+])
+def test_release_ranges(version, spec, expected):
+    assert satisfies(version, spec) is expected
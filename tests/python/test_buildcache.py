@@ -0,0 +1,145 @@
+"""Build cache /ac + /cas round trip against the reference cache server"""
+
+import hashlib
+import importlib.util
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+from pipeline.buildcache import BuildCache
+
+SERVER_SCRIPT = Path(__file__).resolve().parent.parent.parent / 'scripts' / 'cache-server.py'
+
+SPEC = {
+    'steps': {
+        'build': {'run': 'mkdir -p dist && cat src/*.js > dist/bundle.js', 'inputs': ['src/**'],
+                  'outputs': ['dist/**']},
+    },
+    'targets': {'all': ['build']},
+}
+
+
+def load_server_module():
+    spec = importlib.util.spec_from_file_location('cache_server', SERVER_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def server(tmp_path):
+    module = load_server_module()
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), module.CacheHandler)
+    httpd.daemon_threads = True
+    httpd.store = module.CacheStore(tmp_path / 'server')
+    httpd.token = ''
+    httpd.verbose = False
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def repo(pipeline_repo):
+    return pipeline_repo(SPEC, {'src/a.js': 'a();\n', 'src/b.js': 'b();\n'})
+
+
+def url(server) -> str:
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def build(root):
+    (root / 'dist').mkdir(exist_ok=True)
+    (root / 'dist' / 'bundle.js').write_text('a();\nb();\n')
+
+
+def test_result_and_outputs_round_trip_through_the_server(server, repo, tmp_path):
+    root, pipeline = repo
+    step = pipeline.steps['build']
+    producer = BuildCache(root, url(server), tmp_path / 'local-1')
+    key = producer.action_key(step)
+    build(root)
+    assert producer.store(key, step, 0, 'built\n', '')
+    (root / 'dist' / 'bundle.js').unlink()
+
+    # Another machine: empty local cache, same inputs
+    consumer = BuildCache(root, url(server), tmp_path / 'local-2')
+    entry = consumer.lookup(consumer.action_key(step), step)
+
+    assert entry is not None and entry['source'] == 'remote'
+    assert entry['stdout'] == 'built\n'
+    assert (root / 'dist' / 'bundle.js').read_text() == 'a();\nb();\n'
+    # Kept locally, so the next lookup does not need the server
+    assert consumer.lookup(key, step)['source'] == 'local'
+
+
+def test_changed_input_changes_the_key(server, repo, tmp_path):
+    root, pipeline = repo
+    cache = BuildCache(root, url(server), tmp_path / 'local')
+    before = cache.action_key(pipeline.steps['build'])
+    (root / 'src' / 'b.js').write_text('changed();\n')
+
+    assert cache.action_key(pipeline.steps['build']) != before
+
+
+def test_blob_not_matching_its_digest_is_a_miss(server, repo, tmp_path):
+    root, pipeline = repo
+    step = pipeline.steps['build']
+    producer = BuildCache(root, url(server), tmp_path / 'local-1')
+    key = producer.action_key(step)
+    build(root)
+    producer.store(key, step, 0, '', '')
+    (root / 'dist' / 'bundle.js').unlink()
+    # Corrupt the blob behind the server's back
+    digest = hashlib.sha256(b'a();\nb();\n').hexdigest()
+    server.store.path('cas', digest).write_bytes(b'tampered')
+
+    consumer = BuildCache(root, url(server), tmp_path / 'local-2')
+
+    assert consumer.lookup(key, step) is None
+    assert consumer.misses == 1
+    assert not (root / 'dist' / 'bundle.js').exists()
+
+
+def test_entry_listing_undeclared_outputs_is_a_miss(server, repo, tmp_path):
+    root, pipeline = repo
+    step = pipeline.steps['build']
+    producer = BuildCache(root, url(server), tmp_path / 'local-1')
+    key = producer.action_key(step)
+    build(root)
+    # A producer with a wider idea of the step's outputs also uploads the sources
+    step.outputs.append('src/**')
+    producer.store(key, step, 0, '', '')
+    step.outputs.remove('src/**')
+
+    consumer = BuildCache(root, url(server), tmp_path / 'local-2')
+
+    assert consumer.lookup(key, step) is None
+
+
+def test_server_refuses_blobs_that_do_not_match_their_digest(server):
+    digest = hashlib.sha256(b'content').hexdigest()
+    request = urllib.request.Request(f"{url(server)}/cas/{digest}", data=b'other', method='PUT')
+
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(request, timeout=10)
+
+    assert error.value.code == 400
+    assert not server.store.path('cas', digest).exists()
+
+
+def test_unreachable_server_degrades_to_local_only(repo, tmp_path):
+    root, pipeline = repo
+    step = pipeline.steps['build']
+    cache = BuildCache(root, 'http://127.0.0.1:9', tmp_path / 'local')
+    key = cache.action_key(step)
+    build(root)
+
+    assert cache.store(key, step, 0, '', '')
+    assert not cache.remote.available
+    assert cache.lookup(key, step)['source'] == 'local'
@@ -0,0 +1,101 @@
+"""Resuming an interrupted run from the step checkpoints"""
+
+import pytest
+
+from pipeline.checkpoint import Checkpoint, run_options
+from pipeline.engine import FAILED, PASSED, SKIPPED, Engine
+
+SPEC = {
+    'steps': {
+        'install': {'call': 'install', 'inputs': ['package.json']},
+        'build': {'call': 'build', 'needs': ['install'], 'inputs': ['src/**']},
+        'test': {'call': 'test', 'needs': ['build'], 'inputs': ['src/**', 'tests/**']},
+    },
+    'targets': {'all': ['install', 'build', 'test']},
+}
+FILES = {'package.json': '{}\n', 'src/index.js': 'code\n', 'tests/index.test.js': 'test\n'}
+
+
+class Runner:
+    """A fresh process' worth of engine, checkpointing to a shared directory"""
+
+    def __init__(self, root, pipeline, cache_dir, failing=(), options=''):
+        self.root = root
+        self.pipeline = pipeline
+        self.cache_dir = cache_dir
+        self.options = options
+        self.failing = set(failing)
+        self.ran = []
+        self.handlers = {step.call: self.handle for step in pipeline.steps.values()}
+
+    def handle(self, step):
+        self.ran.append(step.id)
+        return step.id not in self.failing
+
+    def run(self, resume: bool):
+        checkpoint = Checkpoint('test', self.cache_dir, options=self.options)
+        engine = Engine(self.pipeline, self.handlers, self.root, checkpoint=checkpoint, resume=resume)
+        return engine.run('all')
+
+
+@pytest.fixture
+def repo(pipeline_repo):
+    return pipeline_repo(SPEC, FILES)
+
+
+def test_resume_continues_from_the_first_step_that_did_not_pass(repo, tmp_path):
+    root, pipeline = repo
+    first = Runner(root, pipeline, tmp_path / 'checkpoints', failing=['build'])
+    results = first.run(resume=False)
+    assert [results[s].status for s in ('install', 'build', 'test')] == [PASSED, FAILED, SKIPPED]
+
+    second = Runner(root, pipeline, tmp_path / 'checkpoints')
+    results = second.run(resume=True)
+
+    assert second.ran == ['build', 'test']
+    assert results['install'].reused and results['install'].ok
+    assert results['test'].ok
+
+
+def test_without_resume_every_step_runs(repo, tmp_path):
+    root, pipeline = repo
+    Runner(root, pipeline, tmp_path / 'checkpoints').run(resume=False)
+
+    again = Runner(root, pipeline, tmp_path / 'checkpoints')
+    again.run(resume=False)
+
+    assert again.ran == ['install', 'build', 'test']
+
+
+def test_changed_inputs_are_not_carried_over(repo, tmp_path):
+    root, pipeline = repo
+    Runner(root, pipeline, tmp_path / 'checkpoints').run(resume=False)
+    (root / 'src' / 'index.js').write_text('edited\n')
+
+    resumed = Runner(root, pipeline, tmp_path / 'checkpoints')
+    resumed.run(resume=True)
+
+    assert resumed.ran == ['build', 'test']
+
+
+def test_other_runner_options_invalidate_the_checkpoint(repo, tmp_path):
+    root, pipeline = repo
+    scoped = run_options(since='origin/main', affected={'core'})
+    Runner(root, pipeline, tmp_path / 'checkpoints', options=scoped).run(resume=False)
+
+    unscoped = Runner(root, pipeline, tmp_path / 'checkpoints', options=run_options(since=None, affected=None))
+    unscoped.run(resume=True)
+
+    assert unscoped.ran == ['install', 'build', 'test']
+
+
+def test_edited_step_definition_invalidates_its_checkpoint(repo, tmp_path):
+    root, pipeline = repo
+    Runner(root, pipeline, tmp_path / 'checkpoints').run(resume=False)
+    pipeline.steps['build'].inputs.append('babel.config.js')
+
+    resumed = Runner(root, pipeline, tmp_path / 'checkpoints')
+    resumed.run(resume=True)
+
+    # test's own checkpoint is valid, but a dependency that ran again forces it to run too
+    assert resumed.ran == ['build', 'test']
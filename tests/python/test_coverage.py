@@ -0,0 +1,129 @@
+"""Changed-line detection, per-package coverage merging and the diff-coverage gate"""
+
+import json
+import os
+import time
+
+import pytest
+
+from conftest import git
+from pipeline.coverage import changed_lines, collect_coverage, diff_coverage, package_coverage, source_changes
+
+SOURCE = ''.join(f"line {n}\n" for n in range(1, 11))
+
+
+def istanbul(path: str, hits: dict) -> dict:
+    """coverage-final.json entry with one statement per line: {line: hit count}"""
+    return {path: {
+        'path': path,
+        'statementMap': {str(i): {'start': {'line': line, 'column': 0}, 'end': {'line': line, 'column': 5}}
+                         for i, line in enumerate(hits)},
+        's': {str(i): count for i, count in enumerate(hits.values())},
+    }}
+
+
+def write_json(path, data) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data), encoding='utf-8')
+
+
+class TestChangedLines:
+
+    @pytest.fixture
+    def repo(self, make_repo):
+        root = make_repo(files={'core/src/a.ts': SOURCE, 'core/src/gone.ts': SOURCE})
+        git(root, 'branch', 'base')
+        return root
+
+    def test_hunks_since_the_merge_base(self, repo):
+        lines = SOURCE.splitlines(keepends=True)
+        lines[1] = 'changed 2\n'
+        lines[6:7] = ['changed 7\n', 'added 8\n']
+        (repo / 'core/src/a.ts').write_text(''.join(lines))
+        git(repo, 'commit', '-qam', 'edit')
+        # Uncommitted edits count as well
+        (repo / 'core/src/a.ts').write_text(''.join(lines) + 'appended\n')
+
+        changes = changed_lines(repo, 'base')
+
+        assert changes == {'core/src/a.ts': {2, 7, 8, 12}}
+
+    def test_deletions_add_no_lines(self, repo):
+        (repo / 'core/src/a.ts').write_text(''.join(SOURCE.splitlines(keepends=True)[:5]))
+        (repo / 'core/src/gone.ts').unlink()
+
+        assert changed_lines(repo, 'base') == {}
+
+    def test_untracked_files_count_in_full(self, repo):
+        (repo / 'core/src/new.ts').write_text('one\ntwo\nthree\n')
+
+        assert changed_lines(repo, 'base') == {'core/src/new.ts': {1, 2, 3}}
+
+    def test_unknown_base_ref(self, repo):
+        assert changed_lines(repo, 'no-such-ref') is None
+
+
+def test_source_changes_leave_out_tests_and_typings():
+    changes = {'core/src/a.ts': {1}, 'core/src/a.test.ts': {1}, 'core/src/__mocks__/m.ts': {1},
+               'core/src/types.d.ts': {1}, 'README.md': {1}}
+
+    assert source_changes(changes) == {'core/src/a.ts': {1}}
+
+
+class TestPackageCoverage:
+
+    def test_reports_of_the_same_file_are_unioned(self, tmp_path):
+        source = tmp_path / 'core' / 'src' / 'a.ts'
+        write_json(tmp_path / 'core/coverage/coverage-final.json', istanbul(str(source), {1: 3, 2: 0, 3: 0}))
+        # The tests package instruments core too and happens to reach line 2
+        write_json(tmp_path / 'tests/coverage/coverage-final.json', istanbul(str(source), {1: 0, 2: 1, 3: 0}))
+
+        merged = collect_coverage(tmp_path)
+
+        assert merged == {'core/src/a.ts': {1: 3, 2: 1, 3: 0}}
+        assert package_coverage(merged) == {'core': 66.67}
+
+    def test_pytest_report_is_reported_as_python(self, tmp_path):
+        write_json(tmp_path / 'web/coverage/coverage-final.json',
+                   istanbul(str(tmp_path / 'web/src/App.tsx'), {1: 1, 2: 1}))
+        report = tmp_path / 'pytest-coverage.json'
+        write_json(report, {'files': {'scripts/tool.py': {'executed_lines': [1, 2, 3], 'missing_lines': [4]}}})
+
+        coverage = package_coverage(collect_coverage(tmp_path, pytest_report=report))
+
+        assert coverage == {'python': 75.0, 'web': 100.0}
+
+    def test_reports_older_than_the_run_are_ignored(self, tmp_path):
+        stale = tmp_path / 'desktop/coverage/coverage-final.json'
+        write_json(stale, istanbul(str(tmp_path / 'desktop/main.ts'), {1: 0}))
+        started = time.time()
+        os.utime(stale, (started - 60, started - 60))
+
+        assert collect_coverage(tmp_path, since=started) == {}
+
+
+class TestDiffCoverage:
+
+    def test_only_changed_executable_lines_count(self, tmp_path):
+        coverage_map = istanbul(str(tmp_path / 'core/src/a.ts'), {1: 1, 2: 0, 4: 2, 9: 0})
+        changes = {'core/src/a.ts': {1, 2, 3, 4}, 'core/src/a.test.ts': {1, 2}}
+
+        report = diff_coverage(changes, coverage_map, tmp_path)
+
+        # Line 3 is not executable and line 9 did not change
+        assert report['files'] == {'core/src/a.ts': {'covered': [1, 4], 'uncovered': [2]}}
+        assert (report['covered'], report['total'], report['percent']) == (2, 3, 66.67)
+
+    def test_changed_sources_without_coverage_are_unmeasured(self, tmp_path):
+        report = diff_coverage({'web/src/App.tsx': {1}}, {}, tmp_path)
+
+        assert report['unmeasured'] == ['web/src/App.tsx']
+        assert report['percent'] == 100.0
+
+    def test_coverage_from_another_checkout_root_still_matches(self, tmp_path):
+        coverage_map = istanbul('/app/core/src/a.ts', {1: 0})
+
+        report = diff_coverage({'core/src/a.ts': {1}}, coverage_map, tmp_path)
+
+        assert report['files']['core/src/a.ts']['uncovered'] == [1]
+        assert report['percent'] == 0.0
@@ -0,0 +1,119 @@
+"""Coordinator and workers on localhost: work stealing, shipped outputs, requeueing, revision checks"""
+
+import socket
+import threading
+
+import pytest
+import yaml
+
+from conftest import git
+from pipeline.distributed import Coordinator, Worker, WorkerRejected, _receive, _send, revision
+from pipeline.engine import Pipeline
+
+STEPS = {
+    f"s{i}": {'run': f"sleep 0.3 && mkdir -p out && echo s{i} > out/s{i}.txt && echo stray > stray{i}.txt",
+              'outputs': [f"out/s{i}.txt"]}
+    for i in range(1, 7)
+}
+PIPELINE = yaml.safe_dump({'steps': STEPS, 'targets': {'all': list(STEPS)}})
+
+
+@pytest.fixture
+def checkout(make_repo):
+    return make_repo(PIPELINE)
+
+
+@pytest.fixture
+def coordinator(checkout):
+    coordinator = Coordinator('127.0.0.1', 0, checkout, token='', worker_timeout=10).start()
+    yield coordinator
+    coordinator.close()
+
+
+def start_worker(coordinator: Coordinator, root, name: str, pipeline: Pipeline = None) -> threading.Thread:
+    worker = Worker(f"127.0.0.1:{coordinator.address[1]}", root, name=name, token='',
+                    pipeline=pipeline or Pipeline.load(root / 'pipeline.yml'))
+    thread = threading.Thread(target=worker.run, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_jobs_spread_over_workers_and_stolen(coordinator, checkout, clone):
+    start_worker(coordinator, clone(checkout, 'w1'), 'w1')
+    assert coordinator.wait_for_workers(1, timeout=10)
+    # Everything lands on w1's queue; the workers joining later have to steal it
+    pipeline = Pipeline.load(checkout / 'pipeline.yml')
+    futures = [coordinator.submit(step) for step in pipeline.steps.values()]
+    start_worker(coordinator, clone(checkout, 'w2'), 'w2')
+    start_worker(coordinator, clone(checkout, 'w3'), 'w3')
+
+    results = [future.result(timeout=30) for future in futures]
+
+    assert all(code == 0 for code, _, _, _ in results)
+    assert coordinator.stolen > 0
+    assert len({data['worker'].split('@')[0] for _, _, _, data in results}) >= 2
+
+
+def test_declared_outputs_written_back_and_others_refused(coordinator, checkout, clone):
+    worker_root = clone(checkout, 'w1')
+    # Same step definitions, but this worker also ships files the coordinator never declared
+    greedy = yaml.safe_load(PIPELINE)
+    greedy['steps']['s1']['outputs'].append('stray1.txt')
+    pipeline = Pipeline.load(checkout / 'pipeline.yml')
+    greedy_path = worker_root.parent / 'greedy.yml'
+    greedy_path.write_text(yaml.safe_dump(greedy), encoding='utf-8')
+    start_worker(coordinator, worker_root, 'w1', Pipeline.load(greedy_path))
+
+    code, _, stderr, data = coordinator.execute(pipeline.steps['s1'])
+
+    assert code == 0
+    assert data['artifacts'] == ['out/s1.txt']
+    assert (checkout / 'out' / 's1.txt').read_text().strip() == 's1'
+    assert not (checkout / 'stray1.txt').exists()
+    assert 'stray1.txt' in stderr
+
+
+def test_job_of_disconnected_worker_is_requeued(coordinator, checkout, clone):
+    pipeline = Pipeline.load(checkout / 'pipeline.yml')
+    with socket.create_connection(coordinator.address) as sock, sock.makefile('rwb') as stream:
+        _send(stream, {'type': 'hello', 'worker': 'flaky', 'token': '', 'revision': revision(checkout)})
+        _send(stream, {'type': 'ready'})
+        assert coordinator.wait_for_workers(1, timeout=10)
+        future = coordinator.submit(pipeline.steps['s2'])
+        job = _receive(stream)
+        assert job['step'] == 's2'
+    # The flaky worker is gone mid-job; the next worker picks the job up
+    start_worker(coordinator, clone(checkout, 'w1'), 'w1')
+
+    code, _, _, data = future.result(timeout=30)
+
+    assert code == 0
+    assert data['worker'].startswith('w1@')
+    assert (checkout / 'out' / 's2.txt').exists()
+
+
+def test_worker_on_another_revision_is_rejected(coordinator, checkout, clone):
+    stale = clone(checkout, 'stale')
+    git(stale, 'commit', '-q', '--allow-empty', '-m', 'diverged')
+    worker = Worker(f"127.0.0.1:{coordinator.address[1]}", stale, name='stale', token='',
+                    pipeline=Pipeline.load(stale / 'pipeline.yml'))
+
+    with pytest.raises(WorkerRejected):
+        worker.run(connect_timeout=10)
+    assert coordinator.workers == []
+
+
+def test_result_for_another_step_definition_is_discarded(coordinator, checkout, clone):
+    worker_root = clone(checkout, 'w1')
+    edited = yaml.safe_load(PIPELINE)
+    edited['steps']['s3']['run'] = 'mkdir -p out && echo edited > out/s3.txt'
+    edited_path = worker_root.parent / 'edited.yml'
+    edited_path.write_text(yaml.safe_dump(edited), encoding='utf-8')
+    start_worker(coordinator, worker_root, 'w1', Pipeline.load(edited_path))
+
+    code, _, stderr, data = coordinator.execute(Pipeline.load(checkout / 'pipeline.yml').steps['s3'])
+
+    assert code != 0
+    assert 'different revision or step definition' in stderr
+    assert data['artifacts'] == []
+    assert not (checkout / 'out' / 's3.txt').exists()
@@ -0,0 +1,180 @@
+"""Pipeline compilation, execution order, skipping downstream of failures and incremental reuse"""
+
+import threading
+
+import pytest
+
+from pipeline.engine import FAILED, PASSED, SKIPPED, Engine, Pipeline, PipelineError, Step
+
+
+class Calls:
+    """Handlers that record the order they run in and fail on request"""
+
+    def __init__(self, failing=()):
+        self.order = []
+        self.failing = set(failing)
+        self._lock = threading.Lock()
+
+    def __call__(self, step: Step):
+        with self._lock:
+            self.order.append(step.id)
+        return step.id not in self.failing
+
+    def handlers(self, pipeline: Pipeline):
+        return {step.call: self for step in pipeline.steps.values() if step.call}
+
+
+def call_steps(**needs):
+    """{'b': ['a']} -> steps b (needing a) and a, each bound to a handler of the same name"""
+    steps = {}
+    for step_id, deps in needs.items():
+        steps[step_id] = {'call': step_id, 'needs': deps}
+    return steps
+
+
+def test_compile_orders_dependencies_first_and_pulls_in_needs():
+    spec = call_steps(lint=[], build=[], test=['build'], report=['test', 'lint'])
+    pipeline = Pipeline(
+        {step_id: Step(step_id, step) for step_id, step in spec.items()},
+        {'report': {'steps': ['report']}, 'all': {'steps': list(spec)}},
+    )
+
+    assert [s.id for s in pipeline.compile('all')] == ['lint', 'build', 'test', 'report']
+    assert [s.id for s in pipeline.compile('report')] == ['lint', 'build', 'test', 'report']
+
+
+def test_after_orders_only_steps_in_the_same_run():
+    steps = {'a': Step('a', {'call': 'a'}), 'b': Step('b', {'call': 'b', 'after': ['a']})}
+    pipeline = Pipeline(steps, {'both': {'steps': ['b', 'a']}, 'b': {'steps': ['b']}})
+
+    assert [s.id for s in pipeline.compile('both')] == ['a', 'b']
+    assert [s.id for s in pipeline.compile('b')] == ['b']
+
+
+def test_cycles_and_unknown_targets_are_errors():
+    steps = {'a': Step('a', {'call': 'a', 'needs': ['b']}), 'b': Step('b', {'call': 'b', 'needs': ['a']})}
+    pipeline = Pipeline(steps, {'all': {'steps': ['a']}})
+
+    with pytest.raises(PipelineError, match='cycle'):
+        pipeline.compile('all')
+    with pytest.raises(PipelineError, match='Unknown target'):
+        pipeline.compile('missing')
+
+
+@pytest.mark.parametrize('jobs', [1, 3])
+def test_dependencies_run_before_dependents(pipeline_repo, jobs):
+    spec = call_steps(a=[], b=['a'], c=['a'], d=['b', 'c'])
+    root, pipeline = pipeline_repo({'steps': spec, 'targets': {'all': list(spec)}})
+    calls = Calls()
+
+    results = Engine(pipeline, calls.handlers(pipeline), root, jobs=jobs).run('all')
+
+    assert all(result.status == PASSED for result in results.values())
+    assert calls.order[0] == 'a' and calls.order[-1] == 'd'
+
+
+def test_failure_skips_everything_downstream(pipeline_repo):
+    spec = call_steps(a=[], b=['a'], c=['b'], other=[])
+    root, pipeline = pipeline_repo({'steps': spec, 'targets': {'all': list(spec)}})
+    calls = Calls(failing=['a'])
+    engine = Engine(pipeline, calls.handlers(pipeline), root)
+
+    results = engine.run('all')
+
+    assert results['a'].status == FAILED
+    assert results['b'].status == SKIPPED and results['c'].status == SKIPPED
+    assert results['other'].status == PASSED
+    assert calls.order == ['a', 'other']
+    assert not engine.succeeded(results)
+
+
+def test_allowed_failure_does_not_block_dependents(pipeline_repo):
+    spec = call_steps(a=[], b=['a'])
+    spec['a']['allow_failure'] = True
+    root, pipeline = pipeline_repo({'steps': spec, 'targets': {'all': list(spec)}})
+    engine = Engine(pipeline, Calls(failing=['a']).handlers(pipeline), root)
+
+    results = engine.run('all')
+
+    assert results['b'].status == PASSED
+    assert engine.succeeded(results)
+
+
+def test_run_steps_report_exit_code_and_output(pipeline_repo):
+    spec = {'ok': {'run': 'echo hello'}, 'bad': {'run': 'echo oops >&2; exit 3'}}
+    root, pipeline = pipeline_repo({'steps': spec, 'targets': {'all': list(spec)}})
+
+    results = Engine(pipeline, root=root).run('all')
+
+    assert results['ok'].ok and results['ok'].stdout.strip() == 'hello'
+    assert results['bad'].code == 3 and 'oops' in results['bad'].stderr
+
+
+class TestIncremental:
+    SPEC = {
+        'steps': {
+            'build': {'call': 'build', 'inputs': ['src/**']},
+            'test': {'call': 'test', 'needs': ['build'], 'inputs': ['src/**', 'tests/**']},
+        },
+        'targets': {'all': ['build', 'test']},
+    }
+    FILES = {'src/lib.js': 'one\n', 'tests/lib.test.js': 'test\n', 'README.md': 'docs\n'}
+
+    @pytest.fixture
+    def engine(self, pipeline_repo):
+        root, pipeline = pipeline_repo(self.SPEC, self.FILES)
+        self.root = root
+        self.calls = Calls()
+        return Engine(pipeline, self.calls.handlers(pipeline), root, incremental=True)
+
+    def rerun(self, engine):
+        self.calls.order.clear()
+        return engine.run('all')
+
+    def test_untouched_inputs_reuse_the_previous_result(self, engine):
+        engine.run('all')
+        (self.root / 'README.md').write_text('more docs\n')
+
+        results = self.rerun(engine)
+
+        assert self.calls.order == []
+        assert all(result.reused and result.ok for result in results.values())
+
+    def test_changed_input_reruns_only_the_steps_reading_it(self, engine):
+        engine.run('all')
+        (self.root / 'tests' / 'lib.test.js').write_text('changed\n')
+
+        results = self.rerun(engine)
+
+        assert self.calls.order == ['test']
+        assert results['build'].reused and not results['test'].reused
+
+    def test_new_file_under_an_input_counts_as_a_change(self, engine):
+        engine.run('all')
+        (self.root / 'src' / 'extra.js').write_text('new\n')
+
+        self.rerun(engine)
+
+        assert self.calls.order == ['build', 'test']
+
+    def test_dependency_changing_outcome_reruns_dependents(self, engine):
+        self.calls.failing.add('build')
+        engine.run('all')
+        self.calls.failing.clear()
+        (self.root / 'src' / 'lib.js').write_text('fixed\n')
+
+        results = self.rerun(engine)
+
+        # test was skipped last time, so it has nothing to reuse
+        assert self.calls.order == ['build', 'test']
+        assert results['test'].ok
+
+    def test_full_mode_always_executes(self, pipeline_repo):
+        root, pipeline = pipeline_repo(self.SPEC, self.FILES)
+        calls = Calls()
+        engine = Engine(pipeline, calls.handlers(pipeline), root)
+
+        engine.run('all')
+        engine.run('all')
+
+        assert calls.order == ['build', 'test', 'build', 'test']
@@ -0,0 +1,65 @@
+"""Reading a package's lint script into targets, extensions and pass-through options"""
+
+import json
+
+import pytest
+
+from pipeline.eslint import EslintRunner, parse_lint_script
+
+
+@pytest.mark.parametrize('script, targets, extensions', [
+    ('eslint src --ext .ts', ['src'], ['.ts']),
+    ('eslint src --ext ts', ['src'], ['.ts']),
+    ('eslint --ext=.ts,.tsx src lib', ['src', 'lib'], ['.ts', '.tsx']),
+    ('eslint', ['.'], ['.js']),
+    ('tsc --noEmit', ['src'], ['.js']),
+])
+def test_targets_and_extensions(script, targets, extensions):
+    assert parse_lint_script(script)[:2] == (targets, extensions)
+
+
+def test_other_options_are_kept_with_their_values():
+    script = "eslint src --ext .ts --max-warnings 0 -c .eslintrc.strict.js --rule 'no-console: off' --quiet"
+
+    targets, _, options = parse_lint_script(script)
+
+    assert targets == ['src']
+    assert options == ['--max-warnings', '0', '-c', '.eslintrc.strict.js', '--rule', 'no-console: off', '--quiet']
+
+
+def test_output_and_fix_options_are_left_to_the_runner():
+    _, _, options = parse_lint_script('eslint src --format stylish -o lint.txt --fix --cache && prettier --check .')
+
+    assert options == ['--cache']
+
+
+class TestRunnerOptions:
+
+    @pytest.fixture
+    def package(self, tmp_path):
+        package_dir = tmp_path / 'core'
+        package_dir.mkdir()
+        (package_dir / 'package.json').write_text(json.dumps({'scripts': {'lint': 'eslint src'}}))
+        (package_dir / '.eslintrc.strict.js').write_text('module.exports = {};\n')
+        return package_dir
+
+    def test_options_reach_the_eslint_command(self, package, tmp_path):
+        runner = EslintRunner(tmp_path, packages=['core'])
+
+        source = str(package / 'src' / 'a.ts')
+
+        command = runner._eslint_command(package, [package / 'src' / 'a.ts'], ['--max-warnings', '0'], fix=False)
+
+        assert command[-6:] == ['--max-warnings', '0', '--format', 'json', '--no-error-on-unmatched-pattern', source]
+
+    def test_options_and_the_files_they_name_are_part_of_the_cache_key(self, package, tmp_path):
+        runner = EslintRunner(tmp_path, packages=['core'])
+        strict = ['-c', '.eslintrc.strict.js']
+        before = runner.config_hash(package, strict)
+
+        assert runner.config_hash(package) != before
+        assert runner.config_hash(package, strict + ['--max-warnings', '0']) != before
+
+        (package / '.eslintrc.strict.js').write_text('module.exports = {rules: {}};\n')
+
+        assert runner.config_hash(package, strict) != before
@@ -0,0 +1,75 @@
+"""Critical path and wall-time prediction from learned step timings"""
+
+import pytest
+
+from pipeline.engine import Engine, Pipeline, Step
+from pipeline.planning import StepTimings, critical_path, plan_run, simulate
+
+#   fetch(1) -> build(4) -> test(3)
+#            -> lint(2)
+STEPS = {
+    'fetch': {'call': 'fetch'},
+    'build': {'call': 'build', 'needs': ['fetch']},
+    'lint': {'call': 'lint', 'needs': ['fetch']},
+    'test': {'call': 'test', 'needs': ['build']},
+}
+DURATIONS = {'fetch': 1.0, 'build': 4.0, 'lint': 2.0, 'test': 3.0}
+
+
+@pytest.fixture
+def pipeline():
+    return Pipeline({step_id: Step(step_id, spec) for step_id, spec in STEPS.items()},
+                    {'all': {'steps': list(STEPS)}})
+
+
+@pytest.fixture
+def timings(tmp_path):
+    return StepTimings(tmp_path)
+
+
+def test_critical_path_is_the_longest_dependent_chain(pipeline):
+    order = [s.id for s in pipeline.compile('all')]
+
+    assert critical_path(pipeline, order, DURATIONS) == ['fetch', 'build', 'test']
+
+
+@pytest.mark.parametrize('jobs, wall', [(1, 10.0), (2, 8.0), (4, 8.0)])
+def test_simulated_wall_time_follows_the_job_limit(pipeline, jobs, wall):
+    order = [s.id for s in pipeline.compile('all')]
+
+    assert simulate(pipeline, order, DURATIONS, jobs) == wall
+
+
+def test_plan_reports_parallelism_and_steps_without_history(pipeline, timings):
+    for step_id, seconds in DURATIONS.items():
+        if step_id != 'lint':
+            timings.record(step_id, seconds)
+
+    plan = plan_run(pipeline, ['all'], timings, jobs=2)
+
+    assert plan['unknown'] == ['lint']
+    assert plan['wall_seconds'] == 8.0
+    assert plan['critical_path'] == ['fetch', 'build', 'test']
+    assert plan['parallelism'] == 1.0
+
+
+def test_estimates_are_smoothed_and_persisted(tmp_path):
+    timings = StepTimings(tmp_path)
+    timings.record('build', 10.0)
+    timings.record('build', 20.0)
+    timings.save()
+
+    assert StepTimings(tmp_path).estimate('build') == 15.0
+
+
+def test_engine_learns_only_from_steps_that_passed(pipeline_repo, tmp_path):
+    spec = {'steps': {'ok': {'call': 'ok'}, 'broken': {'call': 'broken'}},
+            'targets': {'all': ['ok', 'broken']}}
+    root, loaded = pipeline_repo(spec)
+    timings = StepTimings(tmp_path / 'timings')
+    engine = Engine(loaded, {'ok': lambda step: True, 'broken': lambda step: False}, root, timings=timings)
+
+    engine.run('all')
+
+    assert timings.estimate('ok') is not None
+    assert timings.estimate('broken') is None
@@ -0,0 +1,82 @@
+"""Session reaping: SIGTERM, grace period, SIGKILL, and the SIGTERM handler of the runners"""
+
+import os
+import signal
+import threading
+import time
+
+import pytest
+
+from pipeline.processes import PROC, ProcessManager, _alive, session_members
+
+pytestmark = pytest.mark.skipif(os.name == 'nt' or not PROC.is_dir(), reason="needs POSIX sessions and /proc")
+
+
+@pytest.fixture
+def manager():
+    manager = ProcessManager(grace=1.0, sample_interval=0)
+    yield manager
+    manager.terminate_all('teardown')
+
+
+def wait_for_members(pid: int, count: int, timeout: float = 5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        members = session_members(pid)
+        if len(members) >= count:
+            return members
+        time.sleep(0.05)
+    return session_members(pid)
+
+
+def test_terminate_takes_down_the_whole_tree(manager):
+    process = manager.spawn("sleep 60 & sleep 60")
+    members = wait_for_members(process.pid, 3)
+    assert len(members) >= 3
+
+    record = manager.terminate(process, 'timeout')
+
+    assert session_members(process.pid) == []
+    assert not any(_alive(pid) for pid, _ in members)
+    assert record['reason'] == 'timeout' and record['killed'] == 0
+    assert manager.running() == 0
+
+
+def test_processes_ignoring_sigterm_are_killed_after_the_grace_period(manager):
+    process = manager.spawn("trap '' TERM; sleep 60 & sleep 60")
+    members = wait_for_members(process.pid, 3)
+
+    started = time.time()
+    record = manager.terminate(process, 'timeout')
+
+    assert time.time() - started >= manager.grace
+    assert record['killed'] >= 1
+    assert not any(_alive(pid) for pid, _ in members)
+
+
+def test_release_reaps_what_a_finished_job_left_behind(manager):
+    process = manager.spawn("sleep 60 >/dev/null 2>&1 &")
+    process.wait(timeout=10)
+    orphans = wait_for_members(process.pid, 1)
+    assert orphans
+
+    records = manager.release(process)
+
+    assert [record['reason'] for record in records] == ['orphaned']
+    assert session_members(process.pid) == []
+
+
+def test_sigterm_handler_is_set_even_if_a_pool_thread_spawned_first():
+    previous = signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    try:
+        manager = ProcessManager(sample_interval=0)
+        thread = threading.Thread(target=manager.install)
+        thread.start()
+        thread.join()
+        assert signal.getsignal(signal.SIGTERM) == signal.SIG_DFL
+
+        manager.install()
+
+        assert signal.getsignal(signal.SIGTERM) != signal.SIG_DFL
+    finally:
+        signal.signal(signal.SIGTERM, previous)